@@ -0,0 +1,328 @@
+# app/ai/batch.py
+"""
+Ночной batch: next-best-action для всех клиентов сегмента.
+
+  python -m app.ai.batch --tenant 1 --segment risk
+  python -m app.ai.batch --tenant 1 --segment risk --provider stub   # без LLM
+
+Payload клиентов собирается пачкой (один агрегирующий запрос на 500
+клиентов, а не по запросу на клиента), в один промпт LLM уходит
+AI_BATCH_CLIENTS_PER_PROMPT клиентов. Результат пишется в
+client_ai_suggestions — карточка клиента читает его без вызова модели.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.ai.compact import compact_payload
+from app.ai.insights import client_ai_payload
+from app.ai.openai_client import OpenAIError, _schema, openai_generate_json
+from app.ai.prompts import SYSTEM_PROMPT_RU
+from app.core.concurrency import run_db
+from app.core.config import settings
+from app.core.database import engine, tenant_session
+import app.models.auth  # noqa: F401  (tenants — для FK)
+from app.models.client_ai_suggestion import ClientAiSuggestion
+from app.models.customer_stats import CustomerStats
+from app.models.transaction import Transaction
+from app.services.analytics import SEGMENT_DEFS, _rfm_score, _segment_matches
+from app.services.client_summary import client_summaries
+
+logger = logging.getLogger(__name__)
+
+_CHUNK = 500
+
+BATCH_QUESTION = "Следующий лучший шаг (Next Best Action) для удержания клиента."
+
+BATCH_INSTRUCTIONS_RU = (
+    "Ниже — список клиентов (clients). Для КАЖДОГО клиента верни элемент items "
+    "с его phone, коротким answer (1-2 предложения), insights (до 3) и "
+    "recommendations (1-2). target: 'action:grant_bonus|phone=...|amount=...|reason=...' "
+    "или 'nav:/admin/...'. Не пропускай клиентов и не добавляй лишних."
+)
+
+
+def _batch_schema() -> dict[str, Any]:
+    item = _schema()
+    item["properties"] = {"phone": {"type": "string"}, **item["properties"]}
+    item["required"] = ["phone", *item["required"]]
+    return {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {"items": {"type": "array", "items": item}},
+        "required": ["items"],
+    }
+
+
+# ── Выбор клиентов сегмента ──────────────────────────────────
+def segment_user_ids(
+    db: Session,
+    tenant_id: int,
+    segment_key: str,
+    limit: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> list[int]:
+    """RFM-сегмент (как в analytics) одним агрегирующим запросом."""
+    if segment_key not in SEGMENT_DEFS:
+        raise ValueError(f"Unknown segment: {segment_key}")
+    now = now or datetime.utcnow()
+    since_90 = now - timedelta(days=90)
+
+    rows = db.execute(
+        select(
+            Transaction.user_id,
+            func.count(Transaction.id).label("total"),
+            func.sum(case((Transaction.created_at >= since_90, 1), else_=0)).label("freq_90"),
+            func.coalesce(
+                func.sum(case((Transaction.created_at >= since_90, Transaction.paid_amount), else_=0)), 0
+            ).label("rev_90"),
+            func.max(Transaction.created_at).label("last_tx"),
+            # lifetime-счётчик: + архивная часть истории (одна строка stats на клиента)
+            func.max(CustomerStats.tx_count).label("archived"),
+        )
+        .outerjoin(CustomerStats, CustomerStats.user_id == Transaction.user_id)
+        .where(Transaction.tenant_id == tenant_id)
+        .group_by(Transaction.user_id)
+        .order_by(Transaction.user_id)
+    ).all()
+
+    out: list[int] = []
+    for r in rows:
+        if not r.freq_90 and segment_key != "all":
+            continue  # как в list_clients_by_segment: сегменты считаются по 90 дням
+        recency_days = (now - r.last_tx).days if r.last_tx else 999
+        rr, f, m = _rfm_score(recency_days, int(r.freq_90 or 0), int(r.rev_90 or 0))
+        if _segment_matches(segment_key, rr, f, m, int(r.total or 0) + int(r.archived or 0)):
+            out.append(int(r.user_id))
+            if limit and len(out) >= limit:
+                break
+    return out
+
+
+# ── Payload клиентов пачкой ──────────────────────────────────
+def build_client_payloads(
+    db: Session,
+    tenant_id: int,
+    user_ids: list[int],
+    now: Optional[datetime] = None,
+) -> list[dict[str, Any]]:
+    """Payload клиентов пачкой — один запрос сводки на каждые 500 клиентов."""
+    out: list[dict[str, Any]] = []
+    for summary in client_summaries(db, tenant_id, user_ids, now=now):
+        payload = client_ai_payload(summary)
+        payload["user_id"] = summary["user_id"]
+        out.append(payload)
+    return out
+
+
+# ── Генераторы ───────────────────────────────────────────────
+# clients -> {phone: {"answer", "insights", "recommendations"}}
+Generator = Callable[[list[dict[str, Any]]], Awaitable[dict[str, dict[str, Any]]]]
+
+
+async def stub_generator(clients: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """Локальная эвристика вместо LLM (тесты, AI_PROVIDER=off)."""
+    from app.api.ai import _heuristic_answer
+
+    out: dict[str, dict[str, Any]] = {}
+    for c in clients:
+        a = _heuristic_answer("client", c, BATCH_QUESTION)
+        out[c["phone"]] = a.model_dump(include={"answer", "insights", "recommendations"})
+    return out
+
+
+async def openai_generator(clients: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    api_key = str(settings.OPENAI_API_KEY or "").strip()
+    model = str(settings.OPENAI_MODEL or "gpt-4o-mini").strip()
+
+    packed = [{k: v for k, v in c.items() if k != "user_id"} for c in clients]
+    data, _ = compact_payload({"clients": packed}, budget=0)
+    user_prompt = (
+        f"Контекст: client (batch)\nВопрос: {BATCH_QUESTION}\n\n{BATCH_INSTRUCTIONS_RU}\n\nДанные:\n"
+        + json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    )
+    obj = await openai_generate_json(
+        SYSTEM_PROMPT_RU, user_prompt,
+        api_key=api_key, model=model,
+        schema=_batch_schema(), schema_name="ltv_ai_batch",
+        max_output_tokens=min(16000, 400 * len(clients) + 500),
+        timeout_s=120,
+    )
+    items = obj.get("items")
+    if not isinstance(items, list):
+        raise OpenAIError("JSON missing 'items'")
+    return {
+        str(it.get("phone") or ""): it
+        for it in items
+        if isinstance(it, dict) and it.get("phone")
+    }
+
+
+def _resolve_provider(provider: str) -> tuple[str, Generator]:
+    p = (provider or "auto").strip().lower()
+    if p == "auto":
+        has_key = bool(str(settings.OPENAI_API_KEY or "").strip())
+        llm_on = str(settings.AI_PROVIDER or "auto").strip().lower() != "off"
+        p = "openai" if has_key and llm_on else "stub"
+    if p == "openai":
+        return "openai", openai_generator
+    if p == "stub":
+        return "stub", stub_generator
+    raise ValueError(f"Unknown provider: {provider}")
+
+
+# ── Сохранение ───────────────────────────────────────────────
+def save_suggestions(
+    db: Session,
+    tenant_id: int,
+    segment_key: Optional[str],
+    rows: list[dict[str, Any]],
+) -> int:
+    """rows: [{"user_id","phone","answer","insights","recommendations","provider","model"}]."""
+    if not rows:
+        return 0
+    t = ClientAiSuggestion.__table__
+    now = datetime.utcnow()
+    for i in range(0, len(rows), _CHUNK):
+        chunk = rows[i:i + _CHUNK]
+        db.execute(delete(t).where(t.c.user_id.in_([r["user_id"] for r in chunk])))
+        db.execute(insert(t), [
+            {
+                "tenant_id":            tenant_id,
+                "user_id":              r["user_id"],
+                "phone":                r["phone"],
+                "segment_key":          segment_key,
+                "answer":               r["answer"],
+                "insights_json":        json.dumps(r["insights"], ensure_ascii=False),
+                "recommendations_json": json.dumps(r["recommendations"], ensure_ascii=False),
+                "provider":             r["provider"],
+                "model":                r.get("model"),
+                "created_at":           now,
+            }
+            for r in chunk
+        ])
+    db.commit()
+    return len(rows)
+
+
+def _validated(obj: dict[str, Any]) -> Optional[dict[str, Any]]:
+    # Та же валидация и санитайз target, что у интерактивного AI
+    from app.api.ai import _validate_llm_shape
+
+    try:
+        answer, insights, recos = _validate_llm_shape(obj)
+    except OpenAIError:
+        return None
+    return {
+        "answer": answer,
+        "insights": insights,
+        "recommendations": [r.model_dump() for r in recos],
+    }
+
+
+# ── Прогон ───────────────────────────────────────────────────
+def _load(tenant_id: int, segment_key: str, limit: Optional[int]) -> list[dict[str, Any]]:
+    db = tenant_session(tenant_id)
+    try:
+        ids = segment_user_ids(db, tenant_id, segment_key, limit=limit)
+        return build_client_payloads(db, tenant_id, ids)
+    finally:
+        db.close()
+
+
+def _save(tenant_id: int, segment_key: str, rows: list[dict[str, Any]]) -> int:
+    db = tenant_session(tenant_id)
+    try:
+        return save_suggestions(db, tenant_id, segment_key, rows)
+    finally:
+        db.close()
+
+
+async def run_batch(
+    tenant_id: int,
+    segment_key: str = "risk",
+    provider: str = "auto",
+    limit: Optional[int] = None,
+    per_prompt: Optional[int] = None,
+    generator: Optional[Generator] = None,
+) -> dict[str, Any]:
+    t0 = time.perf_counter()
+    name, gen = _resolve_provider(provider)
+    if generator is not None:
+        gen = generator
+    model = str(settings.OPENAI_MODEL or "") if name == "openai" else None
+
+    clients = await run_db(_load, tenant_id, segment_key, limit)
+
+    size = max(1, int(per_prompt or settings.AI_BATCH_CLIENTS_PER_PROMPT))
+    packs = [clients[i:i + size] for i in range(0, len(clients), size)]
+    sem = asyncio.Semaphore(max(1, int(settings.AI_BATCH_CONCURRENCY)))
+    stats = {"clients": len(clients), "prompts": 0, "llm": 0, "stub": 0, "errors": 0}
+
+    async def _pack(pack: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        async with sem:
+            try:
+                got = await gen(pack)
+                stats["prompts"] += 1
+            except Exception as e:
+                logger.error(f"AI batch pack failed ({len(pack)} clients): {e}")
+                stats["errors"] += 1
+                got = {}
+
+        rows: list[dict[str, Any]] = []
+        fallback: Optional[dict[str, dict[str, Any]]] = None
+        for c in pack:
+            item = _validated(got[c["phone"]]) if c["phone"] in got else None
+            source = name
+            if item is None:
+                # Модель пропустила клиента или ответила мусором — эвристика
+                if fallback is None:
+                    fallback = await stub_generator(pack)
+                item = _validated(fallback[c["phone"]])
+                source = "stub"
+            stats["llm" if source != "stub" else "stub"] += 1
+            rows.append({
+                "user_id": c["user_id"], "phone": c["phone"],
+                "provider": source, "model": model if source != "stub" else None,
+                **item,
+            })
+        return rows
+
+    results = await asyncio.gather(*(_pack(p) for p in packs))
+    rows = [r for pack_rows in results for r in pack_rows]
+    stats["saved"] = await run_db(_save, tenant_id, segment_key, rows)
+    stats["provider"] = name
+    stats["seconds"] = round(time.perf_counter() - t0, 2)
+    logger.info(f"AI batch tenant={tenant_id} segment={segment_key}: {stats}")
+    return stats
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Batch next-best-action для клиентов сегмента")
+    ap.add_argument("--tenant", type=int, required=True)
+    ap.add_argument("--segment", default="risk", choices=sorted(SEGMENT_DEFS))
+    ap.add_argument("--provider", default="auto", choices=("auto", "openai", "stub"))
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--per-prompt", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # CLI может запускаться до первого старта приложения (create_all в main.py)
+    ClientAiSuggestion.__table__.create(bind=engine, checkfirst=True)
+    stats = asyncio.run(run_batch(
+        args.tenant, args.segment, args.provider, limit=args.limit, per_prompt=args.per_prompt,
+    ))
+    print(json.dumps(stats, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# app/ai/cache.py
+"""
+Кэш ответов LLM.
+
+Ключ — sha256(provider, model, system prompt, user prompt). В user prompt
+входят метрики payload, поэтому при изменении данных ключ меняется сам и
+старый ответ просто перестаёт находиться (и вытесняется по TTL/размеру).
+
+Два уровня: LRU в памяти процесса (ответ за миллисекунды) и таблица
+ai_response_cache (переживает рестарт). Ошибки кэша не ломают AI-запрос.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import delete, func, select
+
+from app.core.concurrency import run_db
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.ai_response_cache import AiResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Поля payload, которые меняются на каждом вызове и не влияют на ответ
+VOLATILE_KEYS = frozenset({"generated_at"})
+
+_lock = threading.Lock()
+# key -> (время записи, unix; ответ модели)
+_mem: "OrderedDict[str, tuple[float, dict[str, Any]]]" = OrderedDict()
+
+
+def _ttl_s() -> int:
+    return max(0, int(settings.AI_CACHE_TTL_S or 0))
+
+
+def _max_entries() -> int:
+    return max(1, int(settings.AI_CACHE_MAX_ENTRIES or 1))
+
+
+def enabled() -> bool:
+    return _ttl_s() > 0
+
+
+def stable_payload(v: Any) -> Any:
+    """Копия payload без «волатильных» полей — чтобы одинаковые данные давали одинаковый промпт."""
+    if isinstance(v, dict):
+        return {k: stable_payload(x) for k, x in v.items() if k not in VOLATILE_KEYS}
+    if isinstance(v, list):
+        return [stable_payload(x) for x in v]
+    return v
+
+
+def cache_key(provider: str, model: str, system_prompt: str, user_prompt: str) -> str:
+    raw = json.dumps([provider, model, system_prompt, user_prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ── Память ───────────────────────────────────────────────────
+def _mem_get(key: str) -> Optional[dict[str, Any]]:
+    with _lock:
+        hit = _mem.get(key)
+        if hit is None:
+            return None
+        stored_at, obj = hit
+        if time.time() - stored_at > _ttl_s():
+            _mem.pop(key, None)
+            return None
+        _mem.move_to_end(key)
+        return obj
+
+
+def _mem_put(key: str, obj: dict[str, Any], stored_at: Optional[float] = None) -> None:
+    with _lock:
+        _mem[key] = (stored_at or time.time(), obj)
+        _mem.move_to_end(key)
+        while len(_mem) > _max_entries():
+            _mem.popitem(last=False)
+
+
+# ── Таблица ──────────────────────────────────────────────────
+def _db_get(key: str) -> Optional[tuple[float, dict[str, Any]]]:
+    since = datetime.utcnow() - timedelta(seconds=_ttl_s())
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(AiResponseCache.response_json, AiResponseCache.created_at).where(
+                AiResponseCache.key == key,
+                AiResponseCache.created_at >= since,
+            )
+        ).first()
+    finally:
+        db.close()
+    if not row:
+        return None
+    obj = json.loads(row[0])
+    stored_at = time.time() - (datetime.utcnow() - row[1]).total_seconds()
+    return stored_at, obj
+
+
+def _db_put(key: str, provider: str, model: str, obj: dict[str, Any]) -> None:
+    t = AiResponseCache.__table__
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.execute(delete(t).where(t.c.key == key))
+        db.execute(t.insert().values(
+            key=key, provider=provider, model=model,
+            response_json=json.dumps(obj, ensure_ascii=False),
+            created_at=now,
+        ))
+
+        # Вытеснение: протухшие + самые старые сверх лимита
+        db.execute(delete(t).where(t.c.created_at < now - timedelta(seconds=_ttl_s())))
+        total = int(db.execute(select(func.count()).select_from(t)).scalar() or 0)
+        extra = total - _max_entries()
+        if extra > 0:
+            oldest = select(t.c.key).order_by(t.c.created_at.asc()).limit(extra)
+            db.execute(delete(t).where(t.c.key.in_(oldest)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# ── API ──────────────────────────────────────────────────────
+async def get_cached_response(key: str) -> Optional[dict[str, Any]]:
+    if not enabled():
+        return None
+    obj = _mem_get(key)
+    if obj is not None:
+        return obj
+    try:
+        hit = await run_db(_db_get, key)
+    except Exception as e:
+        logger.warning(f"AI cache read error: {e}")
+        return None
+    if hit is None:
+        return None
+    stored_at, obj = hit
+    _mem_put(key, obj, stored_at)
+    return obj
+
+
+async def put_cached_response(key: str, provider: str, model: str, obj: dict[str, Any]) -> None:
+    if not enabled():
+        return
+    _mem_put(key, obj)
+    try:
+        await run_db(_db_put, key, provider, model, obj)
+    except Exception as e:
+        logger.warning(f"AI cache write error: {e}")
+
+
+def clear_memory_cache() -> None:
+    with _lock:
+        _mem.clear()
@@ -0,0 +1,149 @@
+# app/ai/compact.py
+"""
+Сжатие payload перед отправкой в LLM.
+
+Латентность и стоимость запроса растут линейно с размером промпта, а
+build_overview_payload отдаёт всё подряд: дневные ряды, вложенный
+analytics_overview, nav-подсказки. Здесь payload приводится к бюджету
+AI_PROMPT_TOKEN_BUDGET: числа округляются, дневные ряды сворачиваются в
+статистику, затем по порядку выбрасываются малоценные поля, пока оценка
+токенов не влезет в бюджет.
+"""
+from __future__ import annotations
+
+import copy
+import json
+from typing import Any
+
+from app.core.config import settings
+
+# Грубая оценка без токенизатора: ~4 байта UTF-8 на токен
+# (латиница ~4 символа, кириллица ~2 символа на токен)
+_BYTES_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len((text or "").encode("utf-8")) // _BYTES_PER_TOKEN)
+
+
+def payload_tokens(payload: Any) -> int:
+    return estimate_tokens(json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str))
+
+
+# ── Преобразования без потери смысла ─────────────────────────
+def _round(v: Any) -> Any:
+    if isinstance(v, float):
+        return int(round(v)) if abs(v) >= 100 else round(v, 1)
+    if isinstance(v, dict):
+        return {k: _round(x) for k, x in v.items()}
+    if isinstance(v, list):
+        return [_round(x) for x in v]
+    return v
+
+
+def _is_daily_series(v: Any) -> bool:
+    return (
+        isinstance(v, list) and len(v) >= 3
+        and all(isinstance(x, dict) and "day" in x for x in v)
+    )
+
+
+def summarize_series(rows: list[dict]) -> dict[str, Any]:
+    """Дневной ряд → несколько чисел: сумма, среднее, мин/макс, тренд последней недели."""
+    out: dict[str, Any] = {"days": len(rows), "from": rows[0].get("day"), "to": rows[-1].get("day")}
+    numeric = [k for k, x in rows[0].items() if k != "day" and isinstance(x, (int, float))]
+    for k in numeric:
+        vals = [float(r.get(k) or 0) for r in rows]
+        last7, prev = vals[-7:], vals[:-7]
+        avg_last7 = sum(last7) / len(last7)
+        avg_prev = sum(prev) / len(prev) if prev else 0.0
+        out[k] = {
+            "total": sum(vals),
+            "avg":   sum(vals) / len(vals),
+            "min":   min(vals),
+            "max":   max(vals),
+            "avg_last_7d": avg_last7,
+            "trend_last_7d_pct": round((avg_last7 - avg_prev) / avg_prev * 100, 1) if avg_prev else None,
+        }
+    return _round(out)
+
+
+def _collapse_series(v: Any) -> Any:
+    if _is_daily_series(v):
+        return summarize_series(v)
+    if isinstance(v, dict):
+        return {k: _collapse_series(x) for k, x in v.items()}
+    if isinstance(v, list):
+        return [_collapse_series(x) for x in v]
+    return v
+
+
+# ── Шаги с потерей деталей (по возрастанию ценности) ─────────
+def _drop_hints(p: dict) -> None:
+    for k in ("campaign_prefill_hint", "grant_bonus_hint", "analytics_overview_error"):
+        p.pop(k, None)
+    ov = p.get("analytics_overview")
+    if isinstance(ov, dict):
+        for item in (ov.get("segments") or []) + (ov.get("alerts") or []):
+            if isinstance(item, dict):
+                item.pop("hint", None)
+                item.pop("href", None)
+
+
+def _drop_nav(p: dict) -> None:
+    # Формат target и так описан в AI_TARGET_POLICY_RU
+    p.pop("nav_whitelist", None)
+
+
+def _drop_overview_duplicates(p: dict) -> None:
+    # Сегменты уже есть в segments_allowed, окна 7/30 — в summary
+    ov = p.get("analytics_overview")
+    if isinstance(ov, dict):
+        ov.pop("segments", None)
+        ov["windows"] = [w for w in (ov.get("windows") or []) if isinstance(w, dict) and w.get("days") == 90]
+
+
+def _trim_lists(p: dict) -> None:
+    if isinstance(p.get("top_clients"), list):
+        p["top_clients"] = p["top_clients"][:3]
+    if isinstance(p.get("segments_allowed"), list):
+        p["segments_allowed"] = p["segments_allowed"][:8]
+
+
+def _drop_overview(p: dict) -> None:
+    p.pop("analytics_overview", None)
+
+
+_STEPS = (
+    ("hints", _drop_hints),
+    ("nav_whitelist", _drop_nav),
+    ("overview_duplicates", _drop_overview_duplicates),
+    ("lists", _trim_lists),
+    ("analytics_overview", _drop_overview),
+)
+
+
+def compact_payload(payload: dict[str, Any], budget: int | None = None) -> tuple[dict[str, Any], dict[str, Any]]:
+    """
+    (сжатый payload, meta). Исходный payload не меняется.
+    meta: payload_tokens_raw / payload_tokens / budget / dropped.
+    """
+    budget = int(budget if budget is not None else settings.AI_PROMPT_TOKEN_BUDGET or 0)
+    raw_tokens = payload_tokens(payload)
+
+    p = _round(_collapse_series(copy.deepcopy(payload)))
+    dropped: list[str] = []
+    if budget > 0:
+        for name, step in _STEPS:
+            if payload_tokens(p) <= budget:
+                break
+            step(p)
+            dropped.append(name)
+
+    meta = {
+        "payload_tokens_raw": raw_tokens,
+        "payload_tokens":     payload_tokens(p),
+        "budget":             budget,
+        "dropped":            dropped,
+    }
+    return p, meta
@@ -0,0 +1,69 @@
+# app/ai/flight.py
+"""
+Склейка одинаковых AI-запросов и лимит на тенанта.
+
+single_flight: одновременные запросы с одним ключом (тенант + вопрос)
+ждут одну общую задачу и получают её результат — payload и вызов LLM
+выполняются один раз. Отмена одного ожидающего (клиент закрыл вкладку)
+общую задачу не отменяет.
+
+tenant_slot: не больше AI_TENANT_CONCURRENCY одновременных вычислений
+на тенанта — один тенант не выбирает rate limit OpenAI и потоки воркера.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Состояние привязано к event loop (asyncio-примитивы нельзя делить между loop'ами)
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_inflight: dict[Hashable, asyncio.Task] = {}
+_slots: dict[Any, asyncio.Semaphore] = {}
+
+
+def _state() -> None:
+    global _loop, _inflight, _slots
+    loop = asyncio.get_running_loop()
+    if _loop is not loop:
+        _loop, _inflight, _slots = loop, {}, {}
+
+
+def tenant_slot(tenant_id: Optional[int]) -> asyncio.Semaphore:
+    _state()
+    sem = _slots.get(tenant_id)
+    if sem is None:
+        sem = asyncio.Semaphore(max(1, int(settings.AI_TENANT_CONCURRENCY)))
+        _slots[tenant_id] = sem
+    return sem
+
+
+async def single_flight(key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+    """Выполнить factory() один раз на все одновременные вызовы с этим ключом."""
+    _state()
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda t, k=key: _forget(k, t))
+    else:
+        logger.debug(f"AI single-flight join: {key!r}")
+    return await asyncio.shield(task)
+
+
+def _forget(key: Hashable, task: asyncio.Task) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Ошибку уже получили ожидающие; если их не осталось — не шумим в лог asyncio
+    if not task.cancelled():
+        task.exception()
+
+
+def inflight_count() -> int:
+    return len(_inflight)
@@ -5,9 +5,10 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Any
 
-from sqlalchemy import func
+from sqlalchemy import func, select, union_all
 from sqlalchemy.orm import Session
 
+from app.models.customer_stats import CustomerStats
 from app.models.transaction import Transaction
 from app.models.user import User
 
@@ -25,20 +26,53 @@ def _utcnow() -> datetime:
     return datetime.utcnow()
 
 
+def _lifetime_by_user(tenant_id: int | None = None, completed_only: bool = False):
+    """
+    uid → spent / txn_count / last_tx за всю историю: живые transactions +
+    архивные итоги customer_stats (архиватор переносит старые строки туда).
+    completed_only — живые строки только status="completed", из архива —
+    покупки без полного возврата (net_spent / purchases_count).
+    """
+    live = (
+        select(
+            Transaction.user_id.label("user_id"),
+            func.coalesce(func.sum(Transaction.paid_amount), 0).label("spent"),
+            func.count(Transaction.id).label("txn_count"),
+            func.max(Transaction.created_at).label("last_tx"),
+        )
+        .group_by(Transaction.user_id)
+    )
+    arch = select(
+        CustomerStats.user_id,
+        CustomerStats.net_spent if completed_only else CustomerStats.paid_total,
+        CustomerStats.purchases_count if completed_only else CustomerStats.tx_count,
+        CustomerStats.last_tx_at,
+    )
+    if completed_only:
+        live = live.where(Transaction.status == "completed")
+    if tenant_id:
+        live = live.where(Transaction.tenant_id == tenant_id)
+        arch = arch.where(CustomerStats.tenant_id == tenant_id)
+    both = union_all(live, arch).subquery()
+    return (
+        select(
+            both.c.user_id,
+            func.sum(both.c.spent).label("spent"),
+            func.sum(both.c.txn_count).label("txn_count"),
+            func.max(both.c.last_tx).label("last_tx"),
+        )
+        .group_by(both.c.user_id)
+        .subquery("lifetime")
+    )
+
+
 def calc_overview_numbers(db: Session, now: datetime | None = None) -> OverviewNumbers:
     now = now or _utcnow()
     since_30d = now - timedelta(days=30)
 
     clients = int(db.query(func.count(User.id)).scalar() or 0)
 
-    subq_last = (
-        db.query(
-            Transaction.user_id.label("user_id"),
-            func.max(Transaction.created_at).label("last_tx"),
-        )
-        .group_by(Transaction.user_id)
-        .subquery()
-    )
+    subq_last = _lifetime_by_user()
 
     active_30d = int(
         db.query(func.count(subq_last.c.user_id))
@@ -76,14 +110,8 @@ def calc_overview_numbers(db: Session, now: datetime | None = None) -> OverviewN
 
 
 def calc_top_clients_share(db: Session) -> dict[str, Any]:
-    rows = (
-        db.query(
-            Transaction.user_id,
-            func.coalesce(func.sum(Transaction.paid_amount), 0).label("spent"),
-        )
-        .group_by(Transaction.user_id)
-        .all()
-    )
+    lifetime = _lifetime_by_user()
+    rows = db.query(lifetime.c.spent).all()
     if not rows:
         return {"top_20_share": 0.0, "users_with_tx": 0, "total_spent": 0, "top_n": 0}
 
@@ -143,15 +171,9 @@ def build_overview_payload(db: Session, tenant_id: int | None = None) -> dict[st
     # ── Кол-во клиентов ──────────────────────────────────────
     clients = int(_userq().with_entities(func.count(User.id)).scalar() or 0)
 
-    subq_last = (
-        _txq()
-        .with_entities(
-            Transaction.user_id.label("user_id"),
-            func.max(Transaction.created_at).label("last_tx"),
-        )
-        .group_by(Transaction.user_id)
-        .subquery()
-    )
+    # последняя покупка — с учётом архива, иначе клиенты с архивированной
+    # историей (самые «уснувшие») выпадали бы из churn_risk
+    subq_last = _lifetime_by_user(tenant_id)
 
     active_30d = int(
         db.query(func.count(subq_last.c.user_id))
@@ -242,16 +264,10 @@ def build_overview_payload(db: Session, tenant_id: int | None = None) -> dict[st
     # ── Топ-5 клиентов по выручке ────────────────────────────
     top5: list[dict] = []
     try:
+        lifetime = _lifetime_by_user(tenant_id, completed_only=True)
         top_rows = (
-            _txq()
-            .with_entities(
-                Transaction.user_id,
-                func.coalesce(func.sum(Transaction.paid_amount), 0).label("spent"),
-                func.count(Transaction.id).label("txn_count"),
-            )
-            .filter(Transaction.status == "completed")
-            .group_by(Transaction.user_id)
-            .order_by(func.sum(Transaction.paid_amount).desc())
+            db.query(lifetime.c.user_id, lifetime.c.spent, lifetime.c.txn_count)
+            .order_by(lifetime.c.spent.desc())
             .limit(5)
             .all()
         )
@@ -340,4 +356,20 @@ def build_overview_payload(db: Session, tenant_id: int | None = None) -> dict[st
             {"key": "new",    "title": "Новые за 30 дней", "count": new_clients_30d},
         ]
 
-    return payload
\ No newline at end of file
+    return payload
+
+
+def client_ai_payload(summary: dict[str, Any]) -> dict[str, Any]:
+    """Сводка клиента (app.services.client_summary) → payload для LLM."""
+    last = summary.get("last_purchase_at")
+    return {
+        "phone": summary["phone"],
+        "full_name": summary.get("full_name"),
+        "tier": summary.get("tier"),
+        "bonus": dict(summary.get("bonus") or {}),
+        "total_spent": summary.get("total_spent", 0),
+        "purchases_count": summary.get("purchases_count", 0),
+        "avg_check": summary.get("avg_check", 0.0),
+        "last_purchase_at": last.isoformat() if isinstance(last, datetime) else last,
+        "recency_days": summary.get("recency_days"),
+    }
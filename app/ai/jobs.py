@@ -0,0 +1,120 @@
+# app/ai/jobs.py
+"""
+Фоновые AI-задачи (async-режим /api/ai/ask).
+
+Запрос сразу получает эвристический ответ и job_id, а вызов LLM идёт
+фоновой asyncio-задачей — HTTP-воркер не ждёт модель. Клиент опрашивает
+GET /api/ai/jobs/{id} (можно с ?wait=N — long-poll до готовности).
+
+Реестр в памяти процесса: задачи живут AI_JOB_TTL_S после завершения,
+незавершённых на тенанта — не больше AI_JOB_MAX_PER_TENANT.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobLimitError(RuntimeError):
+    pass
+
+
+@dataclass
+class AiJob:
+    id: str
+    tenant_id: Optional[int]
+    status: str = "queued"  # queued / running / done / error
+    result: Optional[dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error":  self.error,
+        }
+
+
+_jobs: dict[str, AiJob] = {}
+
+
+def _cleanup() -> None:
+    ttl = max(1, int(settings.AI_JOB_TTL_S))
+    now = time.time()
+    for jid in [j.id for j in _jobs.values() if j.finished_at and now - j.finished_at > ttl]:
+        _jobs.pop(jid, None)
+
+
+def _active(tenant_id: Optional[int]) -> int:
+    return sum(1 for j in _jobs.values() if j.tenant_id == tenant_id and j.finished_at is None)
+
+
+def submit_job(tenant_id: Optional[int], factory: Callable[[], Awaitable[Any]]) -> AiJob:
+    """
+    Запустить factory() фоном. Результат (pydantic-модель или dict)
+    сохраняется в job.result. JobLimitError — у тенанта слишком много задач.
+    """
+    _cleanup()
+    if _active(tenant_id) >= max(1, int(settings.AI_JOB_MAX_PER_TENANT)):
+        raise JobLimitError("Too many AI jobs in progress")
+
+    job = AiJob(id=uuid.uuid4().hex, tenant_id=tenant_id)
+    _jobs[job.id] = job
+    job.task = asyncio.get_running_loop().create_task(_run(job, factory))
+    return job
+
+
+async def _run(job: AiJob, factory: Callable[[], Awaitable[Any]]) -> None:
+    job.status = "running"
+    try:
+        out = await factory()
+        job.result = out.model_dump() if hasattr(out, "model_dump") else out
+        job.status = "done"
+    except asyncio.CancelledError:
+        job.status, job.error = "error", "cancelled"
+        raise
+    except Exception as e:
+        logger.error(f"AI job {job.id} failed: {e}")
+        job.status, job.error = "error", str(e)
+    finally:
+        job.finished_at = time.time()
+        job.done.set()
+
+
+def get_job(job_id: str, tenant_id: Optional[int]) -> Optional[AiJob]:
+    """Задача тенанта (чужие не видны)."""
+    job = _jobs.get(job_id)
+    if job is None or job.tenant_id != tenant_id:
+        return None
+    return job
+
+
+async def wait_job(job: AiJob, timeout_s: float) -> AiJob:
+    if timeout_s > 0 and not job.done.is_set():
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            pass
+    return job
+
+
+async def cancel_jobs() -> None:
+    """Shutdown: отменить незавершённые задачи."""
+    tasks = [j.task for j in _jobs.values() if j.task and not j.task.done()]
+    for t in tasks:
+        t.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
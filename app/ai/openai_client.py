@@ -1,18 +1,108 @@
 # app/ai/openai_client.py
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, AsyncIterator, Optional
+import asyncio
 import json
+import logging
 import re
 
 import httpx
+import openai
 from openai import AsyncOpenAI
 
+from app.core.circuit_breaker import Deadline, DeadlineExceeded, get_breaker
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
 
 class OpenAIError(RuntimeError):
     pass
 
 
+# ── Общий клиент ─────────────────────────────────────────────
+# Один AsyncOpenAI на процесс: пул соединений и TLS-сессии переиспользуются
+# между запросами. Пересоздаётся только при смене ключа или event loop.
+_client: Optional[AsyncOpenAI] = None
+_client_key: Optional[str] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# model -> "responses" | "chat": какой API уже сработал для модели
+_api_flavour: dict[str, str] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client(api_key: str) -> AsyncOpenAI:
+    http2 = bool(settings.OPENAI_HTTP2) and _http2_available()
+    http_client = openai.DefaultAsyncHttpxClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=int(settings.OPENAI_POOL_MAX_CONNECTIONS),
+            max_keepalive_connections=int(settings.OPENAI_POOL_MAX_KEEPALIVE),
+            keepalive_expiry=float(settings.OPENAI_KEEPALIVE_EXPIRY_S),
+        ),
+    )
+    return AsyncOpenAI(api_key=api_key, http_client=http_client)
+
+
+def get_openai_client(api_key: str) -> AsyncOpenAI:
+    """Ленивый общий клиент (создаётся при первом запросе)."""
+    global _client, _client_key, _client_loop
+
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_key != api_key or _client_loop is not loop:
+        old = _client
+        _client = _build_client(api_key)
+        _client_key = api_key
+        _client_loop = loop
+        if old is not None:
+            # Старый клиент закрываем в фоне — в нём могут быть активные запросы
+            loop.create_task(_close_quietly(old))
+    return _client
+
+
+async def _close_quietly(client: AsyncOpenAI) -> None:
+    try:
+        await client.close()
+    except Exception as e:
+        logger.debug(f"OpenAI client close error: {e}")
+
+
+async def close_openai_client() -> None:
+    """Закрывает общий клиент (shutdown)."""
+    global _client, _client_key, _client_loop
+    client, _client, _client_key, _client_loop = _client, None, None, None
+    if client is not None:
+        await _close_quietly(client)
+
+
+# Ошибки, после которых Responses API для модели больше не пробуем
+# (старый SDK без client.responses, модель/эндпоинт не поддерживает формат)
+_UNSUPPORTED_ERRORS: tuple[type[BaseException], ...] = (
+    AttributeError,
+    TypeError,
+    openai.NotFoundError,
+    openai.UnprocessableEntityError,
+)
+# 400 обычно про сам запрос (промпт, контент, лимиты) — модель закрепляем
+# за chat только при явном «не поддерживается»
+_UNSUPPORTED_CODES = {"unsupported_parameter", "unsupported_value", "unsupported_model"}
+
+
+def _is_unsupported(e: BaseException) -> bool:
+    if isinstance(e, _UNSUPPORTED_ERRORS):
+        return True
+    return isinstance(e, openai.BadRequestError) and getattr(e, "code", None) in _UNSUPPORTED_CODES
+
+
 _JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
 
 
@@ -72,64 +162,307 @@ def _schema() -> dict[str, Any]:
     }
 
 
+# ── Circuit breaker ──────────────────────────────────────────
+# Сбоем провайдера считаются только таймауты, обрывы соединения, 429 и 5xx;
+# битый JSON или 400 от модели — не повод размыкать цепь.
+_PROVIDER_FAILURES: tuple[type[BaseException], ...] = (
+    openai.APIConnectionError,   # в т.ч. APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    httpx.TransportError,
+    asyncio.TimeoutError,
+    DeadlineExceeded,
+)
+
+
+def _is_provider_failure(e: BaseException) -> bool:
+    while e is not None:
+        if isinstance(e, _PROVIDER_FAILURES):
+            return True
+        e = e.__cause__
+    return False
+
+
 async def openai_generate_json(
     system_prompt: str,
     user_prompt: str,
     *,
     api_key: str | None,
     model: str | None,
-    timeout_s: int = 40,
+    timeout_s: float = 40,
+    usage_out: dict[str, int] | None = None,
+    schema: dict[str, Any] | None = None,
+    schema_name: str = "ltv_ai_response",
+    max_output_tokens: int = 2000,
 ) -> dict[str, Any]:
+    """
+    timeout_s — общий дедлайн на все попытки (Responses + fallback на chat).
+    usage_out — сюда кладётся фактический расход токенов (prompt/completion).
+    schema — своя JSON Schema ответа (по умолчанию форма AiAskOut).
+    При разомкнутой цепи "openai" сразу OpenAIError — без похода в сеть.
+    """
     key = (api_key or "").strip()
     if not key:
         raise OpenAIError("OPENAI_API_KEY is missing")
 
+    breaker = get_breaker("openai")
+    if not breaker.allow():
+        raise OpenAIError("OpenAI circuit is open")
+
+    deadline = Deadline(timeout_s)
+    recorded = False
+    try:
+        obj = await asyncio.wait_for(
+            _generate_json(
+                system_prompt, user_prompt, key, model, deadline, usage_out,
+                schema, schema_name, max_output_tokens,
+            ),
+            timeout=max(0.1, deadline.remaining()),
+        )
+        breaker.record_success()
+        recorded = True
+    except asyncio.TimeoutError as e:
+        breaker.record_failure(f"deadline {timeout_s}s exceeded")
+        recorded = True
+        raise OpenAIError(f"OpenAI deadline {timeout_s}s exceeded") from e
+    except Exception as e:
+        if _is_provider_failure(e):
+            breaker.record_failure(e)
+        else:
+            breaker.record_success()  # провайдер ответил, ошибка в содержимом
+        recorded = True
+        raise
+    finally:
+        if not recorded:
+            # отмена задачи (CancelledError) — проба half-open не должна зависнуть
+            breaker.record_cancelled()
+    return obj
+
+
+async def _generate_json(
+    system_prompt: str,
+    user_prompt: str,
+    key: str,
+    model: str | None,
+    deadline: Deadline,
+    usage_out: dict[str, int] | None,
+    schema: dict[str, Any] | None,
+    schema_name: str,
+    max_output_tokens: int,
+) -> dict[str, Any]:
     m = (model or "").strip() or "gpt-4o-mini"
 
-    client = AsyncOpenAI(
-        api_key=key,
-        timeout=httpx.Timeout(timeout_s),
-    )
+    shared = get_openai_client(key)
+    client = shared.with_options(timeout=httpx.Timeout(deadline.timeout()))
+    flavour = _api_flavour.get(m)
 
-    # Сначала пробуем Responses API с JSON Schema (структурированный вывод)
+    # Сначала пробуем Responses API с JSON Schema (структурированный вывод),
+    # если для модели уже не выяснилось, что работает только chat.completions
     _responses_err: str | None = None
+    if flavour != "chat":
+        try:
+            obj = await _responses_json(
+                client, m, system_prompt, user_prompt, usage_out,
+                schema=schema, schema_name=schema_name, max_output_tokens=max_output_tokens,
+            )
+            if obj is not None:
+                return obj
+        except OpenAIError:
+            raise
+        except Exception as e:
+            if _is_unsupported(e):
+                _api_flavour[m] = "chat"
+                logger.info(f"OpenAI: Responses API unavailable for {m}, using chat.completions ({e})")
+            # иначе сетевая/временная ошибка или 400 на сам запрос — флейвор не запоминаем
+            _responses_err = str(e)
+
+    # Fallback: chat.completions (работает со всеми версиями SDK и моделями);
+    # получает остаток дедлайна, а не полный таймаут заново
     try:
-        resp = await client.responses.create(
-            model=m,
-            input=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user",   "content": user_prompt},
-            ],
-            text={
-                "format": {
-                    "type": "json_schema",
-                    "name": "ltv_ai_response",
-                    "schema": _schema(),
-                    "strict": True,
-                }
-            },
-            temperature=0.25,
-            max_output_tokens=2000,  # было 900 — AI обрезал длинные аналитические ответы
-        )
-        text = (getattr(resp, "output_text", None) or "").strip()
-        if text:
-            json_text = _extract_json_text(text)
-            try:
-                obj = json.loads(json_text)
-                if isinstance(obj, dict):
-                    return obj
-            except Exception as e:
-                raise OpenAIError(f"Responses API JSON parse error: {e}")
+        client = shared.with_options(timeout=httpx.Timeout(deadline.timeout()))
+        return await _chat_json(client, m, system_prompt, user_prompt, usage_out, max_output_tokens)
     except OpenAIError:
         raise
+    except Exception as e2:
+        if flavour == "chat" and isinstance(e2, openai.BadRequestError):
+            # Запомненный путь перестал работать — в следующий раз начнём сначала
+            _api_flavour.pop(m, None)
+        raise OpenAIError(
+            f"Both APIs failed."
+            + (f" Responses: {_responses_err}." if _responses_err else "")
+            + f" Chat: {e2}"
+        ) from e2
+
+
+def _fill_usage(usage_out: dict[str, int] | None, usage: Any, prompt_attr: str, completion_attr: str) -> None:
+    if usage_out is None or usage is None:
+        return
+    for attr, name in ((prompt_attr, "prompt_tokens"), (completion_attr, "completion_tokens")):
+        v = getattr(usage, attr, None)
+        if isinstance(v, int):
+            usage_out[name] = v
+
+
+async def _responses_json(
+    client: AsyncOpenAI, m: str, system_prompt: str, user_prompt: str,
+    usage_out: dict[str, int] | None = None,
+    schema: dict[str, Any] | None = None,
+    schema_name: str = "ltv_ai_response",
+    max_output_tokens: int = 2000,
+) -> Optional[dict[str, Any]]:
+    """None — пустой ответ (пробуем chat.completions)."""
+    resp = await client.responses.create(
+        model=m,
+        input=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user",   "content": user_prompt},
+        ],
+        text={
+            "format": {
+                "type": "json_schema",
+                "name": schema_name,
+                "schema": schema or _schema(),
+                "strict": True,
+            }
+        },
+        temperature=0.25,
+        max_output_tokens=max_output_tokens,  # было 900 — AI обрезал длинные аналитические ответы
+    )
+    _fill_usage(usage_out, getattr(resp, "usage", None), "input_tokens", "output_tokens")
+    text = (getattr(resp, "output_text", None) or "").strip()
+    if not text:
+        return None
+    json_text = _extract_json_text(text)
+    try:
+        obj = json.loads(json_text)
     except Exception as e:
-        # Responses API недоступна (старая версия SDK, модель не поддерживает) —
-        # fallback на стандартный chat.completions
-        _responses_err = str(e)
+        raise OpenAIError(f"Responses API JSON parse error: {e}")
+    if not isinstance(obj, dict):
+        raise OpenAIError("Responses API JSON root must be object")
+    _api_flavour[m] = "responses"
+    return obj
+
+
+async def _chat_json(
+    client: AsyncOpenAI, m: str, system_prompt: str, user_prompt: str,
+    usage_out: dict[str, int] | None = None,
+    max_output_tokens: int = 2000,
+) -> dict[str, Any]:
+    chat_resp = await client.chat.completions.create(
+        model=m,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user",   "content": user_prompt},
+        ],
+        temperature=0.25,
+        max_tokens=max_output_tokens,
+        response_format={"type": "json_object"},
+    )
+    _fill_usage(usage_out, getattr(chat_resp, "usage", None), "prompt_tokens", "completion_tokens")
+    text = (chat_resp.choices[0].message.content or "").strip()
+    if not text:
+        raise OpenAIError("chat.completions returned empty")
+    json_text = _extract_json_text(text)
+    obj = json.loads(json_text)
+    if not isinstance(obj, dict):
+        raise OpenAIError("chat.completions JSON root must be object")
+    return obj
+
+
+# ── Стриминг ─────────────────────────────────────────────────
+async def openai_stream_json(
+    system_prompt: str,
+    user_prompt: str,
+    *,
+    api_key: str | None,
+    model: str | None,
+    timeout_s: float = 60,
+) -> AsyncIterator[str]:
+    """
+    Текст ответа модели кусками по мере генерации (JSON целиком — после
+    склейки всех кусков). Тот же выбор API и тот же breaker "openai",
+    что и в openai_generate_json.
+    """
+    key = (api_key or "").strip()
+    if not key:
+        raise OpenAIError("OPENAI_API_KEY is missing")
+
+    breaker = get_breaker("openai")
+    if not breaker.allow():
+        raise OpenAIError("OpenAI circuit is open")
 
-    # Fallback: chat.completions (работает со всеми версиями SDK и моделями)
+    outcome = None
     try:
-        chat_resp = await client.chat.completions.create(
+        async for delta in _stream_json(system_prompt, user_prompt, key, model, timeout_s):
+            yield delta
+        outcome = "ok"
+    except Exception as e:
+        outcome = "failure" if _is_provider_failure(e) else "ok"
+        if outcome == "failure":
+            breaker.record_failure(e)
+        raise
+    finally:
+        # GeneratorExit / CancelledError при обрыве SSE — тоже исход для breaker
+        if outcome == "ok":
+            breaker.record_success()
+        elif outcome is None:
+            breaker.record_cancelled()
+
+
+async def _stream_json(
+    system_prompt: str,
+    user_prompt: str,
+    key: str,
+    model: str | None,
+    timeout_s: float,
+) -> AsyncIterator[str]:
+    m = (model or "").strip() or "gpt-4o-mini"
+    client = get_openai_client(key).with_options(timeout=httpx.Timeout(timeout_s))
+
+    if _api_flavour.get(m) != "chat":
+        started = False
+        try:
+            stream = await client.responses.create(
+                model=m,
+                input=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user",   "content": user_prompt},
+                ],
+                text={
+                    "format": {
+                        "type": "json_schema",
+                        "name": "ltv_ai_response",
+                        "schema": _schema(),
+                        "strict": True,
+                    }
+                },
+                temperature=0.25,
+                max_output_tokens=2000,
+                stream=True,
+            )
+            async for event in stream:
+                etype = getattr(event, "type", "")
+                if etype == "response.output_text.delta":
+                    delta = getattr(event, "delta", "") or ""
+                    if delta:
+                        started = True
+                        yield delta
+                elif etype in ("response.failed", "error"):
+                    raise OpenAIError(f"Responses stream failed: {getattr(event, 'error', None) or etype}")
+            if started:
+                _api_flavour[m] = "responses"
+                return
+        except OpenAIError:
+            raise
+        except Exception as e:
+            if started:
+                raise OpenAIError(f"Responses stream broken: {e}") from e
+            if _is_unsupported(e):
+                _api_flavour[m] = "chat"
+                logger.info(f"OpenAI: Responses API unavailable for {m}, using chat.completions ({e})")
+
+    try:
+        chat_stream = await client.chat.completions.create(
             model=m,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -138,23 +471,26 @@ async def openai_generate_json(
             temperature=0.25,
             max_tokens=2000,
             response_format={"type": "json_object"},
+            stream=True,
         )
-        text = (chat_resp.choices[0].message.content or "").strip()
-        if not text:
-            raise OpenAIError(
-                f"chat.completions returned empty"
-                + (f" (responses err: {_responses_err})" if _responses_err else "")
-            )
-        json_text = _extract_json_text(text)
-        obj = json.loads(json_text)
-        if not isinstance(obj, dict):
-            raise OpenAIError("chat.completions JSON root must be object")
-        return obj
+        async for chunk in chat_stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if delta:
+                yield delta
     except OpenAIError:
         raise
-    except Exception as e2:
-        raise OpenAIError(
-            f"Both APIs failed."
-            + (f" Responses: {_responses_err}." if _responses_err else "")
-            + f" Chat: {e2}"
-        )
\ No newline at end of file
+    except Exception as e:
+        raise OpenAIError(f"chat.completions stream failed: {e}") from e
+
+
+def parse_json_text(text: str) -> dict[str, Any]:
+    """Склеенный текст ответа → dict (для стрима)."""
+    try:
+        obj = json.loads(_extract_json_text(text))
+    except Exception as e:
+        raise OpenAIError(f"JSON parse error: {e}")
+    if not isinstance(obj, dict):
+        raise OpenAIError("JSON root must be object")
+    return obj
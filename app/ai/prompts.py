@@ -87,7 +87,8 @@ SYSTEM_PROMPT_RU = """\
 
 
 def _pretty_json(obj: Any) -> str:
-    return json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=True)
+    # Без отступов: пробелы indent=2 — это лишние токены в каждом запросе
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
 
 
 def build_user_prompt(context: str, payload: dict[str, Any], question: str) -> str:
@@ -1,27 +1,35 @@
 # app/api/ai.py
 from __future__ import annotations
 
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 from datetime import datetime, timedelta
+import json
 from urllib.parse import urlparse, parse_qs
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
-from app.core.database import get_db
+from app.core.database import get_db, tenant_session
 from app.core.config import settings
+from app.core.concurrency import run_db
+from app.core.phone import normalize_phone as _norm_phone
 
-from app.schemas.ai import AiAskIn, AiAskOut, AiRecoOut
+from app.schemas.ai import AiAskIn, AiAskOut, AiJobOut, AiRecoOut
 from app.ai.prompts import SYSTEM_PROMPT_RU, build_user_prompt
-from app.ai.openai_client import openai_generate_json, OpenAIError
+from app.ai.openai_client import openai_generate_json, openai_stream_json, parse_json_text, OpenAIError
+from app.ai.compact import compact_payload, estimate_tokens
+from app.ai.cache import cache_key, get_cached_response, put_cached_response, stable_payload
 
 from app.models.user import User
-from app.models.transaction import Transaction
 from app.models.bonus_grant import BonusGrant
-from app.ai.insights import build_overview_payload
-from app.services.loyalty_engine import get_balances
+from app.models.client_ai_suggestion import ClientAiSuggestion
+from app.ai.insights import build_overview_payload, client_ai_payload
+from app.ai.flight import single_flight, tenant_slot
+from app.ai.jobs import JobLimitError, get_job, submit_job, wait_job
+from app.services.client_summary import client_summary
 
 from app.services.campaigns import (
     create_campaign as svc_create_campaign,
@@ -48,20 +56,6 @@ def _provider_order() -> list[str]:
     return ["openai"]
 
 
-# =========================
-# Phone normalize
-# =========================
-def _norm_phone(raw: str) -> str:
-    s = "".join(ch for ch in (raw or "") if ch.isdigit())
-    if s.startswith("8") and len(s) == 11:
-        s = "7" + s[1:]
-    if len(s) == 10:
-        s = "7" + s
-    if len(s) > 11:
-        s = s[-11:]
-    return s
-
-
 # =========================
 # Target sanitize
 # =========================
@@ -90,12 +84,19 @@ def _sanitize_target(target: str) -> str:
     return f"nav:{url}"
 
 
-def _build_user_prompt_safe(context: str, payload: dict[str, Any], question: str) -> str:
+def _build_user_prompt_safe(
+    context: str, payload: dict[str, Any], question: str,
+) -> tuple[str, dict[str, Any]]:
+    """(user prompt, meta с оценкой токенов)."""
+    # generated_at и т.п. меняются на каждом вызове — в промпт (и ключ кэша) не идут
+    payload, meta = compact_payload(stable_payload(payload))
     try:
         base = build_user_prompt(context, payload, question)
     except TypeError:
         base = build_user_prompt(payload)  # type: ignore[call-arg]
-    return f"{base}\n\n{AI_TARGET_POLICY_RU}".strip()
+    prompt = f"{base}\n\n{AI_TARGET_POLICY_RU}".strip()
+    meta["prompt_tokens_est"] = estimate_tokens(SYSTEM_PROMPT_RU) + estimate_tokens(prompt)
+    return prompt, meta
 
 
 # =========================
@@ -133,23 +134,41 @@ def _validate_llm_shape(obj: dict[str, Any]) -> tuple[str, list[str], list[AiRec
     return answer.strip(), [str(x) for x in insights[:10]], out_recos
 
 
+def _openai_settings() -> tuple[str, str]:
+    api_key = str(getattr(settings, "OPENAI_API_KEY", "") or "").strip()
+    model   = str(getattr(settings, "OPENAI_MODEL", "gpt-4o-mini") or "gpt-4o-mini").strip()
+    return api_key, model
+
+
 async def _try_llm(
     provider: str,
     context: str,
     payload: dict[str, Any],
     question: str,
-) -> tuple[str, str, list[str], list[AiRecoOut]]:
-    user_prompt = _build_user_prompt_safe(context, payload, question)
+) -> tuple[str, str, list[str], list[AiRecoOut], dict[str, Any]]:
+    user_prompt, meta = _build_user_prompt_safe(context, payload, question)
 
     if provider == "openai":
-        api_key = str(getattr(settings, "OPENAI_API_KEY", "") or "").strip()
-        model   = str(getattr(settings, "OPENAI_MODEL", "gpt-4o-mini") or "gpt-4o-mini").strip()
+        api_key, model = _openai_settings()
+        if not api_key:
+            raise OpenAIError("OPENAI_API_KEY is missing")
+
+        key = cache_key(provider, model, SYSTEM_PROMPT_RU, user_prompt)
+        cached = await get_cached_response(key)
+        if cached is not None:
+            answer, insights, recos = _validate_llm_shape(cached)
+            return "cached", answer, insights, recos, meta
+
+        usage: dict[str, int] = {}
         obj = await openai_generate_json(
             SYSTEM_PROMPT_RU, user_prompt,
-            api_key=api_key, model=model,
+            api_key=api_key, model=model, usage_out=usage,
+            timeout_s=float(settings.AI_DEADLINE_S),
         )
         answer, insights, recos = _validate_llm_shape(obj)
-        return "openai", answer, insights, recos
+        await put_cached_response(key, provider, model, obj)
+        meta.update(usage)
+        return "openai", answer, insights, recos, meta
 
     raise OpenAIError(f"Unknown provider: {provider}")
 
@@ -157,51 +176,19 @@ async def _try_llm(
 # =========================
 # Client payload builder
 # =========================
-def _build_client_payload(db: Session, raw_phone: str) -> dict[str, Any]:
+def _build_client_payload(db: Session, raw_phone: str, tenant_id: int | None = None) -> dict[str, Any]:
     phone = _norm_phone(raw_phone)
-    user = db.query(User).filter(User.phone == phone).first()
-    if not user:
+    summary = client_summary(db, tenant_id, phone)
+    if not summary:
         return {"error": "client_not_found", "phone": phone}
 
-    txs = (
-        db.query(Transaction)
-        .filter(Transaction.user_id == user.id)
-        .order_by(Transaction.created_at.desc())
-        .limit(50)
-        .all()
-    )
-
-    total_spent = sum(t.paid_amount for t in txs if t.paid_amount)
-    purchases_count = len(txs)
-    avg_check = round(total_spent / purchases_count, 2) if purchases_count else 0.0
-
-    last_tx = txs[0] if txs else None
-    last_purchase_at = last_tx.created_at.isoformat() if last_tx else None
-    recency_days: int | None = None
-    if last_tx:
-        recency_days = (datetime.utcnow() - last_tx.created_at).days
-
-    balances = get_balances(db, user.id)
-
-    return {
-        "phone": phone,
-        "full_name": user.full_name,
-        "tier": user.tier,
-        "bonus": {
-            "available": balances.get("available", 0),
-            "pending": balances.get("pending", 0),
-        },
-        "total_spent": total_spent,
-        "purchases_count": purchases_count,
-        "avg_check": avg_check,
-        "last_purchase_at": last_purchase_at,
-        "recency_days": recency_days,
-        "nav_whitelist": {
-            "client_card": f"nav:/admin/client/{phone}",
-            "transactions": f"nav:/admin/transactions?phone={phone}",
-            "grant_bonus": f"action:grant_bonus|phone={phone}|amount=5000|reason=Подарок от AI",
-        },
+    payload = client_ai_payload(summary)
+    payload["nav_whitelist"] = {
+        "client_card": f"nav:/admin/client/{phone}",
+        "transactions": f"nav:/admin/transactions?phone={phone}",
+        "grant_bonus": f"action:grant_bonus|phone={phone}|amount=5000|reason=Подарок от AI",
     }
+    return payload
 
 
 # =========================
@@ -314,86 +301,263 @@ def _heuristic_answer(context: str, payload: dict[str, Any], question: str) -> A
 # =========================
 # Endpoints: overview + ask
 # =========================
-@router.get("/overview")
-async def ai_overview(db: Session = Depends(get_db)) -> AiAskOut:
-    payload = build_overview_payload(db)
-    question = (
-        "Дай краткий обзор бизнеса: что хорошо, что требует внимания, "
-        "топ-3 приоритета для роста LTV."
-    )
+OVERVIEW_QUESTION = (
+    "Дай краткий обзор бизнеса: что хорошо, что требует внимания, "
+    "топ-3 приоритета для роста LTV."
+)
 
+
+def _tenant_id(request: Request) -> int | None:
+    u = getattr(request.state, "user", None) or {}
+    tid = u.get("tenant_id")
+    return int(tid) if tid else None
+
+
+def _load_payload(context: str, tenant_id: int | None, phone: str | None) -> dict[str, Any]:
+    """Своя сессия: общая задача single-flight может пережить запрос, который её запустил."""
+    db = tenant_session(tenant_id)
+    try:
+        if context == "business":
+            return build_overview_payload(db, tenant_id=tenant_id)
+        return _build_client_payload(db, phone or "", tenant_id=tenant_id)
+    finally:
+        db.close()
+
+
+async def _answer(context: str, payload: dict[str, Any], question: str) -> AiAskOut:
     last_err: str | None = None
     for prov in _provider_order():
         try:
-            mode, answer, insights, recos = await _try_llm(prov, "business", payload, question)
+            mode, answer, insights, recos, meta = await _try_llm(prov, context, payload, question)
             return AiAskOut(
-                mode=mode, context="business",
+                mode=mode, context=context,
                 answer=answer, insights=insights,
                 recommendations=recos, payload=payload, llm_error=None,
+                meta=meta,
             )
         except Exception as e:
             last_err = str(e)
 
     if _mock_allowed():
-        fb = _heuristic_answer("business", payload, question)
+        fb = _heuristic_answer(context, payload, question)
         fb.llm_error = last_err or "LLM disabled"
         return fb
 
     return AiAskOut(
-        mode="error", context="business",
+        mode="error", context=context,
         answer="", insights=[], recommendations=[],
         payload=payload, llm_error=last_err or "LLM disabled",
     )
 
 
+async def _compute(context: str, tenant_id: int | None, phone: str | None, question: str) -> AiAskOut:
+    async with tenant_slot(tenant_id):
+        payload = await run_db(_load_payload, context, tenant_id, phone)
+        return await _answer(context, payload, question)
+
+
+async def _answer_limited(context: str, tenant_id: int | None, payload: dict[str, Any], question: str) -> AiAskOut:
+    async with tenant_slot(tenant_id):
+        return await _answer(context, payload, question)
+
+
+async def _ask_shared(context: str, tenant_id: int | None, phone: str | None, question: str) -> AiAskOut:
+    # Одинаковые одновременные запросы тенанта ждут одно вычисление
+    key = (tenant_id, context, phone, " ".join(question.split()).lower())
+    out = await single_flight(key, lambda: _compute(context, tenant_id, phone, question))
+    # У каждого ожидающего своя копия — ответ дальше не мутируем общий объект
+    return out.model_copy(deep=True)
+
+
+@router.get("/overview")
+async def ai_overview(request: Request) -> AiAskOut:
+    return await _ask_shared("business", _tenant_id(request), None, OVERVIEW_QUESTION)
+
+
 @router.get("/ask")
 async def ai_ask_get(
+    request: Request,
     context: str = "business",
     question: Optional[str] = None,
     phone: Optional[str] = None,
-    db: Session = Depends(get_db),
 ) -> Any:
     if not question:
         return {"ok": True, "message": "Используй POST /api/ai/ask"}
     payload_in = AiAskIn(context=context, question=question, phone=phone)  # type: ignore
-    return await ai_ask(payload_in, db)
+    return await ai_ask(payload_in, request)
 
 
 @router.post("/ask", response_model=AiAskOut)
-async def ai_ask(payload_in: AiAskIn, db: Session = Depends(get_db)) -> AiAskOut:
+async def ai_ask(payload_in: AiAskIn, request: Request) -> AiAskOut:
     context = payload_in.context
 
-    if context == "business":
-        payload = build_overview_payload(db)
-    else:
+    phone: str | None = None
+    if context != "business":
         if not payload_in.phone:
             raise HTTPException(status_code=400, detail="phone required for client context")
-        payload = _build_client_payload(db, payload_in.phone)
+        phone = _norm_phone(payload_in.phone)
 
-    last_err: str | None = None
-    for prov in _provider_order():
-        try:
-            mode, answer, insights, recos = await _try_llm(prov, context, payload, payload_in.question)
-            return AiAskOut(
-                mode=mode, context=context,
-                answer=answer, insights=insights,
-                recommendations=recos, payload=payload, llm_error=None,
-            )
-        except Exception as e:
-            last_err = str(e)
+    tenant_id = _tenant_id(request)
+    if payload_in.async_mode:
+        return await _ask_async(context, tenant_id, phone, payload_in.question)
+    return await _ask_shared(context, tenant_id, phone, payload_in.question)
 
-    if _mock_allowed():
-        fb = _heuristic_answer(context, payload, payload_in.question)
-        fb.llm_error = last_err or "LLM disabled"
+
+async def _ask_async(context: str, tenant_id: int | None, phone: str | None, question: str) -> AiAskOut:
+    """Эвристика сразу + job_id; ответ LLM — через GET /ai/jobs/{job_id}."""
+    payload = await run_db(_load_payload, context, tenant_id, phone)
+    fb = _heuristic_answer(context, payload, question)
+
+    if not _provider_order():
+        fb.llm_error = "LLM disabled"
+        return fb
+
+    try:
+        job = submit_job(tenant_id, lambda: _answer_limited(context, tenant_id, payload, question))
+    except JobLimitError as e:
+        fb.llm_error = str(e)
         return fb
 
+    fb.job_id = job.id
+    return fb
+
+
+@router.get("/suggestions/{phone}", response_model=AiAskOut)
+def ai_suggestion_get(phone: str, request: Request, db: Session = Depends(get_db)) -> AiAskOut:
+    """Готовая подсказка из batch-прогона (python -m app.ai.batch) — без вызова LLM."""
+    q = db.query(ClientAiSuggestion).filter(ClientAiSuggestion.phone == _norm_phone(phone))
+    tenant_id = _tenant_id(request)
+    if tenant_id:
+        q = q.filter(ClientAiSuggestion.tenant_id == tenant_id)
+    row = q.order_by(ClientAiSuggestion.created_at.desc()).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="No AI suggestion for client")
+
     return AiAskOut(
-        mode="error", context=context,
-        answer="", insights=[], recommendations=[],
-        payload=payload, llm_error=last_err or "LLM disabled",
+        mode="batch", context="client",
+        answer=row.answer,
+        insights=json.loads(row.insights_json or "[]"),
+        recommendations=[AiRecoOut(**r) for r in json.loads(row.recommendations_json or "[]")],
+        meta={
+            "generated_at": row.created_at.isoformat(),
+            "provider":     row.provider,
+            "segment_key":  row.segment_key,
+        },
     )
 
 
+@router.get("/jobs/{job_id}", response_model=AiJobOut)
+async def ai_job_get(
+    job_id: str,
+    request: Request,
+    wait: float = Query(0, ge=0, le=30, description="long-poll: ждать готовности до N секунд"),
+) -> AiJobOut:
+    job = get_job(job_id, _tenant_id(request))
+    if not job:
+        raise HTTPException(status_code=404, detail="AI job not found")
+    await wait_job(job, wait)
+    return AiJobOut(**job.to_dict())
+
+
+# =========================
+# Endpoints: SSE stream
+# =========================
+# События (text/event-stream):
+#   fallback — эвристический ответ сразу, пока модель думает
+#   delta    — очередной кусок текста модели
+#   final    — провалидированный AiAskOut (всегда последнее событие)
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def _stream_answer(
+    context: str, tenant_id: int | None, phone: str | None, question: str,
+) -> AsyncIterator[str]:
+    async with tenant_slot(tenant_id):
+        try:
+            payload = await run_db(_load_payload, context, tenant_id, phone)
+        except Exception as e:
+            yield _sse("final", AiAskOut(
+                mode="error", context=context, answer="", insights=[],
+                recommendations=[], payload=None, llm_error=f"payload error: {e}",
+            ).model_dump())
+            return
+
+        fallback = _heuristic_answer(context, payload, question)
+        yield _sse("fallback", fallback.model_dump(exclude={"payload"}))
+
+        last_err: str | None = None
+        if "openai" in _provider_order():
+            api_key, model = _openai_settings()
+            user_prompt, meta = _build_user_prompt_safe(context, payload, question)
+            key = cache_key("openai", model, SYSTEM_PROMPT_RU, user_prompt)
+            try:
+                if not api_key:
+                    raise OpenAIError("OPENAI_API_KEY is missing")
+
+                obj = await get_cached_response(key)
+                mode = "cached"
+                if obj is None:
+                    parts: list[str] = []
+                    async for delta in openai_stream_json(
+                        SYSTEM_PROMPT_RU, user_prompt, api_key=api_key, model=model,
+                    ):
+                        parts.append(delta)
+                        yield _sse("delta", {"text": delta})
+                    obj = parse_json_text("".join(parts))
+                    mode = "openai"
+
+                answer, insights, recos = _validate_llm_shape(obj)
+                if mode == "openai":
+                    await put_cached_response(key, "openai", model, obj)
+                yield _sse("final", AiAskOut(
+                    mode=mode, context=context,
+                    answer=answer, insights=insights,
+                    recommendations=recos, payload=payload, llm_error=None,
+                    meta=meta,
+                ).model_dump())
+                return
+            except Exception as e:
+                last_err = str(e)
+
+        if _mock_allowed():
+            fallback.llm_error = last_err or "LLM disabled"
+            yield _sse("final", fallback.model_dump())
+            return
+
+        yield _sse("final", AiAskOut(
+            mode="error", context=context,
+            answer="", insights=[], recommendations=[],
+            payload=payload, llm_error=last_err or "LLM disabled",
+        ).model_dump())
+
+
+def _sse_response(gen: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        gen,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/overview/stream")
+async def ai_overview_stream(request: Request) -> StreamingResponse:
+    return _sse_response(_stream_answer("business", _tenant_id(request), None, OVERVIEW_QUESTION))
+
+
+@router.post("/ask/stream")
+async def ai_ask_stream(payload_in: AiAskIn, request: Request) -> StreamingResponse:
+    context = payload_in.context
+
+    phone: str | None = None
+    if context != "business":
+        if not payload_in.phone:
+            raise HTTPException(status_code=400, detail="phone required for client context")
+        phone = _norm_phone(payload_in.phone)
+
+    return _sse_response(_stream_answer(context, _tenant_id(request), phone, payload_in.question))
+
+
 # =========================
 # Execute
 # =========================
@@ -508,11 +672,22 @@ async def _handle_grant_bonus(
     if len(reason) > 255:
         reason = reason[:255]
 
-    # Находим клиента (tenant-aware)
-    tenant_id: int | None = None
     current_user = getattr(request.state, "user", None) or {}
-    tenant_id = current_user.get("tenant_id")
+    tenant_id: int | None = current_user.get("tenant_id")
+
+    await run_db(_grant_bonus_db, db, phone, amount, reason, tenant_id)
 
+    return AiExecuteOut(
+        ok=True,
+        performed=True,
+        action=action_label or "Начисление бонусов",
+        nav=f"/admin/client/{phone}",
+        message=f"✓ Начислено {amount:,} бонусов клиенту {phone}. Причина: {reason}",
+    )
+
+
+def _grant_bonus_db(db: Session, phone: str, amount: int, reason: str, tenant_id: int | None) -> None:
+    # Находим клиента (tenant-aware)
     q = db.query(User).filter(User.phone == phone)
     if tenant_id:
         q = q.filter(User.tenant_id == int(tenant_id))
@@ -542,14 +717,6 @@ async def _handle_grant_bonus(
     user.bonus_balance = (user.bonus_balance or 0) + amount
     db.commit()
 
-    return AiExecuteOut(
-        ok=True,
-        performed=True,
-        action=action_label or "Начисление бонусов",
-        nav=f"/admin/client/{phone}",
-        message=f"✓ Начислено {amount:,} бонусов клиенту {phone}. Причина: {reason}",
-    )
-
 
 async def _handle_create_campaign(
     qs: dict,
@@ -569,7 +736,7 @@ async def _handle_create_campaign(
     if bonus < 0 or bonus > 10_000_000:
         raise HTTPException(status_code=400, detail="bonus out of range")
 
-    c = svc_create_campaign(db, {
+    data = {
         "name": name,
         "segment_key": segment_key,
         "suggested_bonus": bonus,
@@ -577,26 +744,34 @@ async def _handle_create_campaign(
         "f_min": _qs_int(qs, "f_min") or None,
         "m_min": _qs_int(qs, "m_min") or None,
         "note": _qs_str(qs, "note") or None,
-    })
-
-    built = False
-    build_error: str | None = None
-    if _truthy(_qs_str(qs, "build")):
-        try:
-            svc_build_recipients(db, c.id)
-            built = True
-        except Exception as e:
-            # Не роняем всё из-за ошибки построения получателей
-            build_error = str(e)
+    }
+    campaign_id, built, build_error = await run_db(
+        _create_campaign_db, db, data, _truthy(_qs_str(qs, "build")),
+    )
 
     return AiExecuteOut(
         ok=True,
         performed=True,
         action=action_label or "Создание кампании",
-        nav=f"/admin/campaigns/{c.id}",
+        nav=f"/admin/campaigns/{campaign_id}",
         message=(
-            f"Кампания «{name}» создана (id={c.id}). "
+            f"Кампания «{name}» создана (id={campaign_id}). "
             + ("Получатели построены. " if built else "")
             + ("Открываю кампанию." if not build_error else f"Создана, но получателей не удалось построить: {build_error}")
         ),
-    )
\ No newline at end of file
+    )
+
+
+def _create_campaign_db(db: Session, data: dict, build: bool) -> tuple[int, bool, str | None]:
+    c = svc_create_campaign(db, data)
+
+    built = False
+    build_error: str | None = None
+    if build:
+        try:
+            svc_build_recipients(db, c.id)
+            built = True
+        except Exception as e:
+            # Не роняем всё из-за ошибки построения получателей
+            build_error = str(e)
+    return c.id, built, build_error
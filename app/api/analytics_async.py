@@ -0,0 +1,52 @@
+# app/api/analytics_async.py
+"""
+/api/analytics при DB_ASYNC=1 (вместо app.api.analytics).
+
+Обзор и RFM-сегменты — Python-агрегация поверх выборок по всем клиентам:
+на event loop она остановила бы воркер (SSE, вебхуки), поэтому считается
+в пуле потоков БД (run_db) на обычной Session, как AI-обзор.
+"""
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.core.concurrency import run_db
+from app.core.database import get_db
+from app.schemas.analytics import AnalyticsOverviewOut, AnalyticsSegmentClientsOut
+from app.services.analytics import build_analytics_overview, list_clients_by_segment
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+@router.get("/overview", response_model=AnalyticsOverviewOut)
+async def analytics_overview(db: Session = Depends(get_db)) -> AnalyticsOverviewOut:
+    data = await run_db(build_analytics_overview, db)
+    return AnalyticsOverviewOut.model_validate(data)
+
+
+@router.get("/segment/{key}", response_model=AnalyticsSegmentClientsOut)
+async def analytics_segment_clients(
+    key: str,
+    limit: int = Query(default=200, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0),
+    r_min: int | None = Query(default=None, ge=1, le=5),
+    f_min: int | None = Query(default=None, ge=1, le=5),
+    m_min: int | None = Query(default=None, ge=1, le=5),
+    q: str | None = Query(default=None, max_length=80),
+    sort: str | None = Query(default=None, max_length=32),
+    db: Session = Depends(get_db),
+) -> AnalyticsSegmentClientsOut:
+    data = await run_db(
+        list_clients_by_segment,
+        db,
+        key=key,
+        limit=limit,
+        offset=offset,
+        r_min=r_min,
+        f_min=f_min,
+        m_min=m_min,
+        q=q,
+        sort=sort,
+    )
+    return AnalyticsSegmentClientsOut.model_validate(data)
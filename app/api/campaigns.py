@@ -2,14 +2,26 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.schemas.campaigns import CampaignCreateIn, CampaignOut, CampaignDetailOut, CampaignRecipientOut
-from app.services.campaigns import list_campaigns, create_campaign, get_campaign, build_recipients, list_recipients
+from app.core.serialization import row_dicts, rows_response
+from app.schemas.campaigns import (
+    CampaignCreateIn,
+    CampaignOut,
+    CampaignDetailOut,
+    CampaignRecipientOut,
+    CampaignDeliveryOut,
+)
+from app.services.campaigns import list_campaigns, create_campaign, get_campaign, build_recipients, list_recipient_rows
+from app.services.whatsapp_status import campaign_delivery_stats
 
 router = APIRouter(prefix="/campaigns", tags=["campaigns"])
 
+# Превью получателей внутри CampaignDetailOut — один валидатор на весь список
+_recipients_adapter = TypeAdapter(list[CampaignRecipientOut])
+
 
 @router.get("/", response_model=list[CampaignOut])
 def campaigns_list(db: Session = Depends(get_db)) -> list[CampaignOut]:
@@ -29,31 +41,14 @@ def campaigns_get(campaign_id: int, db: Session = Depends(get_db)) -> CampaignDe
     if not c:
         raise HTTPException(status_code=404, detail="Campaign not found")
 
-    recs = list_recipients(db, campaign_id=campaign_id, limit=50, offset=0)
-    preview = [
-        CampaignRecipientOut(
-            phone=r.phone,
-            full_name=r.full_name,
-            tier=r.tier,
-            bonus_balance=getattr(r, 'bonus_balance', 0) or 0,
-            last_purchase_at=r.last_purchase_at,
-            recency_days=r.recency_days,
-            purchases_90d=r.purchases_90d,
-            revenue_90d=r.revenue_90d,
-            purchases_total=r.purchases_total,
-            revenue_total=r.revenue_total,
-            r_score=r.r_score,
-            f_score=r.f_score,
-            m_score=r.m_score,
-            rfm=r.rfm,
-        )
-        for r in recs
-    ]
+    recs = list_recipient_rows(db, campaign_id=campaign_id, limit=50, offset=0)
+    preview = _recipients_adapter.validate_python(row_dicts(recs))
 
     return CampaignDetailOut(
         campaign=CampaignOut.model_validate(c, from_attributes=True),
         recipients_total=c.recipients_total,
         recipients_preview=preview,
+        delivery=CampaignDeliveryOut(**campaign_delivery_stats(db, campaign_id)),
     )
 
 
@@ -72,28 +67,9 @@ def campaigns_recipients(
     limit: int = Query(default=200, ge=1, le=1000),
     offset: int = Query(default=0, ge=0),
     db: Session = Depends(get_db),
-) -> list[CampaignRecipientOut]:
+):
     c = get_campaign(db, campaign_id)
     if not c:
         raise HTTPException(status_code=404, detail="Campaign not found")
 
-    rows = list_recipients(db, campaign_id=campaign_id, limit=limit, offset=offset)
-    return [
-        CampaignRecipientOut(
-            phone=r.phone,
-            full_name=r.full_name,
-            tier=r.tier,
-            bonus_balance=getattr(r, 'bonus_balance', 0) or 0,
-            last_purchase_at=r.last_purchase_at,
-            recency_days=r.recency_days,
-            purchases_90d=r.purchases_90d,
-            revenue_90d=r.revenue_90d,
-            purchases_total=r.purchases_total,
-            revenue_total=r.revenue_total,
-            r_score=r.r_score,
-            f_score=r.f_score,
-            m_score=r.m_score,
-            rfm=r.rfm,
-        )
-        for r in rows
-    ]
\ No newline at end of file
+    return rows_response(list_recipient_rows(db, campaign_id=campaign_id, limit=limit, offset=offset))
@@ -0,0 +1,35 @@
+# app/api/clients.py
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.core.phone import normalize_phone
+from app.core.serialization import etag_response
+from app.schemas.crm import ClientCardOut
+from app.services.client_card import RECENT_TX, client_card
+
+router = APIRouter(prefix="/clients", tags=["clients"])
+
+
+def _tenant_id(request: Request) -> int:
+    u = getattr(request.state, "user", None) or {}
+    tid = u.get("tenant_id")
+    if not tid:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return int(tid)
+
+
+@router.get("/{phone}/card", response_model=ClientCardOut, responses={304: {"description": "Не изменилась (If-None-Match)"}})
+def get_client_card(
+    phone: str,
+    request: Request,
+    tx_limit: int = Query(default=RECENT_TX, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Профиль, lifetime-метрики, баланс, последние транзакции и живые гранты; ETag → 304."""
+    card = client_card(db, _tenant_id(request), normalize_phone(phone), tx_limit=tx_limit)
+    if not card:
+        raise HTTPException(status_code=404, detail="Client not found")
+    return etag_response(request, card)
@@ -1,83 +1,37 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case
 
 from app.core.database import get_db
-from app.models.user import User
-from app.models.transaction import Transaction
+from app.core.phone import normalize_phone
 from app.schemas.crm import ClientMetricsOut
+from app.services.client_summary import client_summary
 
 router = APIRouter(prefix="/crm", tags=["crm"])
 
 
-def normalize_phone(raw: str) -> str:
-    s = (raw or "").strip()
-    s = s.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
-    if s.startswith("+"):
-        s = s[1:]
-    digits = "".join(ch for ch in s if ch.isdigit())
-    if digits.startswith("8") and len(digits) == 11:
-        digits = "7" + digits[1:]
-    if len(digits) == 10:
-        digits = "7" + digits
-    if len(digits) > 11:
-        digits = digits[-11:]
-    return digits
+def _tenant_id(request: Request) -> int | None:
+    u = getattr(request.state, "user", None) or {}
+    tid = u.get("tenant_id")
+    return int(tid) if tid else None
 
 
 @router.get("/client/{phone}", response_model=ClientMetricsOut)
-def get_client_metrics(phone: str, db: Session = Depends(get_db)) -> ClientMetricsOut:
-    p = normalize_phone(phone)
-    user = db.query(User).filter(User.phone == p).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Client not found")
-
-    paid = func.coalesce(Transaction.paid_amount, 0)
-    refunded = func.coalesce(Transaction.refunded_amount, 0)
-    net_paid = (paid - refunded)
+def get_client_metrics(phone: str, request: Request, db: Session = Depends(get_db)) -> ClientMetricsOut:
+    return _metrics_out(client_summary(db, _tenant_id(request), normalize_phone(phone)))
 
-    # total_spent = сумма net_paid (но не ниже 0 на уровне строки)
-    total_spent_expr = func.coalesce(
-        func.sum(
-            case(
-                (net_paid > 0, net_paid),
-                else_=0,
-            )
-        ),
-        0,
-    )
-
-    # purchases_count = число транзакций, где net_paid > 0
-    purchases_count_expr = func.coalesce(
-        func.sum(
-            case(
-                (net_paid > 0, 1),
-                else_=0,
-            )
-        ),
-        0,
-    )
 
-    total_spent, purchases_count = (
-        db.query(total_spent_expr, purchases_count_expr)
-        .filter(Transaction.user_id == user.id)
-        .first()
-    )
-
-    total_spent = int(total_spent or 0)
-    purchases_count = int(purchases_count or 0)
-    avg_check = (total_spent / purchases_count) if purchases_count else 0.0
-
-    bonus_balance = int(user.bonus_balance or 0)
+def _metrics_out(s: dict | None) -> ClientMetricsOut:
+    if not s:
+        raise HTTPException(status_code=404, detail="Client not found")
 
     return ClientMetricsOut(
-        phone=user.phone,
-        full_name=(user.full_name or None),
-        tier=(user.tier or "Bronze"),
-        total_spent=total_spent,
-        purchases_count=purchases_count,
-        avg_check=round(float(avg_check), 2),
-        bonus_balance=bonus_balance,
+        phone=s["phone"],
+        full_name=(s["full_name"] or None),
+        tier=s["tier"],
+        total_spent=s["total_spent"],
+        purchases_count=s["purchases_count"],
+        avg_check=round(float(s["avg_check"]), 2),
+        bonus_balance=s["bonus_balance"],
     )
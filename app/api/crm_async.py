@@ -0,0 +1,31 @@
+# app/api/crm_async.py
+"""
+/api/crm на AsyncSession (вместо app.api.crm при DB_ASYNC=1).
+
+Сводка клиента — один агрегирующий SELECT (app.services.client_summary):
+он выполняется через await session.execute, разбор строки — дешёвый.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.crm import _metrics_out, _tenant_id, normalize_phone
+from app.core.database import get_async_db
+from app.models.user import User
+from app.schemas.crm import ClientMetricsOut
+from app.services.client_summary import _row_to_summary, _summary_stmt
+
+router = APIRouter(prefix="/crm", tags=["crm"])
+
+
+@router.get("/client/{phone}", response_model=ClientMetricsOut)
+async def get_client_metrics(
+    phone: str, request: Request, db: AsyncSession = Depends(get_async_db),
+) -> ClientMetricsOut:
+    now = datetime.utcnow()
+    stmt = _summary_stmt(_tenant_id(request), now, User.phone == normalize_phone(phone)).limit(1)
+    row = (await db.execute(stmt)).first()
+    return _metrics_out(_row_to_summary(row, now) if row else None)
@@ -0,0 +1,29 @@
+# app/api/status_api.py
+"""
+Состояние внешних зависимостей для админки/мониторинга.
+
+GET /api/status — circuit breakers провайдеров (OpenAI, GreenAPI):
+state (closed / open / half_open), доля ошибок в окне, сколько вызовов
+отклонено и через сколько секунд будет пробный вызов; пул соединений БД.
+"""
+from __future__ import annotations
+
+from fastapi import APIRouter
+
+from app.core import database
+from app.core.circuit_breaker import breakers_snapshot, get_breaker
+
+router = APIRouter(prefix="/status", tags=["status"])
+
+# Показываем провайдеров и до первого вызова
+_PROVIDERS = ("openai", "greenapi")
+
+
+@router.get("")
+def service_status():
+    for name in _PROVIDERS:
+        get_breaker(name)
+    db = {"dialect": database.engine.dialect.name, "pool": database.pool_stats()}
+    if database.async_engine is not None:
+        db["async_pool"] = database.pool_stats(database.async_engine.sync_engine)
+    return {"circuits": breakers_snapshot(), "db": db}
@@ -0,0 +1,90 @@
+# app/api/transactions_async.py
+"""
+/api/transactions при DB_ASYNC=1 (вместо app.api.transactions). Логика
+общая — app.services.transactions: синхронный ORM (loyalty_engine, слияние
+с архивом), поэтому она выполняется в пуле потоков БД (run_db), а не на
+event loop.
+"""
+from __future__ import annotations
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query, Request, HTTPException
+from sqlalchemy.orm import Session
+
+from app.api.transactions import must_tenant_id
+from app.core.concurrency import run_db
+from app.core.database import get_db
+from app.core.pagination import next_cursor, set_page_headers
+from app.core.serialization import rows_response
+from app.schemas.transaction import TransactionCreate, TransactionOut, TransactionRefund
+from app.services import transactions as svc
+from app.services.transactions import TransactionError
+
+router = APIRouter(prefix="/transactions", tags=["transactions"])
+
+
+@router.post("/", response_model=TransactionOut)
+async def create_transaction(
+    payload: TransactionCreate, request: Request, db: Session = Depends(get_db),
+):
+    tenant_id = must_tenant_id(request)
+    return await run_db(svc.create_transaction, db, tenant_id, payload)
+
+
+@router.post("/{tx_id}/refund", response_model=TransactionOut)
+async def refund_transaction(
+    tx_id: int, payload: TransactionRefund, request: Request, db: Session = Depends(get_db),
+):
+    tenant_id = must_tenant_id(request)
+    try:
+        return await run_db(svc.refund_transaction, db, tenant_id, tx_id, payload)
+    except TransactionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.get("/by-phone/{user_phone}", response_model=List[TransactionOut])
+async def list_by_phone(
+    user_phone: str,
+    request: Request,
+    limit: int = Query(default=100, ge=1, le=500),
+    after: Optional[str] = Query(default=None, description="X-Next-Cursor предыдущей страницы"),
+    db: Session = Depends(get_db),
+):
+    tenant_id = must_tenant_id(request)
+    try:
+        items = await run_db(svc.list_by_phone, db, tenant_id, user_phone, limit=limit, after=after)
+    except TransactionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    response = rows_response(items)
+    set_page_headers(response, next_cursor(items, limit))
+    return response
+
+
+@router.get("", response_model=List[TransactionOut], include_in_schema=False)
+@router.get("/", response_model=List[TransactionOut])
+async def list_transactions(
+    request: Request,
+    phone: Optional[str] = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+    after: Optional[str] = Query(default=None, description="X-Next-Cursor предыдущей страницы"),
+    count: bool = Query(default=False, description="X-Total-Count (не больше LIST_COUNT_CAP)"),
+    date_from: Optional[str] = Query(default=None, description="YYYY-MM-DD"),
+    date_to:   Optional[str] = Query(default=None, description="YYYY-MM-DD"),
+    db: Session = Depends(get_db),
+):
+    tenant_id = must_tenant_id(request)
+    try:
+        items = await run_db(
+            svc.list_transactions, db, tenant_id, phone=phone, limit=limit, offset=offset,
+            date_from=date_from, date_to=date_to, after=after,
+        )
+    except TransactionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    total = None
+    if count:
+        total = await run_db(svc.count_transactions, db, tenant_id, phone, date_from, date_to)
+    response = rows_response(items)
+    set_page_headers(response, next_cursor(items, limit) if after or not offset else None, total)
+    return response
@@ -1,34 +1,79 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
+from app.core.pagination import capped_count, decode_cursor, keyset_page, next_cursor, set_page_headers
+from app.core.phone import normalize_phone
+from app.core.role_guards import require_admin_or_owner
+from app.core.serialization import rows_response, schema_columns
 from app.models.user import User
-from app.schemas.user import UserCreate, UserOut, UserUpdate
+from app.schemas.user import UserCreate, UserImportOut, UserOut, UserUpdate
+from app.services.client_import import ClientImportError, import_clients, read_rows
+from app.services.client_search import search_users
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
-def normalize_phone(raw: str) -> str:
-    s = (raw or "").strip()
-    s = s.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
-    if s.startswith("+"):
-        s = s[1:]
-    digits = "".join(ch for ch in s if ch.isdigit())
-    if digits.startswith("8") and len(digits) == 11:
-        digits = "7" + digits[1:]
-    if len(digits) == 10:
-        digits = "7" + digits
-    if len(digits) > 11:
-        digits = digits[-11:]
-    return digits
+def _tenant_id(request: Request) -> int:
+    u = getattr(request.state, "user", None) or {}
+    tid = u.get("tenant_id")
+    if not tid:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return int(tid)
 
 
 @router.get("/", response_model=list[UserOut])
-def list_users(db: Session = Depends(get_db)) -> list[UserOut]:
-    users = db.query(User).order_by(User.id.desc()).all()
-    return [UserOut.model_validate(u) for u in users]
+def list_users(
+    request: Request,
+    limit: int = Query(default=100, ge=1, le=500),
+    after: Optional[str] = Query(default=None, description="X-Next-Cursor предыдущей страницы"),
+    count: bool = Query(default=False, description="X-Total-Count (не больше LIST_COUNT_CAP)"),
+    db: Session = Depends(get_db),
+):
+    """Клиенты тенанта, от новых к старым; страницы — по курсору after."""
+    tenant_id = _tenant_id(request)
+    try:
+        cursor = decode_cursor(after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    q = db.query(*schema_columns(UserOut, User)).filter(User.tenant_id == tenant_id)
+    rows = keyset_page(q, User.created_at, User.id, cursor, limit).all()
+    response = rows_response(rows)
+    set_page_headers(response, next_cursor(rows, limit), capped_count(q, User.id) if count else None)
+    return response
+
+
+@router.get("/search", response_model=list[UserOut])
+def users_search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=80, description="фрагмент имени или цифры телефона"),
+    limit: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Топ-N клиентов тенанта: префикс телефона, затем подстрока имени/телефона."""
+    return rows_response(search_users(db, _tenant_id(request), q, limit))
+
+
+@router.post("/import", response_model=UserImportOut)
+def users_import(
+    request: Request,
+    file: UploadFile = File(..., description="CSV (UTF-8 / cp1251, , ; или tab) или XLSX"),
+    chunk: Optional[int] = Query(default=None, ge=100, le=50000, description="строк в пачке (IMPORT_CHUNK)"),
+    _: dict = Depends(require_admin_or_owner),
+    db: Session = Depends(get_db),
+) -> UserImportOut:
+    """Загрузка клиентской базы потоком: upsert по (tenant_id, phone) пачками, отчёт с отклонёнными строками."""
+    tenant_id = _tenant_id(request)
+    try:
+        report = import_clients(db, tenant_id, read_rows(file.filename, file.file), chunk)
+    except ClientImportError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return UserImportOut.model_validate(report)
 
 
 @router.post("", response_model=UserOut)
@@ -1,20 +1,36 @@
 # app/api/whatsapp.py
 from __future__ import annotations
 
-from typing import List, Optional
+import hmac
+import json
+from typing import Iterator, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
 from app.services.whatsapp import (
-    get_status,
+    cached_status,
+    refresh_status,
     send_message,
     send_campaign_messages,
+    iter_campaign_messages,
     render_template,
 )
+from app.services.whatsapp_status import (
+    SentLog,
+    record_sent_messages,
+    get_status_buffer,
+    schedule_flush,
+    campaign_delivery_stats,
+)
+from app.services.whatsapp_numbers import annotate_recipients
 from app.services.campaigns import get_campaign
 from app.models.campaign import CampaignRecipient
+from app.core.config import settings
 
 router = APIRouter(prefix="/whatsapp", tags=["whatsapp"])
 
@@ -29,6 +45,11 @@ class SendCampaignIn(BaseModel):
     campaign_id: int
     template: str = Field(..., min_length=1, max_length=4096)
     dry_run: bool = False
+    # stream=True → ответ в NDJSON: строка на каждого получателя + периодические сводки
+    stream: bool = False
+    progress_every: int = Field(default=25, ge=1, le=1000)
+    # Пропускать номера без WhatsApp (кэш checkWhatsapp; в dry run — только кэш)
+    check_numbers: bool = True
 
 
 class TemplatePreviewIn(BaseModel):
@@ -47,21 +68,30 @@ def require_admin(request: Request):
 # ── Endpoints ──────────────────────────────────────────────────
 
 @router.get("/status")
-def whatsapp_status():
-    """Статус подключения GreenAPI инстанса."""
-    return get_status()
+async def whatsapp_status(refresh: bool = False):
+    """
+    Статус подключения GreenAPI инстанса — из кэша (обновляется фоном).
+    refresh=1 — принудительно спросить GreenAPI.
+    """
+    data = cached_status()
+    if refresh or data is None:
+        data = await run_in_threadpool(refresh_status)
+        data = {**data, "cached": False, "age_s": 0.0}
+    return data
 
 
 @router.post("/send")
 def whatsapp_send_one(
     payload: SendOneIn,
     request: Request,
+    db: Session = Depends(get_db),
 ):
     """Отправить сообщение одному клиенту."""
     require_admin(request)
     result = send_message(payload.phone, payload.message)
     if not result["ok"]:
         raise HTTPException(status_code=400, detail=result.get("error", "Ошибка отправки"))
+    record_sent_messages(db, None, [{"phone": payload.phone, "message_id": result.get("message_id")}])
     return result
 
 
@@ -78,6 +108,21 @@ def whatsapp_send_campaign(
     if not campaign:
         raise HTTPException(status_code=404, detail="Кампания не найдена")
 
+    if payload.stream:
+        total = int(
+            db.query(func.count(CampaignRecipient.id))
+            .filter(CampaignRecipient.campaign_id == payload.campaign_id)
+            .scalar() or 0
+        )
+        if not total:
+            raise HTTPException(status_code=400, detail="Кампания не имеет получателей. Сначала сформируйте список.")
+
+        return StreamingResponse(
+            _stream_campaign(payload, campaign.name or "", int(campaign.suggested_bonus or 0), total),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     # Получаем получателей кампании
     rows = (
         db.query(CampaignRecipient)
@@ -97,12 +142,17 @@ def whatsapp_send_campaign(
         }
         for r in rows
     ]
+    if payload.check_numbers:
+        annotate_recipients(db, recipients, check_missing=not payload.dry_run)
 
+    sent_log = SentLog(db, payload.campaign_id)
     result = send_campaign_messages(
         recipients=recipients,
         template=payload.template,
         dry_run=payload.dry_run,
+        on_sent=sent_log.add,
     )
+    sent_log.flush()
 
     return {
         "campaign_id":   payload.campaign_id,
@@ -112,6 +162,152 @@ def whatsapp_send_campaign(
     }
 
 
+# ── Streaming (NDJSON) ────────────────────────────────────────
+def _ndjson(obj: dict) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=str) + "\n"
+
+
+def _iter_recipients(
+    db: Session,
+    campaign_id: int,
+    campaign_name: str,
+    bonus: int,
+    check_numbers: bool = False,
+    check_missing: bool = True,
+    chunk: int = 500,
+) -> Iterator[dict]:
+    """
+    Получатели кампании порциями по id (keyset) — без загрузки всего списка в память.
+    Между порциями нет открытого курсора, поэтому запись лога отправки
+    в ту же сессию безопасна.
+    """
+    last_id = 0
+    while True:
+        rows = (
+            db.query(CampaignRecipient.id, CampaignRecipient.phone, CampaignRecipient.full_name)
+            .filter(CampaignRecipient.campaign_id == campaign_id, CampaignRecipient.id > last_id)
+            .order_by(CampaignRecipient.id)
+            .limit(chunk)
+            .all()
+        )
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        batch = [
+            {
+                "phone":          r.phone,
+                "name":           r.full_name or "Клиент",
+                "bonus":          bonus,
+                "campaign_name":  campaign_name,
+            }
+            for r in rows
+        ]
+        if check_numbers:
+            annotate_recipients(db, batch, check_missing=check_missing)
+        yield from batch
+
+
+def _stream_campaign(payload: SendCampaignIn, campaign_name: str, bonus: int, total: int) -> Iterator[str]:
+    """
+    Строки NDJSON:
+      {"type": "start", ...}
+      {"type": "item", "status": "sent|failed|skipped", "phone": ..., ...}  — на каждого получателя
+      {"type": "progress", "processed": ..., "sent": ..., ...}              — каждые progress_every
+      {"type": "done", ...}                                                 — итог
+    """
+    # Своя сессия: зависимость get_db закрывается раньше, чем дочитается поток
+    db = SessionLocal()
+    sent_log = SentLog(db, payload.campaign_id)
+    counts = {"sent": 0, "failed": 0, "skipped": 0}
+    processed = 0
+
+    def _summary(kind: str) -> dict:
+        return {
+            "type":          kind,
+            "campaign_id":   payload.campaign_id,
+            "total":         total,
+            "processed":     processed,
+            **counts,
+            "dry_run":       payload.dry_run,
+        }
+
+    try:
+        yield _ndjson({
+            "type":          "start",
+            "campaign_id":   payload.campaign_id,
+            "campaign_name": campaign_name,
+            "total":         total,
+            "dry_run":       payload.dry_run,
+        })
+
+        recipients = _iter_recipients(
+            db, payload.campaign_id, campaign_name, bonus,
+            check_numbers=payload.check_numbers,
+            check_missing=not payload.dry_run,
+        )
+        events = iter_campaign_messages(
+            recipients, payload.template, dry_run=payload.dry_run, on_sent=sent_log.add,
+        )
+        for ev in events:
+            counts[ev["status"]] += 1
+            processed += 1
+            yield _ndjson({"type": "item", **ev})
+            if processed % payload.progress_every == 0:
+                yield _ndjson(_summary("progress"))
+
+        sent_log.flush()
+        yield _ndjson(_summary("done"))
+    except Exception as e:
+        yield _ndjson({**_summary("error"), "error": str(e)})
+    finally:
+        sent_log.flush()
+        db.close()
+
+
+# ── Delivery status webhook (GreenAPI) ────────────────────────
+def _check_webhook_token(request: Request) -> None:
+    # Маршрут публичный (без сессии) — без токена его не принимаем вовсе
+    expected = (settings.GREENAPI_WEBHOOK_TOKEN or "").strip()
+    if not expected:
+        raise HTTPException(status_code=503, detail="Webhook is disabled: GREENAPI_WEBHOOK_TOKEN is not set")
+    auth = (request.headers.get("authorization") or "").strip()
+    if auth.lower().startswith("bearer "):
+        auth = auth[7:].strip()
+    if not hmac.compare_digest(auth.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+
+
+@router.post("/webhook")
+async def whatsapp_webhook(request: Request):
+    """
+    Входящие уведомления GreenAPI (outgoingMessageStatus).
+    Только кладёт события в буфер — запись в БД пачками в фоне.
+    """
+    _check_webhook_token(request)
+    try:
+        body = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    buffer = get_status_buffer()
+    items = body if isinstance(body, list) else [body]
+    accepted = sum(1 for it in items if buffer.add_notification(it))
+
+    if len(buffer) >= int(settings.WA_STATUS_FLUSH_EVERY):
+        schedule_flush()
+
+    return {"ok": True, "accepted": accepted}
+
+
+@router.get("/campaigns/{campaign_id}/delivery")
+def whatsapp_campaign_delivery(campaign_id: int, db: Session = Depends(get_db)):
+    """Доставка/прочтение по кампании."""
+    if not get_campaign(db, campaign_id):
+        raise HTTPException(status_code=404, detail="Кампания не найдена")
+    return {"campaign_id": campaign_id, **campaign_delivery_stats(db, campaign_id)}
+
+
 @router.post("/preview-template")
 def whatsapp_preview_template(payload: TemplatePreviewIn):
     """Предпросмотр шаблона с тестовыми данными."""
@@ -0,0 +1,200 @@
+# app/core/circuit_breaker.py
+"""
+Circuit breaker для внешних провайдеров (OpenAI, GreenAPI) и дедлайны.
+
+Пока провайдер лежит, каждый запрос ждал полный таймаут (AI — 40 с,
+сообщение — 15 с) и держал воркер. Breaker считает долю ошибок в
+скользящем окне последних CB_WINDOW вызовов; при CB_FAILURE_RATE и
+не меньше CB_MIN_CALLS вызовов цепь размыкается на CB_OPEN_S секунд —
+вызовы сразу получают отказ (AI → эвристика, рассылка → failed).
+Затем half-open: пропускается один пробный вызов, успех замыкает цепь.
+Пробу, отменённую клиентом, вызывающий код закрывает record_cancelled
+(как сбой); потерянная проба через probe_timeout_s уступает место новой.
+
+Потокобезопасен: GreenAPI вызывается из пула потоков.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+from app.core.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        open_s: float = 30.0,
+        probe_timeout_s: float = 120.0,
+    ) -> None:
+        self.name = name
+        self.window = max(1, window)
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.open_s = open_s
+        self.probe_timeout_s = probe_timeout_s
+
+        self._lock = threading.Lock()
+        self._results: deque[bool] = deque(maxlen=self.window)  # True = ошибка
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_at = 0.0
+        self._rejected = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_s:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Можно ли сейчас звать провайдера. В half-open — только один пробный вызов."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN:
+                now = time.monotonic()
+                # проба без исхода дольше probe_timeout_s — потеряна, пускаем новую
+                if not self._probe_in_flight or now - self._probe_at >= self.probe_timeout_s:
+                    self._probe_in_flight = True
+                    self._probe_at = now
+                    return True
+            self._rejected += 1
+            return False
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._results.clear()
+            self._probe_in_flight = False
+            self._results.append(False)
+
+    def record_failure(self, error: Any = None) -> None:
+        with self._lock:
+            self._last_error = str(error)[:300] if error is not None else None
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._results.append(True)
+            calls = len(self._results)
+            if self._state == CLOSED and calls >= self.min_calls:
+                if sum(self._results) / calls >= self.failure_rate:
+                    self._open()
+
+    def record_cancelled(self) -> None:
+        """
+        Вызов прерван без ответа провайдера (отмена задачи, обрыв SSE).
+        Для пробы half-open — сбой (цепь снова размыкается), иначе не считается:
+        отключившийся клиент ничего не говорит о провайдере.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._probe_in_flight:
+                self._last_error = "probe cancelled"
+                self._open()
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._results.clear()
+            self._probe_in_flight = False
+            self._rejected = 0
+            self._last_error = None
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            calls = len(self._results)
+            failures = sum(self._results)
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = round(max(0.0, self.open_s - (time.monotonic() - self._opened_at)), 1)
+            return {
+                "name":          self.name,
+                "state":         self._state,
+                "calls":         calls,
+                "failures":      failures,
+                "failure_rate":  round(failures / calls, 3) if calls else 0.0,
+                "rejected":      self._rejected,
+                "retry_in_s":    retry_in,
+                "last_error":    self._last_error,
+            }
+
+
+_registry: dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _registry_lock:
+        cb = _registry.get(name)
+        if cb is None:
+            cb = CircuitBreaker(
+                name,
+                window=int(settings.CB_WINDOW),
+                min_calls=int(settings.CB_MIN_CALLS),
+                failure_rate=float(settings.CB_FAILURE_RATE),
+                open_s=float(settings.CB_OPEN_S),
+                probe_timeout_s=float(settings.CB_PROBE_TIMEOUT_S),
+            )
+            _registry[name] = cb
+        return cb
+
+
+def breakers_snapshot() -> list[dict[str, Any]]:
+    with _registry_lock:
+        items = list(_registry.values())
+    return [cb.snapshot() for cb in items]
+
+
+# ── Дедлайн ──────────────────────────────────────────────────
+class Deadline:
+    """Бюджет времени на запрос: все попытки/провайдеры делят его между собой."""
+
+    def __init__(self, seconds: float) -> None:
+        self.expires_at = time.monotonic() + max(0.0, float(seconds))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Таймаут для очередного вызова: остаток бюджета (не больше cap)."""
+        left = self.remaining()
+        if left <= 0.05:
+            raise DeadlineExceeded("request deadline exceeded")
+        return min(left, cap) if cap else left
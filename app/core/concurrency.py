@@ -0,0 +1,42 @@
+# app/core/concurrency.py
+"""
+Синхронная работа с БД из async-эндпоинтов.
+
+SQLAlchemy у нас синхронный: тяжёлые агрегаты, вызванные прямо в async def,
+блокируют event loop и останавливают все запросы воркера. run_db выполняет
+функцию в отдельном пуле потоков, ограниченном DB_THREADS, — тяжёлые
+запросы не выедают общий пул Starlette и не душат БД.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+from typing import Any, Callable, Optional, TypeVar
+
+import anyio
+import anyio.to_thread
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+_limiter: Optional[anyio.CapacityLimiter] = None
+_limiter_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_db_limiter() -> anyio.CapacityLimiter:
+    """Лимитер создаётся лениво и привязан к event loop воркера."""
+    global _limiter, _limiter_loop
+    loop = asyncio.get_running_loop()
+    if _limiter is None or _limiter_loop is not loop:
+        _limiter = anyio.CapacityLimiter(max(1, int(settings.DB_THREADS)))
+        _limiter_loop = loop
+    return _limiter
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Выполнить синхронную функцию (обычно с db: Session) в пуле потоков БД."""
+    return await anyio.to_thread.run_sync(
+        functools.partial(fn, *args, **kwargs),
+        limiter=get_db_limiter(),
+    )
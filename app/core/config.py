@@ -31,14 +31,117 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str | None = None
     OPENAI_MODEL: str = "gpt-4o-mini"
 
+    # Общий HTTP-клиент OpenAI: keep-alive пул и HTTP/2 (если установлен h2)
+    OPENAI_HTTP2: bool = True
+    OPENAI_POOL_MAX_CONNECTIONS: int = 20
+    OPENAI_POOL_MAX_KEEPALIVE: int = 10
+    OPENAI_KEEPALIVE_EXPIRY_S: float = 60.0
+
     AI_PROVIDER: str = "auto"
     AI_MOCK_IF_NO_KEY: bool = True
 
+    # Кэш ответов LLM (app.ai.cache): время жизни и максимум записей
+    AI_CACHE_TTL_S: int = 3600
+    AI_CACHE_MAX_ENTRIES: int = 500
+
+    # Бюджет токенов на payload в промпте (app.ai.compact); 0 — без ограничения
+    AI_PROMPT_TOKEN_BUDGET: int = 1500
+
+    # Одновременных AI-вычислений (payload + LLM) на одного тенанта
+    AI_TENANT_CONCURRENCY: int = 2
+
+    # Фоновые AI-задачи (async_mode): незавершённых на тенанта, TTL результата
+    AI_JOB_MAX_PER_TENANT: int = 5
+    AI_JOB_TTL_S: int = 600
+
+    # Batch next-best-action (app.ai.batch): клиентов в одном промпте, параллельных промптов
+    AI_BATCH_CLIENTS_PER_PROMPT: int = 20
+    AI_BATCH_CONCURRENCY: int = 2
+
+    # Потоки для синхронной работы с БД из async-эндпоинтов (app.core.concurrency)
+    DB_THREADS: int = 8
+
+    # Профиль БД (app.core.database). Пул для серверных БД (и файловой SQLite)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_S: float = 30.0
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_S: int = 1800
+    # SQLite PRAGMA на каждом соединении
+    DB_SQLITE_WAL: bool = True
+    DB_SQLITE_SYNCHRONOUS: str = "NORMAL"
+    DB_SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    DB_SQLITE_CACHE_SIZE_KB: int = 20000
+    DB_SQLITE_MMAP_SIZE: int = 268435456
+
+    # Шардирование по тенантам (только SQLite): users, transactions, бонусы и
+    # история клиента живут в DB_SHARD_DIR/tenant_<id>.db, остальное — в DATABASE_URL
+    DB_SHARDING: bool = False
+    DB_SHARD_DIR: str = "shards"
+    DB_SHARD_POOL_SIZE: int = 4
+
+    # Архив мёртвых бонусных грантов (app.services.bonus_archive):
+    # через сколько дней после сгорания/траты переносить, размер пачки, период фона (0 — выкл.)
+    BONUS_ARCHIVE_AFTER_DAYS: int = 30
+    BONUS_ARCHIVE_CHUNK: int = 1000
+    BONUS_ARCHIVE_INTERVAL_S: int = 21600
+
+    # Архив истории транзакций (app.services.tx_archive): горизонт в днях
+    # (не меньше 90 — окно RFM), размер пачки, период фона (0 — выкл., запуск через CLI)
+    TX_ARCHIVE_AFTER_DAYS: int = 365
+    TX_ARCHIVE_CHUNK: int = 1000
+    TX_ARCHIVE_INTERVAL_S: int = 0
+
+    # Списки с keyset-пагинацией: ?count=1 считает не больше стольких строк
+    LIST_COUNT_CAP: int = 10000
+
+    # Импорт клиентов (POST /api/users/import): строк в пачке (одна транзакция),
+    # сколько отклонённых строк показывать в отчёте
+    IMPORT_CHUNK: int = 5000
+    IMPORT_REJECTED_SAMPLE: int = 100
+
+    # Async-роутеры transactions, crm, analytics; async-движок — для crm:
+    # sqlite+aiosqlite / postgresql+psycopg. URL по умолчанию выводится из DATABASE_URL
+    DB_ASYNC: bool = False
+    DATABASE_ASYNC_URL: str | None = None
+
+    # Circuit breaker внешних провайдеров (app.core.circuit_breaker):
+    # окно последних вызовов, минимум вызовов, доля ошибок, сколько секунд цепь разомкнута
+    CB_WINDOW: int = 20
+    CB_MIN_CALLS: int = 5
+    CB_FAILURE_RATE: float = 0.5
+    CB_OPEN_S: float = 30.0
+    CB_PROBE_TIMEOUT_S: float = 120.0  # проба half-open без исхода считается потерянной
+    # Дедлайн одного интерактивного AI-запроса (все попытки LLM вместе), сек
+    AI_DEADLINE_S: float = 25.0
+
     # --- WhatsApp / GreenAPI ---
     GREENAPI_INSTANCE_ID: str | None = None    # ID инстанса из личного кабинета GreenAPI
     GREENAPI_API_TOKEN: str | None = None      # API токен из личного кабинета GreenAPI
     # Базовый URL (не менять без причины)
     GREENAPI_BASE_URL: str = "https://api.green-api.com"
+    # Токен вебхука (webhookUrlToken в кабинете GreenAPI) — приходит в Authorization.
+    # Не задан — вебхук статусов отвечает 503 (маршрут публичный)
+    GREENAPI_WEBHOOK_TOKEN: str | None = None
+    # Таймауты GreenAPI: соединение / весь запрос, сек
+    GREENAPI_CONNECT_TIMEOUT_S: float = 3.0
+    GREENAPI_TIMEOUT_S: float = 15.0
+    # Кэш статуса инстанса (getStateInstance): сколько секунд ответ считается свежим,
+    # как часто фон его обновляет и через сколько секунд без запросов перестаёт
+    WA_STATUS_TTL_S: float = 60.0
+    WA_STATUS_REFRESH_S: float = 20.0
+    WA_STATUS_IDLE_S: float = 300.0
+    # Буфер статусов доставки: сброс в БД каждые N событий или T мс
+    WA_STATUS_FLUSH_EVERY: int = 500
+    WA_STATUS_FLUSH_MS: int = 1000
+    # Потолок буфера (и отдельно — статусов без записи об отправке); сверх — отбрасываем
+    WA_STATUS_BUFFER_MAX: int = 20000
+    # Кэш checkWhatsapp: сколько дней доверяем результату проверки номера
+    WA_NUMBER_CACHE_TTL_DAYS: int = 14
+    # Проверка неизвестных номеров перед отправкой пачки: параллельно N запросов,
+    # не дольше T секунд на пачку; не успели — номер отправляется без проверки
+    WA_NUMBER_CHECK_CONCURRENCY: int = 8
+    WA_NUMBER_CHECK_BUDGET_S: float = 5.0
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
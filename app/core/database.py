@@ -1,5 +1,13 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import os
+import threading
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from sqlalchemy import Table, create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
 
 from app.core.config import settings
 
@@ -8,23 +16,251 @@ class Base(DeclarativeBase):
     pass
 
 
-# Для SQLite нужно check_same_thread=False
-connect_args = {}
-if settings.DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+# ── Профиль БД ───────────────────────────────────────────────
+# SQLite: WAL (читатели не блокируют писателя), synchronous=NORMAL,
+# busy_timeout вместо мгновенного "database is locked", кэш и mmap.
+# Серверные БД: размер пула, pre_ping и recycle из настроек.
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+
+def sqlite_pragmas() -> list[str]:
+    pragmas = [
+        f"PRAGMA busy_timeout={int(settings.DB_SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA synchronous={settings.DB_SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size=-{int(settings.DB_SQLITE_CACHE_SIZE_KB)}",
+        f"PRAGMA mmap_size={int(settings.DB_SQLITE_MMAP_SIZE)}",
+    ]
+    if settings.DB_SQLITE_WAL:
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+    return pragmas
+
+
+def _apply_sqlite_pragmas(dbapi_conn: Any, _record: Any) -> None:
+    cur = dbapi_conn.cursor()
+    try:
+        for sql in sqlite_pragmas():
+            cur.execute(sql)
+    finally:
+        cur.close()
+
+
+def _sqlite_lower(value: Any) -> Any:
+    return value.lower() if isinstance(value, str) else value
+
+
+def _register_sqlite_functions(dbapi_conn: Any, _record: Any) -> None:
+    # lower()/LIKE в SQLite складывают регистр только у ASCII — «ив» не
+    # находит «Иван»; unicode_lower — str.lower() на стороне Python
+    dbapi_conn.create_function("unicode_lower", 1, _sqlite_lower, deterministic=True)
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    echo=False,
-    connect_args=connect_args,
-)
+
+def engine_options(url: str, tuned: bool = True) -> dict[str, Any]:
+    """Аргументы create_engine / create_async_engine для URL (tuned=False — умолчания SQLAlchemy)."""
+    opts: dict[str, Any] = {"echo": False}
+    if _is_sqlite(url):
+        # Для SQLite нужно check_same_thread=False
+        opts["connect_args"] = {"check_same_thread": False}
+        if tuned:
+            opts["connect_args"]["timeout"] = int(settings.DB_SQLITE_BUSY_TIMEOUT_MS) / 1000
+    if tuned and not _is_sqlite_memory(url):
+        opts.update(
+            pool_size=int(settings.DB_POOL_SIZE),
+            max_overflow=int(settings.DB_MAX_OVERFLOW),
+            pool_timeout=float(settings.DB_POOL_TIMEOUT_S),
+            pool_pre_ping=bool(settings.DB_POOL_PRE_PING) and not _is_sqlite(url),
+            pool_recycle=int(settings.DB_POOL_RECYCLE_S),
+        )
+    return opts
+
+
+def make_engine(url: str, tuned: bool = True, **overrides: Any) -> Engine:
+    eng = create_engine(url, **{**engine_options(url, tuned), **overrides})
+    if _is_sqlite(url):
+        event.listen(eng, "connect", _register_sqlite_functions)
+    if tuned and _is_sqlite(url):
+        event.listen(eng, "connect", _apply_sqlite_pragmas)
+    return eng
+
+
+def pool_stats(eng: Optional[Engine] = None) -> dict[str, Any]:
+    """Состояние пула соединений (для /api/status и мониторинга)."""
+    pool = (eng or engine).pool
+    out: dict[str, Any] = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            out[name] = fn()
+    timeout = getattr(pool, "timeout", None)
+    if callable(timeout):
+        out["timeout_s"] = timeout()
+    return out
+
+
+engine = make_engine(settings.DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def get_db():
-    db = SessionLocal()
+# ── Шардирование по тенантам (DB_SHARDING=1) ─────────────────
+# Один большой тенант не тормозит остальных: его клиенты, транзакции и
+# бонусы лежат в отдельном SQLite-файле со своим writer-локом. Общие
+# таблицы (tenants, auth_users, settings, кампании, журнал WhatsApp) —
+# в DATABASE_URL. Сессия тенанта привязывает шардированные таблицы к его
+# файлу (Session.binds), остальные идут в общую БД.
+SHARDED_TABLES = (
+    "users",
+    "transactions",
+    "bonus_grants",
+    "bonus_grants_archive",
+    "transactions_archive",
+    "customer_stats",
+    "client_ai_suggestions",
+)
+
+_shards: dict[int, tuple[Engine, dict[Table, Engine]]] = {}
+_shards_lock = threading.Lock()
+
+
+def shards_enabled() -> bool:
+    return bool(settings.DB_SHARDING) and _is_sqlite(settings.DATABASE_URL)
+
+
+def shard_path(tenant_id: int) -> str:
+    return os.path.join(settings.DB_SHARD_DIR, f"tenant_{int(tenant_id)}.db")
+
+
+def _shard(tenant_id: int) -> tuple[Engine, dict[Table, Engine]]:
+    with _shards_lock:
+        got = _shards.get(tenant_id)
+        if got is None:
+            os.makedirs(settings.DB_SHARD_DIR, exist_ok=True)
+            pool_size = int(settings.DB_SHARD_POOL_SIZE)
+            eng = make_engine(
+                f"sqlite:///{shard_path(tenant_id)}",
+                pool_size=pool_size,
+                max_overflow=pool_size * 2,
+            )
+            tables = [Base.metadata.tables[n] for n in SHARDED_TABLES if n in Base.metadata.tables]
+            # Файл тенанта создаётся при первом обращении
+            Base.metadata.create_all(bind=eng, tables=tables)
+            got = _shards[tenant_id] = (eng, {t: eng for t in tables})
+        return got
+
+
+def shard_engine(tenant_id: int) -> Engine:
+    return _shard(int(tenant_id))[0]
+
+
+def shard_tenant_ids() -> list[int]:
+    """Тенанты, у которых уже есть файл шарда."""
+    if not os.path.isdir(settings.DB_SHARD_DIR):
+        return []
+    out = []
+    for name in os.listdir(settings.DB_SHARD_DIR):
+        stem, ext = os.path.splitext(name)
+        if ext == ".db" and stem.startswith("tenant_") and stem[7:].isdigit():
+            out.append(int(stem[7:]))
+    return sorted(out)
+
+
+def tenant_session(tenant_id: Optional[int]) -> Session:
+    """Сессия тенанта; без шардирования (или без тенанта) — обычная SessionLocal()."""
+    if not tenant_id or not shards_enabled():
+        return SessionLocal()
+    _, binds = _shard(int(tenant_id))
+    return SessionLocal(binds=binds)
+
+
+def shard_sessions() -> Iterator[Session]:
+    """Фоновые задачи: по сессии на каждый шард (или одна общая без шардирования)."""
+    ids = shard_tenant_ids() if shards_enabled() else [None]
+    for tid in ids:
+        db = tenant_session(tid)
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+def request_tenant_id(request: Any) -> Optional[int]:
+    u = getattr(getattr(request, "state", None), "user", None) or {}
+    tid = u.get("tenant_id") if isinstance(u, dict) else None
+    return int(tid) if tid else None
+
+
+def get_db(request: Request = None):
+    # Тенант — из request.state.user (его кладёт auth-middleware в main.py)
+    db = tenant_session(request_tenant_id(request)) if request is not None else SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def dispose_shards() -> None:
+    with _shards_lock:
+        engines = [eng for eng, _ in _shards.values()]
+        _shards.clear()
+    for eng in engines:
+        eng.dispose()
+
+
+# ── Async (DB_ASYNC=1) ───────────────────────────────────────
+# Карточка CRM — await AsyncSession.execute одного агрегирующего SELECT.
+# Синхронная логика app.services (транзакции, RFM-аналитика) в async-роутерах
+# идёт через run_db (app.core.concurrency): AsyncSession.run_sync выполнил
+# бы её Python-часть на event loop.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+psycopg",
+    "postgresql": "postgresql+psycopg",
+    "postgresql+psycopg2": "postgresql+psycopg",
+}
+
+
+def async_database_url(url: Optional[str] = None) -> str:
+    """DATABASE_URL → URL с async-драйвером (aiosqlite / psycopg 3)."""
+    if settings.DATABASE_ASYNC_URL and url is None:
+        return settings.DATABASE_ASYNC_URL
+    url = url or settings.DATABASE_URL
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+async_engine: Optional[AsyncEngine] = None
+AsyncSessionLocal: Optional[async_sessionmaker[AsyncSession]] = None
+
+
+def init_async_engine() -> async_sessionmaker[AsyncSession]:
+    """Создаёт async-движок при первом обращении (драйвер нужен только при DB_ASYNC)."""
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        url = async_database_url()
+        opts = engine_options(url)
+        if _is_sqlite(url) and "pool_size" in opts:
+            # aiosqlite по умолчанию без пула (NullPool) — PRAGMA на каждую сессию
+            opts["poolclass"] = AsyncAdaptedQueuePool
+        async_engine = create_async_engine(url, **opts)
+        if _is_sqlite(url):
+            event.listen(async_engine.sync_engine, "connect", _register_sqlite_functions)
+            event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+    return AsyncSessionLocal
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with init_async_engine()() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    """Shutdown: закрыть пул async-движка."""
+    global async_engine, AsyncSessionLocal
+    eng, async_engine, AsyncSessionLocal = async_engine, None, None
+    if eng is not None:
+        await eng.dispose()
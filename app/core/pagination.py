@@ -0,0 +1,79 @@
+# app/core/pagination.py
+"""
+Keyset-пагинация списков (транзакции, клиенты).
+
+OFFSET на глубоких страницах читает и выбрасывает все предыдущие строки.
+Вместо него — непрозрачный курсор `after` на (created_at, id) последней
+строки страницы: следующая страница — строки строго «старше» курсора,
+порядок ORDER BY created_at DESC, id DESC идёт по индексу (..., created_at).
+
+Курсор следующей страницы отдаётся в заголовке X-Next-Cursor, ответ
+остаётся списком. Точный COUNT по большой таблице тоже дорогой, поэтому
+по ?count=1 считается не больше LIST_COUNT_CAP строк (X-Total-Count: "10000+").
+"""
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+from fastapi import Response
+from sqlalchemy import func, literal, tuple_
+from sqlalchemy.orm import Query
+
+from app.core.config import settings
+
+Cursor = tuple[datetime, int]
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{int(row_id)}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Cursor]:
+    """None — первая страница; ValueError — мусор в курсоре."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        ts, _, row_id = raw.partition("|")
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_after(created_col: Any, id_col: Any, cursor: Cursor):
+    """(created_at, id) < курсора — row value, SQLite и Postgres берут его диапазоном по индексу."""
+    ts, row_id = cursor
+    return tuple_(created_col, id_col) < tuple_(literal(ts, created_col.type), literal(row_id, id_col.type))
+
+
+def keyset_page(q: Query, created_col: Any, id_col: Any, cursor: Optional[Cursor], limit: int) -> Query:
+    if cursor:
+        q = q.filter(keyset_after(created_col, id_col, cursor))
+    return q.order_by(created_col.desc(), id_col.desc()).limit(limit)
+
+
+def next_cursor(items: Sequence[Any], limit: int) -> Optional[str]:
+    """Курсор следующей страницы по последнему элементу (None — страница неполная, дальше пусто)."""
+    if len(items) < limit or not items:
+        return None
+    last = items[-1]
+    return encode_cursor(last.created_at, last.id)
+
+
+def capped_count(q: Query, id_col: Any, cap: Optional[int] = None) -> tuple[int, bool]:
+    """(число строк, упёрлись ли в cap): считает не больше cap+1 строк."""
+    cap = int(cap or settings.LIST_COUNT_CAP)
+    inner = q.with_entities(id_col).order_by(None).limit(cap + 1).subquery()
+    n = int(q.session.query(func.count()).select_from(inner).scalar() or 0)
+    return min(n, cap), n > cap
+
+
+def set_page_headers(response: Response, cursor: Optional[str], total: Optional[tuple[int, bool]] = None) -> None:
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    if total is not None:
+        n, capped = total
+        response.headers["X-Total-Count"] = f"{n}+" if capped else str(n)
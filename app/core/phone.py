@@ -0,0 +1,50 @@
+# app/core/phone.py
+"""
+Единая нормализация телефона (формат 77001234567).
+
+Раньше в users / crm / transactions / security / whatsapp / ai были свои
+копии с расхождениями (security не дописывал 7 к 10 цифрам, transactions
+проверял длину до удаления мусора). Правило одно:
+
+- только цифры 0-9 («+7 (701) 123-45-67» → 77011234567);
+- 11 цифр с 8 в начале → 7…;
+- 10 цифр → 7 + номер;
+- больше 11 → последние 11.
+
+normalize_phones — то же для пачки (импорт): мусор вырезается одним
+regex-проходом по склеенной пачке, а не посимвольно в Python.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Iterable
+
+_NON_DIGIT = re.compile(r"[^0-9]+")
+# для пачки: разделитель строк сохраняется
+_NON_DIGIT_OR_NL = re.compile(r"[^0-9\n]+")
+
+
+def _fix(d: str) -> str:
+    n = len(d)
+    if n == 11 and d[0] == "8":
+        return "7" + d[1:]
+    if n == 10:
+        return "7" + d
+    if n > 11:
+        return d[-11:]
+    return d
+
+
+def normalize_phone(raw: Any) -> str:
+    return _fix(_NON_DIGIT.sub("", str(raw or "")))
+
+
+def normalize_phones(values: Iterable[Any]) -> list[str]:
+    """Нормализация пачки; порядок и длина сохраняются (пустые → "")."""
+    blob = "\n".join(str(v).replace("\n", " ") if v else "" for v in values)
+    return [_fix(d) for d in _NON_DIGIT_OR_NL.sub("", blob).split("\n")]
+
+
+def is_valid_phone(phone: str) -> bool:
+    """Нормализованный номер: 11 цифр, код страны 7."""
+    return len(phone) == 11 and phone[0] == "7"
@@ -4,13 +4,7 @@ import hashlib
 import hmac
 import os
 
-
-def normalize_phone(phone: str) -> str:
-    digits = "".join(ch for ch in (phone or "") if ch.isdigit())
-    # Казахстан: часто вводят 8XXXXXXXXXX -> 7XXXXXXXXXX
-    if len(digits) == 11 and digits.startswith("8"):
-        digits = "7" + digits[1:]
-    return digits
+from app.core.phone import normalize_phone  # noqa: F401  (auth, accounts, bootstrap)
 
 
 def hash_password(password: str) -> tuple[str, str]:
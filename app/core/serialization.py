@@ -0,0 +1,68 @@
+# app/core/serialization.py
+"""
+Быстрая сериализация списков.
+
+На странице в 500 строк время запроса уходило на Pydantic: ORM-объект →
+model_validate → правка полей (user_phone) → повторная валидация по
+response_model → jsonable_encoder → json.dumps. Списки вместо этого
+выбирают ровно поля схемы ответа (schema_columns) и кодируются одним
+вызовом orjson (rows_response). response_model у эндпоинта остаётся —
+для OpenAPI; возвращённый Response FastAPI уже не валидирует.
+
+etag_response — то же для «тяжёлых» карточек: ETag — хэш тела, повторный
+просмотр без изменений получает 304 без тела.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Iterable, Mapping, Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def schema_columns(schema: type[BaseModel], source: Any, **overrides: Any) -> list[Any]:
+    """
+    Колонки под поля schema в их порядке: source.<поле> или выражение из
+    overrides (для полей, которых нет в таблице: user_phone, coalesce(...)).
+    """
+    cols = []
+    for name in schema.model_fields:
+        expr = overrides[name] if name in overrides else getattr(source, name)
+        cols.append(expr.label(name))
+    return cols
+
+
+def row_dicts(rows: Iterable[Any]) -> list[Mapping[str, Any]]:
+    return [dict(r._mapping) for r in rows]
+
+
+def rows_response(
+    rows: Iterable[Any],
+    headers: Optional[Mapping[str, str]] = None,
+    status_code: int = 200,
+) -> ORJSONResponse:
+    """Projected rows (Row из schema_columns) → JSON без модели на строку."""
+    return ORJSONResponse(row_dicts(rows), status_code=status_code, headers=dict(headers or {}))
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # W/"..." — браузер/прокси могли ослабить тег (например, после gzip)
+    return any(t.strip().removeprefix("W/") == etag for t in header.split(","))
+
+
+def etag_response(request: Request, content: Any) -> Response:
+    """JSON с ETag по содержимому; If-None-Match совпал — 304 без тела."""
+    body = orjson.dumps(content)
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    # private, no-cache: браузер хранит ответ, но каждый раз сверяет ETag
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,85 @@
+"""
+Составные индексы горячих запросов для уже существующих БД
+(create_all создаёт индексы только вместе с новой таблицей).
+
+  python -m app.migrate_indexes
+
+Идемпотентно (checkfirst), включая partial index живых бонусных грантов
+и поисковый индекс клиентов (users_fts / pg_trgm, app/models/user_search.py).
+Вызывается и на старте приложения (main.py).
+После создания индексов — ANALYZE, чтобы планировщик их выбирал.
+Уникальный users(tenant_id, phone) не создаётся, пока в тенанте есть
+дубли телефонов — они печатаются, их нужно слить вручную.
+"""
+from __future__ import annotations
+
+import sys
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.engine import Engine
+
+from app.core.database import engine as default_engine
+from app.models.bonus_grant import BonusGrant
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.models.user_search import FTS_TABLE, create_search_index
+
+INDEXED_TABLES = (Transaction.__table__, User.__table__, BonusGrant.__table__)
+
+
+def duplicate_phones(bind: Engine, limit: int = 20) -> list[tuple[int, str, int]]:
+    with bind.connect() as conn:
+        rows = conn.execute(
+            select(User.tenant_id, User.phone, func.count(User.id))
+            .group_by(User.tenant_id, User.phone)
+            .having(func.count(User.id) > 1)
+            .limit(limit)
+        ).all()
+    return [(int(t), str(p), int(n)) for t, p, n in rows]
+
+
+def migrate(bind: Engine | None = None, verbose: bool = False) -> dict[str, str]:
+    """{имя индекса: created / exists / skipped (...)}."""
+    bind = bind or default_engine
+    result: dict[str, str] = {}
+    insp = inspect(bind)
+    for table in INDEXED_TABLES:
+        if not insp.has_table(table.name):
+            continue  # таблицы ещё нет — создаст create_all
+        existing = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for ix in sorted(table.indexes, key=lambda i: i.name):
+            if len(ix.columns) < 2:
+                continue
+            if ix.name in existing:
+                result[ix.name] = "exists"
+                continue
+            if ix.unique and table is User.__table__:
+                dups = duplicate_phones(bind)
+                if dups:
+                    result[ix.name] = f"skipped ({len(dups)}+ duplicate phones)"
+                    if verbose:
+                        for t, p, n in dups:
+                            print(f"  [DUP] tenant={t} phone={p} x{n}")
+                    continue
+            ix.create(bind=bind, checkfirst=True)
+            result[ix.name] = "created"
+    if insp.has_table(User.__table__.name):
+        with bind.begin() as conn:
+            result[FTS_TABLE] = create_search_index(conn)
+    if "created" in result.values():
+        # Без статистики SQLite выбирает между индексами вслепую
+        # (например, tenant_id вместо user_id для истории клиента)
+        with bind.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    if verbose:
+        for name, status in result.items():
+            print(f"  [{status.split(' ')[0].upper()}] {name} {status if ' ' in status else ''}".rstrip())
+    return result
+
+
+if __name__ == "__main__":
+    import app.models.auth  # noqa: F401  (tenants — для FK)
+
+    print(f"Run index migration for DB: {default_engine.url.render_as_string(hide_password=True)}\n")
+    res = migrate(verbose=True)
+    sys.exit(1 if any(v.startswith("skipped") for v in res.values()) else 0)
@@ -0,0 +1,23 @@
+# app/models/ai_response_cache.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, String, DateTime, Text
+
+from app.core.database import Base
+
+
+class AiResponseCache(Base):
+    """Кэш ответов LLM: ключ — sha256(provider, model, system prompt, user prompt)."""
+    __tablename__ = "ai_response_cache"
+
+    key = Column(String(64), primary_key=True)
+
+    provider = Column(String(32), nullable=False)
+    model = Column(String(64), nullable=False)
+
+    # JSON-ответ модели (до валидации/санитайза target)
+    response_json = Column(Text, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
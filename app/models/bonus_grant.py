@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, and_, literal_column
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -9,6 +9,10 @@ from app.core.database import Base
 
 class BonusGrant(Base):
     __tablename__ = "bonus_grants"
+    __table_args__ = (
+        # Балансы и списание: user_id + status + срок
+        Index("ix_bonus_grants_user_status_expires", "user_id", "status", "expires_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -33,3 +37,30 @@ class BonusGrant(Base):
 
     user = relationship("User", back_populates="bonus_grants")
     transaction = relationship("Transaction", back_populates="bonus_grants")
+
+
+# ── Живые гранты ─────────────────────────────────────────────
+# Балансы и FIFO-списание читают только pending/available с остатком.
+# Partial index покрывает только их — размер не растёт с историей.
+ACTIVE_STATUSES = ("pending", "available")
+
+
+def active_grant_clause():
+    """
+    status IN ('pending','available') AND remaining > 0.
+    Статусы — литералами, а не bind-параметрами: иначе SQLite не докажет,
+    что запрос попадает под WHERE partial index, и не возьмёт его.
+    """
+    return and_(
+        BonusGrant.status.in_([literal_column(f"'{s}'") for s in ACTIVE_STATUSES]),
+        BonusGrant.remaining > 0,
+    )
+
+
+Index(
+    "ix_bonus_grants_active",
+    BonusGrant.user_id,
+    BonusGrant.expires_at,
+    sqlite_where=active_grant_clause(),
+    postgresql_where=active_grant_clause(),
+)
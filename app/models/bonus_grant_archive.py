@@ -0,0 +1,33 @@
+# app/models/bonus_grant_archive.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime
+
+from app.core.database import Base
+
+
+class BonusGrantArchive(Base):
+    """
+    Мёртвые гранты (expired / полностью потраченные), перенесённые из
+    bonus_grants архиватором (app.services.bonus_archive). Только история:
+    балансы и списание сюда не смотрят. id сохраняется исходный.
+    """
+    __tablename__ = "bonus_grants_archive"
+
+    id = Column(Integer, primary_key=True)
+
+    user_id = Column(Integer, nullable=False, index=True)
+    transaction_id = Column(Integer, nullable=True, index=True)
+
+    amount = Column(Integer, nullable=False, default=0)
+    remaining = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False)
+
+    available_from = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    source = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,31 @@
+# app/models/client_ai_suggestion.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+
+from app.core.database import Base
+
+
+class ClientAiSuggestion(Base):
+    """Next-best-action по клиенту из ночного batch-прогона (app.ai.batch)."""
+    __tablename__ = "client_ai_suggestions"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    # одна актуальная подсказка на клиента — прогон перезаписывает
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True)
+    phone = Column(String(16), nullable=False)
+
+    segment_key = Column(String(32), nullable=True)
+
+    answer = Column(Text, nullable=False)
+    insights_json = Column(Text, nullable=True)         # JSON-список строк
+    recommendations_json = Column(Text, nullable=False)  # JSON-список AiRecoOut
+
+    provider = Column(String(32), nullable=False)        # openai / stub
+    model = Column(String(64), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
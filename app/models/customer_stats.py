@@ -0,0 +1,35 @@
+# app/models/customer_stats.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+
+from app.core.database import Base
+
+
+class CustomerStats(Base):
+    """
+    Итоги клиента по архивной части истории (transactions_archive).
+    Lifetime = агрегат живых transactions + эта строка; архиватор
+    (app.services.tx_archive) пополняет её в той же транзакции, что и перенос.
+    """
+    __tablename__ = "customer_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+
+    # все архивные строки (как count/sum в аналитике)
+    tx_count = Column(Integer, nullable=False, default=0)
+    paid_total = Column(Integer, nullable=False, default=0)
+    amount_total = Column(Integer, nullable=False, default=0)
+
+    # покупки как в client_summary: net_paid = paid - refunded > 0
+    purchases_count = Column(Integer, nullable=False, default=0)
+    net_spent = Column(Integer, nullable=False, default=0)
+    last_purchase_at = Column(DateTime, nullable=True)
+
+    first_tx_at = Column(DateTime, nullable=True)
+    last_tx_at = Column(DateTime, nullable=True)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,44 @@
+# app/models/transaction_archive.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, Index
+
+from app.core.database import Base
+
+
+class TransactionArchive(Base):
+    """
+    Транзакции старше TX_ARCHIVE_AFTER_DAYS, перенесённые из transactions
+    архиватором (app.services.tx_archive). id сохраняется исходный.
+    Lifetime-итоги по ним — в customer_stats, сюда читает только история
+    (list_transactions / list_by_phone), когда этого требует диапазон дат.
+    """
+    __tablename__ = "transactions_archive"
+    __table_args__ = (
+        Index("ix_transactions_archive_tenant_created", "tenant_id", "created_at"),
+        Index("ix_transactions_archive_user_created", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+
+    tenant_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+
+    amount = Column(Integer, nullable=False)
+    paid_amount = Column(Integer, default=0, nullable=False)
+
+    redeem_points = Column(Integer, default=0, nullable=False)
+    earned_points = Column(Integer, default=0, nullable=False)
+
+    payment_method = Column(String, default="CASH", nullable=False)
+    comment = Column(String, nullable=True)
+
+    status = Column(String, nullable=False, default="completed")
+    refunded_amount = Column(Integer, nullable=False, default=0)
+    refunded_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, nullable=False)
+
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
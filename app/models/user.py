@@ -2,14 +2,21 @@ from __future__ import annotations
 
 from datetime import date, datetime
 
-from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Index, event
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
+from app.models import user_search
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Телефон уникален в пределах тенанта
+        Index("ux_users_tenant_phone", "tenant_id", "phone", unique=True),
+        # Список клиентов тенанта, keyset по (created_at, id)
+        Index("ix_users_tenant_created", "tenant_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -30,3 +37,8 @@ class User(Base):
 
     transactions = relationship("Transaction", back_populates="user")
     bonus_grants = relationship("BonusGrant", back_populates="user")
+
+
+# Поисковый индекс (FTS5 / pg_trgm) — вместе с таблицей, в т.ч. в файлах шардов
+event.listen(User.__table__, "after_create", user_search.after_users_create)
+event.listen(User.__table__, "after_drop", user_search.after_users_drop)
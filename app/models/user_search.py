@@ -0,0 +1,95 @@
+# app/models/user_search.py
+"""
+Поисковый индекс клиентов по full_name и phone.
+
+SQLite: FTS5-таблица users_fts (tokenize=trigram, external content над
+users) — MATCH по подстроке от 3 символов без скана users. Синхронизация —
+триггерами на INSERT / DELETE / UPDATE OF full_name, phone.
+Postgres: pg_trgm + GIN-индексы, их использует ILIKE '%q%'.
+
+Создаётся вместе с таблицей users (after_create, app/models/user.py), для
+существующих БД — app.migrate_indexes. Запросы — app.services.client_search.
+"""
+from __future__ import annotations
+
+from sqlalchemy import column, table, text
+from sqlalchemy.engine import Connection
+
+FTS_TABLE = "users_fts"
+
+# rowid = users.id
+users_fts = table(FTS_TABLE, column("rowid"))
+
+_SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "full_name, phone, content='users', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, full_name, phone) VALUES (new.id, new.full_name, new.phone);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_name, phone) VALUES ('delete', old.id, old.full_name, old.phone);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF full_name, phone ON users BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_name, phone) VALUES ('delete', old.id, old.full_name, old.phone);
+        INSERT INTO {FTS_TABLE}(rowid, full_name, phone) VALUES (new.id, new.full_name, new.phone);
+    END""",
+)
+
+_POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_full_name_trgm ON users USING gin (full_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_phone_trgm ON users USING gin (phone gin_trgm_ops)",
+)
+
+
+def _has_fts(conn: Connection) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :n"), {"n": FTS_TABLE}
+    ).first() is not None
+
+
+def create_search_index(conn: Connection, fresh: bool = False) -> str:
+    """
+    created / exists / skipped (...). fresh — таблица users только что
+    создана: старый users_fts (от удалённой users) пересоздаётся пустым.
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        if fresh:
+            conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+        existed = _has_fts(conn)
+        try:
+            for ddl in _SQLITE_DDL:
+                conn.execute(text(ddl))
+        except Exception as e:  # SQLite без FTS5 / без trigram (< 3.34)
+            return f"skipped ({e})"
+        if existed:
+            return "exists"
+        # Индексация уже существующих клиентов
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        return "created"
+    if dialect == "postgresql":
+        existed = conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE indexname = 'ix_users_full_name_trgm'")
+        ).first() is not None
+        try:
+            with conn.begin_nested():
+                for ddl in _POSTGRES_DDL:
+                    conn.execute(text(ddl))
+        except Exception as e:  # нет прав на CREATE EXTENSION
+            return f"skipped ({e})"
+        return "exists" if existed else "created"
+    return f"skipped ({dialect})"
+
+
+def drop_search_index(conn: Connection) -> None:
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+
+def after_users_create(target, connection: Connection, **kw) -> None:
+    create_search_index(connection, fresh=True)
+
+
+def after_users_drop(target, connection: Connection, **kw) -> None:
+    drop_search_index(connection)
@@ -0,0 +1,31 @@
+# app/models/whatsapp_message.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+
+from app.core.database import Base
+
+
+class WhatsappMessage(Base):
+    """Отправленное через GreenAPI сообщение — для статусов доставки."""
+    __tablename__ = "whatsapp_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # None = одиночная отправка (не из кампании)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="SET NULL"), nullable=True, index=True)
+
+    phone = Column(String(16), nullable=False)
+
+    # idMessage из ответа sendMessage — по нему приходят вебхуки статусов
+    provider_message_id = Column(String(64), nullable=False, unique=True, index=True)
+
+    # sent / failed / delivered / read
+    status = Column(String(16), nullable=False, default="sent")
+    status_updated_at = Column(DateTime, nullable=True)
+    delivered_at = Column(DateTime, nullable=True)
+    read_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,19 @@
+# app/models/whatsapp_number.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, String, Boolean, DateTime
+
+from app.core.database import Base
+
+
+class WhatsappNumber(Base):
+    """Кэш проверки «есть ли WhatsApp у номера» (GreenAPI checkWhatsapp)."""
+    __tablename__ = "whatsapp_numbers"
+
+    # нормализованный номер: 77001234567
+    phone = Column(String(16), primary_key=True)
+
+    has_whatsapp = Column(Boolean, nullable=False)
+    checked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -16,6 +16,9 @@ class AiAskIn(BaseModel):
 
     phone: Optional[str] = Field(default=None, min_length=5, max_length=32)
 
+    # True — сразу эвристика + job_id, ответ LLM через GET /api/ai/jobs/{job_id}
+    async_mode: bool = False
+
 
 class AiRecoOut(BaseModel):
     model_config = ConfigDict(extra="forbid")
@@ -31,7 +34,9 @@ class AiRecoOut(BaseModel):
 class AiAskOut(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
-    mode: Literal["openai", "gemini", "heuristic", "error"]
+    # cached — ответ LLM из кэша (те же данные и вопрос)
+    # batch — сохранённая подсказка ночного прогона (client_ai_suggestions)
+    mode: Literal["openai", "gemini", "heuristic", "cached", "batch", "error"]
     context: AIContext
 
     answer: str
@@ -40,3 +45,17 @@ class AiAskOut(BaseModel):
 
     payload: dict[str, Any] | None = None
     llm_error: str | None = None
+
+    # Размер промпта: оценка токенов payload до/после сжатия, бюджет,
+    # выброшенные поля; prompt_tokens/completion_tokens — фактические от API
+    meta: dict[str, Any] | None = None
+
+    # async_mode: id фоновой задачи с ответом LLM
+    job_id: str | None = None
+
+
+class AiJobOut(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "done", "error"]
+    result: AiAskOut | None = None
+    error: str | None = None
@@ -67,10 +67,23 @@ class CampaignRecipientOut(BaseModel):
     rfm: str = "111"
 
 
+class CampaignDeliveryOut(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    messages: int = 0
+    pending: int = 0
+    delivered: int = 0
+    read: int = 0
+    failed: int = 0
+    delivery_rate: float = 0.0
+    read_rate: float = 0.0
+
+
 class CampaignDetailOut(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
     campaign: CampaignOut
     recipients_total: int
     recipients_preview: List[CampaignRecipientOut] = []
+    delivery: Optional[CampaignDeliveryOut] = None
 
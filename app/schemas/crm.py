@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from typing import Literal, Optional
+from datetime import date, datetime
+from typing import List, Literal, Optional
 from pydantic import BaseModel, ConfigDict
 
+from app.schemas.transaction import TransactionOut
+
 
 Tier = Literal["Bronze", "Silver", "Gold"]
 
@@ -19,3 +22,48 @@ class ClientMetricsOut(BaseModel):
     avg_check: float
 
     bonus_balance: int
+
+
+# ── Карточка клиента (GET /api/clients/{phone}/card) ─────────
+class ClientProfileOut(BaseModel):
+    id: int
+    phone: str
+    full_name: Optional[str] = None
+    birth_date: Optional[date] = None
+    tier: Tier = "Bronze"
+    created_at: Optional[datetime] = None
+
+
+class ClientLifetimeOut(BaseModel):
+    total_spent: int
+    purchases_count: int
+    avg_check: float
+    last_purchase_at: Optional[datetime] = None
+    recency_days: Optional[int] = None
+
+
+class ClientBalanceOut(BaseModel):
+    available: int
+    pending: int
+    total: int
+    expiring_soon: int
+    expiring_soon_days: int
+    next_expiry_at: Optional[datetime] = None
+
+
+class ClientGrantOut(BaseModel):
+    id: int
+    amount: int
+    remaining: int
+    status: str
+    source: str
+    available_from: datetime
+    expires_at: datetime
+
+
+class ClientCardOut(BaseModel):
+    profile: ClientProfileOut
+    metrics: ClientLifetimeOut
+    balance: ClientBalanceOut
+    transactions: List[TransactionOut]
+    grants: List[ClientGrantOut]
@@ -33,3 +33,22 @@ class UserOut(BaseModel):
     tier: str
     bonus_balance: int
     created_at: datetime
+
+
+class UserImportRejectedOut(BaseModel):
+    line: int
+    reason: str
+    value: str
+
+
+class UserImportOut(BaseModel):
+    rows: int
+    inserted: int
+    updated: int
+    unchanged: int
+    duplicates: int
+    rejected: int
+    rejected_sample: list[UserImportRejectedOut]
+    columns: list[str]
+    elapsed_s: float
+    rows_per_s: int
@@ -4,17 +4,27 @@ from __future__ import annotations
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, select, union
 from sqlalchemy.orm import Session
 
+from app.models.customer_stats import CustomerStats
 from app.models.transaction import Transaction
 from app.models.user import User
+from app.services.client_search import match_ids
 
 
 def _utcnow() -> datetime:
     return datetime.utcnow()
 
 
+def _archived_totals(db: Session) -> Dict[int, tuple[int, int]]:
+    """uid -> (tx_count, paid_total) по архивной части истории (customer_stats)."""
+    return {
+        r.user_id: (int(r.tx_count or 0), int(r.paid_total or 0))
+        for r in db.query(CustomerStats.user_id, CustomerStats.tx_count, CustomerStats.paid_total)
+    }
+
+
 # =========================
 # Временные окна 7/30/90
 # =========================
@@ -139,12 +149,11 @@ def build_analytics_overview(db: Session) -> Dict[str, Any]:
 
     # Общие метрики
     clients_total = int(db.query(func.count(User.id)).scalar() or 0)
-    users_with_tx = int(
-        db.query(func.count(func.distinct(Transaction.user_id))).scalar() or 0
-    )
+    uids = union(select(Transaction.user_id), select(CustomerStats.user_id)).subquery()
+    users_with_tx = int(db.scalar(select(func.count()).select_from(uids)) or 0)
     total_spent = int(
         db.query(func.coalesce(func.sum(Transaction.paid_amount), 0)).scalar() or 0
-    )
+    ) + int(db.query(func.coalesce(func.sum(CustomerStats.paid_total), 0)).scalar() or 0)
 
     # RFM для сегментов
     since_90 = now - timedelta(days=90)
@@ -172,6 +181,8 @@ def build_analytics_overview(db: Session) -> Dict[str, Any]:
         .all()
     )
     total_freq_map = {r.uid: int(r.total) for r in total_freq_rows}
+    for uid, (cnt, _) in _archived_totals(db).items():
+        total_freq_map[uid] = total_freq_map.get(uid, 0) + cnt
 
     segment_counts: Dict[str, int] = {k: 0 for k in SEGMENT_DEFS}
 
@@ -287,11 +298,18 @@ def list_clients_by_segment(
         .all()
     )
     total_map = {r.uid: (int(r.total_freq), int(r.total_rev)) for r in total_rows}
-
-    # Пользователи
+    for uid, (cnt, rev) in _archived_totals(db).items():
+        f0, r0 = total_map.get(uid, (0, 0))
+        total_map[uid] = (f0 + cnt, r0 + rev)
+
+    # Пользователи (q — через поисковый индекс, app.services.client_search)
+    users_q = db.query(User)
+    matched = match_ids(db, q) if q else None
+    if matched is not None:
+        users_q = users_q.filter(User.id.in_(matched))
     users_map: Dict[int, User] = {
         u.id: u
-        for u in db.query(User).all()
+        for u in users_q.all()
     }
 
     # Для "all" — включаем всех пользователей без транзакций тоже
@@ -331,14 +349,6 @@ def list_clients_by_segment(
         if f_min and f < f_min: continue
         if m_min and m < m_min: continue
 
-        # Поиск по имени/телефону
-        if q:
-            q_low = q.lower()
-            name_match  = (user.full_name or "").lower().find(q_low) != -1
-            phone_match = (user.phone or "").find(q_low) != -1
-            if not name_match and not phone_match:
-                continue
-
         results.append({
             "phone":           user.phone,
             "full_name":       user.full_name,
@@ -0,0 +1,120 @@
+# app/services/bonus_archive.py
+"""
+Архив мёртвых бонусных грантов.
+
+Сгоревшие и полностью потраченные гранты навсегда оставались в bonus_grants
+со статусом expired. Архиватор переносит их в bonus_grants_archive пачками
+(INSERT ... SELECT + DELETE в одной транзакции на пачку), чтобы горячая
+таблица была пропорциональна живым балансам, а не истории.
+
+Мёртвый грант:
+  - срок истёк больше BONUS_ARCHIVE_AFTER_DAYS дней назад, или
+  - статус expired (потрачен / отозван возвратом) и создан раньше этого порога.
+
+На балансы перенос не влияет: они считают только живые гранты. Возврат
+покупки по архивному гранту ведёт себя как по гранту с remaining=0.
+
+  python -m app.services.bonus_archive --days 30
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, delete, insert, literal, or_, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import engine, shard_sessions
+from app.models.bonus_grant import BonusGrant
+from app.models.bonus_grant_archive import BonusGrantArchive
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = (
+    "id", "user_id", "transaction_id", "amount", "remaining", "status",
+    "available_from", "expires_at", "source", "created_at",
+)
+
+
+def _dead_clause(cutoff: datetime):
+    return or_(
+        BonusGrant.expires_at <= cutoff,
+        and_(BonusGrant.status == "expired", BonusGrant.created_at <= cutoff),
+    )
+
+
+def archive_dead_grants(
+    db: Session,
+    older_than_days: Optional[int] = None,
+    chunk: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """Перенести мёртвые гранты в архив; возвращает число перенесённых."""
+    now = now or datetime.utcnow()
+    days = int(settings.BONUS_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days)
+    size = max(1, int(chunk or settings.BONUS_ARCHIVE_CHUNK))
+    cutoff = now - timedelta(days=days)
+
+    src = BonusGrant.__table__
+    dst = BonusGrantArchive.__table__
+    moved = 0
+    last_id = 0
+    while True:
+        # keyset по id: каждая пачка продолжает с места предыдущей, без повторного скана
+        ids = db.scalars(
+            select(BonusGrant.id)
+            .where(BonusGrant.id > last_id, _dead_clause(cutoff))
+            .order_by(BonusGrant.id)
+            .limit(size)
+        ).all()
+        if not ids:
+            break
+        db.execute(insert(dst).from_select(
+            [*_COLUMNS, "archived_at"],
+            select(*(src.c[c] for c in _COLUMNS), literal(now, dst.c.archived_at.type))
+            .where(src.c.id.in_(ids)),
+        ))
+        db.execute(delete(src).where(src.c.id.in_(ids)))
+        db.commit()
+        moved += len(ids)
+        last_id = ids[-1]
+    if moved:
+        logger.info(f"Bonus archive: moved {moved} dead grants (cutoff {cutoff:%Y-%m-%d})")
+    return moved
+
+
+def _run() -> int:
+    # При DB_SHARDING — по каждому файлу тенанта
+    return sum(archive_dead_grants(db) for db in shard_sessions())
+
+
+async def bonus_archive_loop() -> None:
+    """Периодический архиватор (запускается на startup, если BONUS_ARCHIVE_INTERVAL_S > 0)."""
+    interval = int(settings.BONUS_ARCHIVE_INTERVAL_S)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(_run)
+        except Exception as e:
+            logger.error(f"Bonus archive error: {e}")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Перенос мёртвых бонусных грантов в архив")
+    ap.add_argument("--days", type=int, default=None, help="сколько дней грант мёртв (по умолчанию BONUS_ARCHIVE_AFTER_DAYS)")
+    ap.add_argument("--chunk", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    BonusGrantArchive.__table__.create(bind=engine, checkfirst=True)
+    moved = sum(archive_dead_grants(db, args.days, args.chunk) for db in shard_sessions())
+    print(f"moved: {moved}")
+
+
+if __name__ == "__main__":
+    main()
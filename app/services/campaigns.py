@@ -5,9 +5,11 @@ from datetime import datetime
 from typing import Dict, List, Optional
 
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import Row, desc
 
+from app.core.serialization import schema_columns
 from app.models.campaign import Campaign, CampaignRecipient
+from app.schemas.campaigns import CampaignRecipientOut
 from app.services.analytics import list_clients_by_segment
 
 
@@ -124,4 +126,24 @@ def list_recipients(
         .offset(offset)
         .limit(limit)
         .all()
+    )
+
+
+def list_recipient_rows(
+    db: Session,
+    campaign_id: int,
+    limit: int = 200,
+    offset: int = 0,
+) -> List[Row]:
+    """То же, но только поля CampaignRecipientOut — для сериализации списком."""
+    return (
+        db.query(*schema_columns(CampaignRecipientOut, CampaignRecipient))
+        .filter(CampaignRecipient.campaign_id == campaign_id)
+        .order_by(
+            desc(CampaignRecipient.revenue_90d),
+            desc(CampaignRecipient.purchases_90d),
+        )
+        .offset(offset)
+        .limit(limit)
+        .all()
     )
\ No newline at end of file
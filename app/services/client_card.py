@@ -0,0 +1,92 @@
+# app/services/client_card.py
+"""
+Карточка клиента одним запросом к API.
+
+Страница /admin/client/{phone} собиралась из нескольких эндпоинтов (CRM,
+балансы, история), и каждый заново искал клиента по телефону и пересчитывал
+агрегаты. Здесь — фиксированный набор запросов:
+
+1. client_summary: профиль + lifetime-итоги + available/pending (один запрос);
+2. последние транзакции (user_history: горячие строки, архив — только если нужен);
+3. живые гранты по ix_bonus_grants_active — из них expiring_soon.
+
+Только чтение: lifecycle грантов не запускается (как в client_summary),
+pending с наступившим available_from показывается как available.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import and_, case, select
+from sqlalchemy.orm import Session
+
+from app.core.serialization import row_dicts
+from app.models.bonus_grant import BonusGrant, active_grant_clause
+from app.services.client_summary import client_summary
+from app.services.transactions import user_history
+
+EXPIRING_SOON_DAYS = 14  # как expiring_soon в app.services.loyalty
+RECENT_TX = 20
+
+
+def _active_grants(db: Session, user_id: int, now: datetime) -> list[Any]:
+    status = case(
+        (and_(BonusGrant.status == "pending", BonusGrant.available_from <= now), "available"),
+        else_=BonusGrant.status,
+    )
+    return db.execute(
+        select(
+            BonusGrant.id, BonusGrant.amount, BonusGrant.remaining, status.label("status"),
+            BonusGrant.source, BonusGrant.available_from, BonusGrant.expires_at,
+        )
+        .where(BonusGrant.user_id == user_id, active_grant_clause(), BonusGrant.expires_at > now)
+        .order_by(BonusGrant.expires_at.asc(), BonusGrant.id.asc())
+    ).all()
+
+
+def client_card(
+    db: Session,
+    tenant_id: int,
+    phone: str,
+    now: Optional[datetime] = None,
+    tx_limit: int = RECENT_TX,
+) -> Optional[dict[str, Any]]:
+    """Данные карточки по нормализованному телефону; None — клиента нет в тенанте."""
+    now = now or datetime.utcnow()
+    s = client_summary(db, tenant_id, phone, now=now)
+    if not s:
+        return None
+
+    grants = _active_grants(db, s["user_id"], now)
+    soon = now + timedelta(days=EXPIRING_SOON_DAYS)
+    available = [g for g in grants if g.status == "available"]
+    bonus = s["bonus"]
+
+    return {
+        "profile": {
+            "id":         s["user_id"],
+            "phone":      s["phone"],
+            "full_name":  s["full_name"],
+            "birth_date": s["birth_date"],
+            "tier":       s["tier"],
+            "created_at": s["created_at"],
+        },
+        "metrics": {
+            "total_spent":      s["total_spent"],
+            "purchases_count":  s["purchases_count"],
+            "avg_check":        s["avg_check"],
+            "last_purchase_at": s["last_purchase_at"],
+            "recency_days":     s["recency_days"],
+        },
+        "balance": {
+            "available":          bonus["available"],
+            "pending":            bonus["pending"],
+            "total":              bonus["available"] + bonus["pending"],
+            "expiring_soon":      sum(int(g.remaining) for g in available if g.expires_at <= soon),
+            "expiring_soon_days": EXPIRING_SOON_DAYS,
+            "next_expiry_at":     available[0].expires_at if available else None,
+        },
+        "transactions": row_dicts(user_history(db, tenant_id, s["user_id"], s["phone"], tx_limit)),
+        "grants": row_dicts(grants),
+    }
@@ -0,0 +1,163 @@
+# app/services/client_search.py
+"""
+Поиск клиентов по фрагменту имени или телефона.
+
+- цифры («+7 701 12», «870112») — сначала префикс телефона диапазоном по
+  ux_users_tenant_phone («8…» ищется и как «7…»), затем подстрока;
+- слова от 3 символов — users_fts MATCH (SQLite, trigram; все слова,
+  в любом порядке) или ILIKE по GIN pg_trgm (Postgres); более короткие
+  слова запроса сужают совпадения LIKE-условием («Иван Пе»);
+- запрос без слов от 3 символов и без поискового индекса — LIKE (скан
+  тенанта). В SQLite имя сравнивается через unicode_lower (LIKE складывает
+  регистр только у ASCII, app.core.database).
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, List, Optional
+
+from sqlalchemy import Select, Row, func, literal_column, or_, select, text
+from sqlalchemy.orm import Session
+
+from app.core.serialization import schema_columns
+from app.models.user import User
+from app.models.user_search import FTS_TABLE, users_fts
+from app.schemas.user import UserOut
+
+_PHONE_QUERY = re.compile(r"^[\d\s()+\-]+$")
+_MIN_TRIGRAM = 3
+
+# движок → есть ли users_fts (кэшируется только «есть»)
+_fts_ready: set[str] = set()
+
+
+def phone_digits(q: str) -> Optional[str]:
+    """Цифры запроса, если он похож на телефон, иначе None."""
+    if not _PHONE_QUERY.match(q):
+        return None
+    return "".join(ch for ch in q if ch.isdigit()) or None
+
+
+def _dialect(db: Session) -> str:
+    return db.get_bind(User).dialect.name
+
+
+def _has_fts(db: Session) -> bool:
+    bind = db.get_bind(User)
+    key = str(bind.url)
+    if key not in _fts_ready:
+        found = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :n"), {"n": FTS_TABLE}
+        ).first()
+        if found is None:
+            return False
+        _fts_ready.add(key)
+    return True
+
+
+def _fts_query(q: str) -> Optional[str]:
+    """
+    Каждое слово от 3 символов — фраза (trigram ищет её как подстроку),
+    фразы через AND: «Ольга Ким» найдёт «Ким Ольга». None — таких слов нет.
+    """
+    words = [w for w in q.split() if len(w) >= _MIN_TRIGRAM]
+    if not words:
+        return None
+    return " ".join('"' + w.replace('"', '""') + '"' for w in words)
+
+
+def _like(q: str) -> str:
+    return "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _name_like(db: Session, q: str) -> Any:
+    """full_name содержит q без учёта регистра (и для кириллицы в SQLite)."""
+    if _dialect(db) == "sqlite":
+        return func.unicode_lower(User.full_name).like(_like(q.lower()), escape="\\")
+    return User.full_name.ilike(_like(q), escape="\\")
+
+
+def _text_match(db: Session, q: str) -> Any:
+    return or_(_name_like(db, q), User.phone.like(_like(q), escape="\\"))
+
+
+def _short_words(db: Session, q: str) -> list[Any]:
+    """LIKE-условия для слов короче trigram — в пару к MATCH по длинным."""
+    return [_text_match(db, w) for w in q.split() if len(w) < _MIN_TRIGRAM]
+
+
+def match_ids(db: Session, q: str) -> Optional[Select]:
+    """
+    SELECT users.id по подстроке q в имени или телефоне (для фильтров списков,
+    без tenant и limit). None — пустой запрос.
+    """
+    q = (q or "").strip()
+    if not q:
+        return None
+    fts = _fts_query(q)
+    if fts and _dialect(db) == "sqlite" and _has_fts(db):
+        match = literal_column(FTS_TABLE).op("MATCH")(fts)
+        short = _short_words(db, q)
+        if not short:
+            return select(users_fts.c.rowid).where(match)
+        return (
+            select(User.id)
+            .select_from(users_fts)
+            .join(User, User.id == users_fts.c.rowid)
+            .where(match, *short)
+        )
+    return select(User.id).where(_text_match(db, q))
+
+
+def _phone_prefix(db: Session, tenant_id: int, digits: str, limit: int) -> List[Row]:
+    prefixes = [digits]
+    if digits.startswith("8"):
+        prefixes.append("7" + digits[1:])
+    rows: List[Row] = []
+    for p in prefixes:
+        # phone >= p AND phone < p + ':' — диапазон по индексу (':' следует за '9')
+        rows += db.execute(
+            select(*schema_columns(UserOut, User))
+            .where(User.tenant_id == tenant_id, User.phone >= p, User.phone < p + ":")
+            .order_by(User.phone)
+            .limit(limit - len(rows))
+        ).all()
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def search_users(db: Session, tenant_id: int, q: str, limit: int = 20) -> List[Row]:
+    """Топ-N клиентов тенанта (строки по полям UserOut)."""
+    q = (q or "").strip()
+    if not q:
+        return []
+
+    rows: List[Row] = []
+    digits = phone_digits(q)
+    if digits:
+        rows = _phone_prefix(db, tenant_id, digits, limit)
+        if len(rows) >= limit:
+            return rows
+        q = digits
+
+    cols = schema_columns(UserOut, User)
+    stmt = select(*cols).where(User.tenant_id == tenant_id)
+    if rows:
+        stmt = stmt.where(User.id.notin_([r.id for r in rows]))
+
+    fts = _fts_query(q)
+    if fts and _dialect(db) == "sqlite" and _has_fts(db):
+        # Новые клиенты первыми: rowid DESC FTS5 отдаёт потоком, без сортировки
+        # всех совпадений (bm25 по частой фамилии читал бы их все)
+        stmt = (
+            stmt.select_from(users_fts)
+            .join(User, User.id == users_fts.c.rowid)
+            .where(literal_column(FTS_TABLE).op("MATCH")(fts), *_short_words(db, q))
+            .order_by(users_fts.c.rowid.desc())
+        )
+    elif digits:
+        stmt = stmt.where(User.phone.like(_like(q), escape="\\"))
+    else:
+        stmt = stmt.where(_text_match(db, q))
+    return rows + db.execute(stmt.limit(limit - len(rows))).all()
@@ -0,0 +1,151 @@
+# app/services/client_summary.py
+"""
+Сводка по клиенту: lifetime-итоги, частота, средний чек, recency, бонусы.
+
+Один агрегирующий запрос в рамках тенанта: users + агрегат транзакций +
+агрегат бонусных грантов (LEFT JOIN подзапросов). Только чтение — в отличие
+от get_balances, lifecycle грантов здесь не запускается и ничего не коммитится.
+
+Суммы как в CRM: net_paid = paid_amount - refunded_amount, строки с
+net_paid <= 0 не считаются покупками. Архивная часть истории
+(transactions_archive) приходит готовыми итогами из customer_stats.
+
+Используется AI (контекст client и batch), GET /api/crm/client/{phone}
+и карточка клиента (app.services.client_card).
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.bonus_grant import BonusGrant, active_grant_clause
+from app.models.customer_stats import CustomerStats
+from app.models.transaction import Transaction
+from app.models.user import User
+
+_CHUNK = 500
+
+
+def _tx_agg(tenant_id: Optional[int], user_ids):
+    paid = func.coalesce(Transaction.paid_amount, 0)
+    refunded = func.coalesce(Transaction.refunded_amount, 0)
+    net_paid = paid - refunded
+    is_purchase = net_paid > 0
+
+    q = select(
+        Transaction.user_id.label("user_id"),
+        func.coalesce(func.sum(case((is_purchase, net_paid), else_=0)), 0).label("total_spent"),
+        func.coalesce(func.sum(case((is_purchase, 1), else_=0)), 0).label("purchases_count"),
+        func.max(case((is_purchase, Transaction.created_at), else_=None)).label("last_purchase_at"),
+    )
+    q = q.where(Transaction.user_id.in_(user_ids))
+    if tenant_id:
+        q = q.where(Transaction.tenant_id == tenant_id)
+    return q.group_by(Transaction.user_id).subquery("tx")
+
+
+def _bonus_agg(now: datetime, user_ids):
+    # pending с наступившим available_from фактически уже available
+    is_available = or_(
+        BonusGrant.status == "available",
+        and_(BonusGrant.status == "pending", BonusGrant.available_from <= now),
+    )
+    return (
+        select(
+            BonusGrant.user_id.label("user_id"),
+            func.coalesce(func.sum(case((is_available, BonusGrant.remaining), else_=0)), 0).label("available"),
+            func.coalesce(func.sum(case((is_available, 0), else_=BonusGrant.remaining)), 0).label("pending"),
+        )
+        .where(
+            BonusGrant.user_id.in_(user_ids),
+            active_grant_clause(),
+            BonusGrant.expires_at > now,
+        )
+        .group_by(BonusGrant.user_id)
+        .subquery("bonus")
+    )
+
+
+def _summary_stmt(tenant_id: Optional[int], now: datetime, user_filter):
+    """user_filter — условие на User; агрегаты считаются только по этим клиентам."""
+    if tenant_id:
+        user_filter = and_(user_filter, User.tenant_id == tenant_id)
+    user_ids = select(User.id).where(user_filter)
+
+    tx = _tx_agg(tenant_id, user_ids)
+    bonus = _bonus_agg(now, user_ids)
+    arch = CustomerStats
+    return (
+        select(
+            User.id, User.phone, User.full_name, User.tier, User.bonus_balance,
+            User.birth_date, User.created_at,
+            tx.c.total_spent, tx.c.purchases_count, tx.c.last_purchase_at,
+            bonus.c.available, bonus.c.pending,
+            arch.net_spent.label("arch_spent"),
+            arch.purchases_count.label("arch_purchases"),
+            arch.last_purchase_at.label("arch_last_purchase_at"),
+        )
+        .outerjoin(tx, tx.c.user_id == User.id)
+        .outerjoin(bonus, bonus.c.user_id == User.id)
+        .outerjoin(arch, arch.user_id == User.id)
+        .where(user_filter)
+    )
+
+
+def _row_to_summary(r: Any, now: datetime) -> dict[str, Any]:
+    total = int(r.total_spent or 0) + int(r.arch_spent or 0)
+    count = int(r.purchases_count or 0) + int(r.arch_purchases or 0)
+    last = r.last_purchase_at
+    if isinstance(last, str):  # SQLite: max(case(...)) теряет тип DateTime
+        last = datetime.fromisoformat(last)
+    last = last or r.arch_last_purchase_at  # архив всегда старше живых строк
+    return {
+        "user_id":          r.id,
+        "phone":            r.phone,
+        "full_name":        r.full_name,
+        "tier":             r.tier or "Bronze",
+        "birth_date":       r.birth_date,
+        "created_at":       r.created_at,
+        "total_spent":      total,
+        "purchases_count":  count,
+        "avg_check":        round(total / count, 2) if count else 0.0,
+        "last_purchase_at": last,
+        "recency_days":     (now - last).days if last else None,
+        "bonus": {
+            "available": int(r.available or 0),
+            "pending":   int(r.pending or 0),
+        },
+        # кэш в users (как показывал CRM раньше)
+        "bonus_balance":    int(r.bonus_balance or 0),
+    }
+
+
+def client_summary(
+    db: Session,
+    tenant_id: Optional[int],
+    phone: str,
+    now: Optional[datetime] = None,
+) -> Optional[dict[str, Any]]:
+    """Сводка по нормализованному телефону; None — клиента нет в тенанте."""
+    now = now or datetime.utcnow()
+    row = db.execute(_summary_stmt(tenant_id, now, User.phone == phone).limit(1)).first()
+    return _row_to_summary(row, now) if row else None
+
+
+def client_summaries(
+    db: Session,
+    tenant_id: Optional[int],
+    user_ids: list[int],
+    now: Optional[datetime] = None,
+) -> list[dict[str, Any]]:
+    """То же пачкой: один запрос на каждые 500 клиентов."""
+    now = now or datetime.utcnow()
+    out: list[dict[str, Any]] = []
+    for i in range(0, len(user_ids), _CHUNK):
+        chunk = user_ids[i:i + _CHUNK]
+        rows = db.execute(_summary_stmt(tenant_id, now, User.id.in_(chunk))).all()
+        out.extend(_row_to_summary(r, now) for r in rows)
+    return out
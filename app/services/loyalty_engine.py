@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, func
 
 from app.models.settings_model import Settings
-from app.models.bonus_grant import BonusGrant
+from app.models.bonus_grant import BonusGrant, active_grant_clause
 
 
 def _now() -> datetime:
@@ -37,9 +37,9 @@ def process_bonus_lifecycle(db: Session, user_id: int, now: datetime | None = No
     grants = db.scalars(
         select(BonusGrant).where(
             BonusGrant.user_id == user_id,
+            active_grant_clause(),
             BonusGrant.status == "pending",
             BonusGrant.available_from <= now,
-            BonusGrant.remaining > 0,
         )
     ).all()
     for g in grants:
@@ -48,9 +48,8 @@ def process_bonus_lifecycle(db: Session, user_id: int, now: datetime | None = No
     exp = db.scalars(
         select(BonusGrant).where(
             BonusGrant.user_id == user_id,
-            BonusGrant.status.in_(["pending", "available"]),
+            active_grant_clause(),
             BonusGrant.expires_at <= now,
-            BonusGrant.remaining > 0,
         )
     ).all()
     for g in exp:
@@ -82,16 +81,16 @@ def get_balances(db: Session, user_id: int, now: datetime | None = None) -> dict
     available = db.scalar(
         select(func.coalesce(func.sum(BonusGrant.remaining), 0)).where(
             BonusGrant.user_id == user_id,
+            active_grant_clause(),
             BonusGrant.status == "available",
             BonusGrant.expires_at > now,
-            BonusGrant.remaining > 0,
         )
     )
     pending = db.scalar(
         select(func.coalesce(func.sum(BonusGrant.remaining), 0)).where(
             BonusGrant.user_id == user_id,
+            active_grant_clause(),
             BonusGrant.status == "pending",
-            BonusGrant.remaining > 0,
         )
     )
 
@@ -124,9 +123,9 @@ def consume_available(db: Session, user_id: int, to_spend: int, now: datetime |
         select(BonusGrant)
         .where(
             BonusGrant.user_id == user_id,
+            active_grant_clause(),
             BonusGrant.status == "available",
             BonusGrant.expires_at > now,
-            BonusGrant.remaining > 0,
         )
         .order_by(BonusGrant.expires_at.asc(), BonusGrant.created_at.asc())
         .with_for_update()
@@ -0,0 +1,114 @@
+# app/services/shard_migrate.py
+"""
+Перенос данных тенантов из общей БД в шарды — включение DB_SHARDING на
+рабочей базе.
+
+Без переноса шард тенанта создаётся пустым и тенант «теряет» клиентов,
+поэтому при DB_SHARDING=1 приложение не стартует, пока в общей БД
+остались строки SHARDED_TABLES (assert_shared_tables_empty).
+
+По каждому тенанту таблицы копируются пачками в его файл с теми же id
+(INSERT OR IGNORE — повторный запуск после сбоя ничего не дублирует),
+затем строки тенанта удаляются из общей БД. Запускать при остановленном
+приложении.
+
+  DB_SHARDING=1 python -m app.services.shard_migrate
+  DB_SHARDING=1 python -m app.services.shard_migrate --tenant 5
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+from typing import Optional
+
+from sqlalchemy import Table, delete, insert, select
+from sqlalchemy.engine import Engine
+
+from app.core.database import Base, SHARDED_TABLES, engine, shard_engine, shards_enabled
+
+CHUNK = 5000
+
+
+def _tables() -> list[Table]:
+    return [Base.metadata.tables[n] for n in SHARDED_TABLES if n in Base.metadata.tables]
+
+
+def _tenant_clause(t: Table, tenant_id: int):
+    if "tenant_id" in t.c:
+        return t.c.tenant_id == tenant_id
+    # bonus_grants(_archive) — через клиента
+    users = Base.metadata.tables["users"]
+    return t.c.user_id.in_(select(users.c.id).where(users.c.tenant_id == tenant_id))
+
+
+def pending_tenant_ids(src: Optional[Engine] = None) -> list[int]:
+    """Тенанты, чьи строки ещё лежат в общей БД."""
+    src = src or engine
+    out: set[int] = set()
+    with src.connect() as conn:
+        for t in _tables():
+            if "tenant_id" in t.c and src.dialect.has_table(conn, t.name):
+                out.update(conn.execute(select(t.c.tenant_id).distinct()).scalars())
+    return sorted(out)
+
+
+def assert_shared_tables_empty() -> None:
+    """Startup при DB_SHARDING: не открывать пустые шарды поверх неперенесённых данных."""
+    if not shards_enabled():
+        return
+    pending = pending_tenant_ids()
+    if pending:
+        raise RuntimeError(
+            f"DB_SHARDING=1, но в общей БД остались данные тенантов {pending[:10]}: "
+            "перенесите их командой python -m app.services.shard_migrate"
+        )
+
+
+def migrate_tenant(tenant_id: int, chunk: int = CHUNK) -> dict[str, int]:
+    """Копирует строки тенанта в его шард и удаляет их из общей БД; {таблица: строк}."""
+    dst = shard_engine(tenant_id)
+    copied: dict[str, int] = {}
+    with engine.connect() as src:
+        tables = [t for t in _tables() if engine.dialect.has_table(src, t.name)]
+        for t in tables:
+            n = 0
+            result = src.execution_options(yield_per=chunk).execute(
+                select(t).where(_tenant_clause(t, tenant_id))
+            )
+            for part in result.partitions():
+                with dst.begin() as conn:
+                    conn.execute(insert(t).prefix_with("OR IGNORE"), [dict(r._mapping) for r in part])
+                n += len(part)
+            copied[t.name] = n
+
+    # Копия зафиксирована в шарде — теперь можно удалить из общей БД
+    # (в обратном порядке: гранты и транзакции ссылаются на users)
+    with engine.begin() as conn:
+        for t in reversed(tables):
+            conn.execute(delete(t).where(_tenant_clause(t, tenant_id)))
+    return copied
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Перенос данных тенантов из общей БД в шарды")
+    ap.add_argument("--tenant", type=int, action="append", help="только эти тенанты (по умолчанию — все с данными)")
+    ap.add_argument("--chunk", type=int, default=CHUNK)
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not shards_enabled():
+        raise SystemExit("DB_SHARDING выключен (или DATABASE_URL не SQLite) — переносить некуда")
+    import app.models  # noqa: F401
+    import app.models.auth  # noqa: F401
+    import app.models.bonus_grant_archive  # noqa: F401
+    import app.models.client_ai_suggestion  # noqa: F401
+    import app.models.customer_stats  # noqa: F401
+    import app.models.transaction_archive  # noqa: F401
+
+    for tid in args.tenant or pending_tenant_ids():
+        copied = migrate_tenant(tid, args.chunk)
+        print(f"tenant {tid}: " + ", ".join(f"{k}={v}" for k, v in copied.items() if v))
+
+
+if __name__ == "__main__":
+    main()
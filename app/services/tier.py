@@ -3,6 +3,7 @@ from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 
 from app.core.tier_rules import tier_from_total
+from app.models.customer_stats import CustomerStats
 from app.models.transaction import Transaction
 from app.models.user import User
 
@@ -11,6 +12,8 @@ def recompute_user_tier(db: Session, user: User) -> str:
     total_spent = db.execute(
         select(func.coalesce(func.sum(Transaction.amount), 0)).where(Transaction.user_id == user.id)
     ).scalar_one()
+    # + архивная часть истории
+    total_spent += db.scalar(select(CustomerStats.amount_total).where(CustomerStats.user_id == user.id)) or 0
 
     total_spent_dec = Decimal(str(total_spent))
     new_tier = tier_from_total(total_spent_dec)
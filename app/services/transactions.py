@@ -0,0 +1,426 @@
+# app/services/transactions.py
+"""
+Покупки и возвраты: логика эндпоинтов /api/transactions.
+
+Функции принимают обычную Session — их вызывает и синхронный роутер
+(app.api.transactions), и асинхронный (app.api.transactions_async через
+run_db), поэтому результат — готовые схемы или строки
+выборки (списки: поля TransactionOut, app.core.serialization), без ленивых
+атрибутов ORM.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import Row, desc, func, literal, select
+from sqlalchemy.orm import Session
+
+from app.core.pagination import Cursor, capped_count, decode_cursor, keyset_page
+from app.core.phone import normalize_phone
+from app.core.serialization import schema_columns
+from app.models.bonus_grant import BonusGrant
+from app.models.transaction import Transaction
+from app.models.transaction_archive import TransactionArchive
+from app.models.user import User
+from app.schemas.transaction import TransactionCreate, TransactionOut, TransactionRefund
+from app.services import tx_archive
+from app.services.loyalty_engine import (
+    get_settings,
+    get_balances,
+    redeem_cap,
+    consume_available,
+    calc_earn,
+    grant_purchase_bonus,
+)
+
+
+class TransactionError(Exception):
+    """Ошибка запроса — роутер отдаёт её как HTTPException(status_code, detail)."""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def clamp(n: int, lo: int, hi: int) -> int:
+    return max(lo, min(n, hi))
+
+
+def create_transaction(db: Session, tenant_id: int, payload: TransactionCreate) -> TransactionOut:
+    settings = get_settings(db)
+
+    user_phone = normalize_phone(payload.user_phone)
+
+    user = (
+        db.query(User)
+        .filter(User.tenant_id == tenant_id)
+        .filter(User.phone == user_phone)
+        .first()
+    )
+    if not user:
+        user = User(
+            tenant_id=tenant_id,
+            phone=user_phone,
+            full_name=payload.full_name or "",
+            birth_date=payload.birth_date,
+            tier=payload.tier or "Bronze",
+            bonus_balance=0,
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+    paid_amount = payload.paid_amount if payload.paid_amount is not None else payload.amount
+    paid_amount = int(paid_amount or 0)
+
+    balances = get_balances(db, user_id=user.id)
+    active_balance = int(balances["available"])  # только активированные — можно списать
+
+    cap = redeem_cap(paid_amount, settings)
+    requested = int(payload.redeem_points or 0)
+
+    # Жёсткий двойной лимит: не больше баланса И не больше % от чека
+    # consume_available дополнительно защищён SELECT FOR UPDATE
+    redeem_target = clamp(requested, 0, min(active_balance, cap))
+    redeemed = consume_available(db, user_id=user.id, to_spend=redeem_target)
+
+    # Защита: если реально списано меньше (race condition) — пересчитываем
+    if redeemed > active_balance:
+        redeemed = active_balance  # не может случиться, но страховка
+
+    earned = calc_earn(paid_amount=paid_amount, tier=user.tier, settings=settings)
+
+    txn = Transaction(
+        tenant_id=tenant_id,
+        user_id=user.id,
+        amount=int(payload.amount or 0),
+        paid_amount=paid_amount,
+        redeem_points=redeemed,
+        earned_points=earned,
+        payment_method=payload.payment_method or "OTHER",
+        comment=payload.comment or "",
+        status="completed",
+        refunded_amount=0,
+        refunded_at=None,
+    )
+    db.add(txn)
+    db.commit()
+    db.refresh(txn)
+
+    # ✅ начисление бонусов привязываем к txn.id
+    grant_purchase_bonus(db, user_id=user.id, earn=earned, settings=settings, txn_id=txn.id)
+
+    balances2 = get_balances(db, user_id=user.id)
+    # bonus_balance = total (available + pending) — клиент видит все свои бонусы
+    # Списывать можно только available, но показываем всё
+    user.bonus_balance = int(balances2["total"])
+    db.commit()
+
+    out = TransactionOut.model_validate(txn)
+    out.user_phone = user.phone
+    return out
+
+
+def refund_transaction(db: Session, tenant_id: int, tx_id: int, payload: TransactionRefund) -> TransactionOut:
+    settings = get_settings(db)
+    now = datetime.utcnow()
+
+    tx = (
+        db.query(Transaction)
+        .filter(Transaction.tenant_id == tenant_id)
+        .filter(Transaction.id == tx_id)
+        .first()
+    )
+    if not tx:
+        raise TransactionError(404, "Transaction not found")
+
+    if tx.status == "refunded":
+        raise TransactionError(400, "Transaction already fully refunded")
+
+    if tx.paid_amount <= 0:
+        raise TransactionError(400, "Invalid paid_amount for refund")
+
+    # Определяем сумму возврата
+    if payload.full_refund:
+        refund_amount = tx.paid_amount - int(tx.refunded_amount or 0)
+    else:
+        if not payload.amount:
+            raise TransactionError(400, "amount is required for partial refund")
+        refund_amount = int(payload.amount)
+
+    refundable_left = tx.paid_amount - int(tx.refunded_amount or 0)
+    refund_amount = clamp(refund_amount, 1, max(0, refundable_left))
+    if refund_amount <= 0:
+        raise TransactionError(400, "Nothing to refund")
+
+    # Пропорции
+    ratio_num = refund_amount
+    ratio_den = tx.paid_amount
+
+    earned_revert = int((tx.earned_points * ratio_num) // ratio_den) if tx.earned_points > 0 else 0
+    redeem_return = int((tx.redeem_points * ratio_num) // ratio_den) if tx.redeem_points > 0 else 0
+
+    user = (
+        db.query(User)
+        .filter(User.tenant_id == tenant_id)
+        .filter(User.id == tx.user_id)
+        .first()
+    )
+    if not user:
+        raise TransactionError(404, "User not found")
+
+    # 1) Возвращаем списанные бонусы клиенту (redeem_return)
+    if redeem_return > 0:
+        available_from = now  # сразу доступно
+        expires_at = now + timedelta(days=int(settings.burn_days))  # тот же burn_days
+        g = BonusGrant(
+            user_id=user.id,
+            transaction_id=tx.id,
+            amount=redeem_return,
+            remaining=redeem_return,
+            status="available",
+            available_from=available_from,
+            expires_at=expires_at,
+            source="refund_redeem",
+        )
+        db.add(g)
+        db.commit()
+
+    # 2) Забираем начисленные за покупку бонусы (earned_revert)
+    if earned_revert > 0:
+        grant = db.scalar(
+            select(BonusGrant).where(
+                BonusGrant.user_id == user.id,
+                BonusGrant.transaction_id == tx.id,
+                BonusGrant.source == "purchase",
+            )
+        )
+        shortfall = earned_revert
+
+        if grant:
+            take = min(int(grant.remaining or 0), shortfall)
+            grant.remaining = int(grant.remaining or 0) - take
+            shortfall -= take
+            if grant.remaining <= 0:
+                grant.remaining = 0
+                grant.status = "expired"
+            db.commit()
+
+        # если начисление уже потрачено — докусываем из текущего available (чтобы баланс стал корректным)
+        if shortfall > 0:
+            consume_available(db, user_id=user.id, to_spend=shortfall)
+
+    # 3) Фиксируем состояние транзакции
+    tx.refunded_amount = int(tx.refunded_amount or 0) + refund_amount
+    tx.refunded_at = now
+    if tx.refunded_amount >= tx.paid_amount:
+        tx.status = "refunded"
+    else:
+        tx.status = "partially_refunded"
+
+    # можно сохранить комментарий в tx.comment (без отдельного поля)
+    if payload.comment:
+        base = (tx.comment or "").strip()
+        add = f"[REFUND {refund_amount}] {payload.comment}".strip()
+        tx.comment = (base + " " + add).strip() if base else add
+
+    db.commit()
+
+    # 4) Обновляем баланс на пользователе
+    # Обновляем баланс на пользователе (total = available + pending)
+    balances2 = get_balances(db, user_id=user.id)
+    user.bonus_balance = int(balances2["total"])
+    db.commit()
+
+    out = TransactionOut.model_validate(tx)
+    out.user_phone = user.phone
+    return out
+
+
+def _columns(model, user_phone) -> list:
+    """Поля TransactionOut одной выборкой — без ORM-объекта и модели на строку."""
+    return schema_columns(
+        TransactionOut, model,
+        user_phone=user_phone,
+        comment=func.coalesce(model.comment, ""),
+    )
+
+
+def _cursor(after: Optional[str]) -> Optional[Cursor]:
+    try:
+        return decode_cursor(after)
+    except ValueError as e:
+        raise TransactionError(400, str(e))
+
+
+def _with_archive(rows: list, limit: int, newest: Optional[datetime], archive_page) -> list:
+    """
+    Дочитать архив, только если он может попасть в страницу: горячих строк
+    не хватило или последняя из них старше самой свежей архивной. Строки
+    обоих уровней сливаются по (created_at, id) — курсор общий.
+    """
+    if newest is None:
+        return rows
+    if len(rows) >= limit and rows[-1].created_at > newest:
+        return rows
+    merged = rows + archive_page.all()
+    merged.sort(key=lambda r: (r.created_at, r.id), reverse=True)
+    return merged[:limit]
+
+
+def list_by_phone(
+    db: Session,
+    tenant_id: int,
+    user_phone: str,
+    limit: int = 100,
+    after: Optional[str] = None,
+) -> List[Row]:
+    """Строки с полями TransactionOut (app.core.serialization.rows_response)."""
+    cursor = _cursor(after)
+    p = normalize_phone(user_phone)
+    user = (
+        db.query(User)
+        .filter(User.tenant_id == tenant_id)
+        .filter(User.phone == p)
+        .first()
+    )
+    if not user:
+        return []
+    return user_history(db, tenant_id, user.id, user.phone, limit, cursor)
+
+
+def user_history(
+    db: Session,
+    tenant_id: int,
+    user_id: int,
+    phone: str,
+    limit: int = 100,
+    cursor: Optional[Cursor] = None,
+) -> List[Row]:
+    """История уже найденного клиента (без повторного поиска по телефону)."""
+    live = (
+        db.query(*_columns(Transaction, literal(phone)))
+        .filter(Transaction.tenant_id == tenant_id)
+        .filter(Transaction.user_id == user_id)
+    )
+    rows = keyset_page(live, Transaction.created_at, Transaction.id, cursor, limit).all()
+
+    # Архив клиента: customer_stats знает, есть ли он и насколько свежий
+    arch = (
+        db.query(*_columns(TransactionArchive, literal(phone)))
+        .filter(TransactionArchive.tenant_id == tenant_id)
+        .filter(TransactionArchive.user_id == user_id)
+    )
+    return _with_archive(
+        rows, limit, tx_archive.user_archive_newest(db, user_id),
+        keyset_page(arch, TransactionArchive.created_at, TransactionArchive.id, cursor, limit),
+    )
+
+
+def _parse_range(date_from: Optional[str], date_to: Optional[str]) -> tuple[Optional[datetime], Optional[datetime]]:
+    # Фильтрация по календарным датам (включительно)
+    dt_from = dt_to = None
+    if date_from:
+        try:
+            dt_from = datetime.strptime(date_from, "%Y-%m-%d")
+        except ValueError:
+            pass
+    if date_to:
+        try:
+            # Берём конец дня — до 23:59:59
+            dt_to = datetime.strptime(date_to, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+        except ValueError:
+            pass
+    return dt_from, dt_to
+
+
+def _history_query(db: Session, model, tenant_id: int, phone: Optional[str], dt_from, dt_to):
+    """Один и тот же фильтр для transactions и transactions_archive."""
+    q = (
+        db.query(*_columns(model, User.phone))
+        .join(User, User.id == model.user_id)
+        .filter(model.tenant_id == tenant_id)
+        .filter(User.tenant_id == tenant_id)
+    )
+    if phone:
+        q = q.filter(User.phone == normalize_phone(phone))
+    if dt_from:
+        q = q.filter(model.created_at >= dt_from)
+    if dt_to:
+        q = q.filter(model.created_at <= dt_to)
+    return q
+
+
+def _archive_newest_in_range(db: Session, tenant_id: int, dt_from: Optional[datetime]) -> Optional[datetime]:
+    newest = tx_archive.archive_newest(db, tenant_id)
+    if newest is None or (dt_from is not None and newest < dt_from):
+        return None  # диапазон дат до архива не дотягивается
+    return newest
+
+
+def list_transactions(
+    db: Session,
+    tenant_id: int,
+    phone: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    after: Optional[str] = None,
+) -> List[Row]:
+    """
+    Строки с полями TransactionOut, от новых к старым (created_at, id). Основной режим — курсор
+    `after` (X-Next-Cursor предыдущей страницы); offset оставлен для
+    совместимости и на глубоких страницах медленный.
+    """
+    cursor = _cursor(after)
+    dt_from, dt_to = _parse_range(date_from, date_to)
+
+    live = _history_query(db, Transaction, tenant_id, phone, dt_from, dt_to)
+    arch = _history_query(db, TransactionArchive, tenant_id, phone, dt_from, dt_to)
+
+    if cursor or not offset:
+        rows = keyset_page(live, Transaction.created_at, Transaction.id, cursor, limit).all()
+        rows = _with_archive(
+            rows, limit, _archive_newest_in_range(db, tenant_id, dt_from),
+            keyset_page(arch, TransactionArchive.created_at, TransactionArchive.id, cursor, limit),
+        )
+        return rows
+
+    # offset: горячая таблица, затем архив
+    rows = (
+        live.order_by(desc(Transaction.created_at), desc(Transaction.id))
+        .offset(offset).limit(limit).all()
+    )
+    if len(rows) >= limit or _archive_newest_in_range(db, tenant_id, dt_from) is None:
+        return rows
+
+    arch_offset = 0
+    if not rows:
+        arch_offset = max(0, offset - live.count())
+    rows = rows + (
+        arch.order_by(desc(TransactionArchive.created_at), desc(TransactionArchive.id))
+        .offset(arch_offset)
+        .limit(limit - len(rows))
+        .all()
+    )
+    return rows
+
+
+def count_transactions(
+    db: Session,
+    tenant_id: int,
+    phone: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> tuple[int, bool]:
+    """Оценка для X-Total-Count: не больше LIST_COUNT_CAP строк (горячие + архив)."""
+    dt_from, dt_to = _parse_range(date_from, date_to)
+    n, capped = capped_count(_history_query(db, Transaction, tenant_id, phone, dt_from, dt_to), Transaction.id)
+    if not capped and _archive_newest_in_range(db, tenant_id, dt_from) is not None:
+        arch = _history_query(db, TransactionArchive, tenant_id, phone, dt_from, dt_to)
+        m, capped = capped_count(arch, TransactionArchive.id)
+        n += m
+    return n, capped
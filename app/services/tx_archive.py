@@ -0,0 +1,197 @@
+# app/services/tx_archive.py
+"""
+Архив истории транзакций.
+
+transactions растёт без ограничений, а горячим запросам (RFM — 90 дней,
+список в админке — последние строки) нужна только свежая часть. Архиватор
+переносит транзакции старше TX_ARCHIVE_AFTER_DAYS в transactions_archive
+пачками; в той же транзакции их суммы добавляются в customer_stats, так что
+lifetime-итоги (client_summary, tier, сегменты) не меняются.
+
+Не переносятся транзакции, на которые ещё ссылается бонусный грант
+(живые начисления, возвраты по ним) — они уйдут после архива грантов.
+Возврат по архивной транзакции невозможен (404), поэтому горизонт должен
+быть больше срока возврата.
+
+  python -m app.services.tx_archive --days 365
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import case, delete, exists, func, insert, literal, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import engine, shard_sessions
+from app.models.bonus_grant import BonusGrant
+from app.models.customer_stats import CustomerStats
+from app.models.transaction import Transaction
+from app.models.transaction_archive import TransactionArchive
+
+logger = logging.getLogger(__name__)
+
+# RFM и сегменты читают 90 дней только из горячей таблицы
+MIN_DAYS = 91
+
+_COLUMNS = (
+    "id", "tenant_id", "user_id", "amount", "paid_amount", "redeem_points",
+    "earned_points", "payment_method", "comment", "status", "refunded_amount",
+    "refunded_at", "created_at",
+)
+
+
+def _chunk_stats(db: Session, ids: list[int]) -> list[Any]:
+    net_paid = func.coalesce(Transaction.paid_amount, 0) - func.coalesce(Transaction.refunded_amount, 0)
+    is_purchase = net_paid > 0
+    return db.execute(
+        select(
+            Transaction.user_id,
+            Transaction.tenant_id,
+            func.count(Transaction.id).label("tx_count"),
+            func.coalesce(func.sum(Transaction.paid_amount), 0).label("paid_total"),
+            func.coalesce(func.sum(Transaction.amount), 0).label("amount_total"),
+            func.coalesce(func.sum(case((is_purchase, 1), else_=0)), 0).label("purchases_count"),
+            func.coalesce(func.sum(case((is_purchase, net_paid), else_=0)), 0).label("net_spent"),
+            func.max(case((is_purchase, Transaction.created_at), else_=None)).label("last_purchase_at"),
+            func.min(Transaction.created_at).label("first_tx_at"),
+            func.max(Transaction.created_at).label("last_tx_at"),
+        )
+        .where(Transaction.id.in_(ids))
+        .group_by(Transaction.user_id, Transaction.tenant_id)
+    ).all()
+
+
+def _as_dt(v: Any) -> Optional[datetime]:
+    if isinstance(v, str):  # SQLite: max(case(...)) теряет тип DateTime
+        return datetime.fromisoformat(v)
+    return v
+
+
+def _later(a: Optional[datetime], b: Optional[datetime]) -> Optional[datetime]:
+    return max(a, b) if a and b else (a or b)
+
+
+def _earlier(a: Optional[datetime], b: Optional[datetime]) -> Optional[datetime]:
+    return min(a, b) if a and b else (a or b)
+
+
+def _add_stats(db: Session, rows: list[Any], now: datetime) -> None:
+    existing = {
+        s.user_id: s
+        for s in db.scalars(select(CustomerStats).where(CustomerStats.user_id.in_([r.user_id for r in rows])))
+    }
+    for r in rows:
+        s = existing.get(r.user_id)
+        if s is None:
+            s = CustomerStats(
+                user_id=r.user_id, tenant_id=r.tenant_id,
+                tx_count=0, paid_total=0, amount_total=0, purchases_count=0, net_spent=0,
+            )
+            db.add(s)
+        s.tx_count += int(r.tx_count or 0)
+        s.paid_total += int(r.paid_total or 0)
+        s.amount_total += int(r.amount_total or 0)
+        s.purchases_count += int(r.purchases_count or 0)
+        s.net_spent += int(r.net_spent or 0)
+        s.last_purchase_at = _later(s.last_purchase_at, _as_dt(r.last_purchase_at))
+        s.first_tx_at = _earlier(s.first_tx_at, _as_dt(r.first_tx_at))
+        s.last_tx_at = _later(s.last_tx_at, _as_dt(r.last_tx_at))
+        s.updated_at = now
+
+
+def archive_transactions(
+    db: Session,
+    older_than_days: Optional[int] = None,
+    chunk: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """Перенести старые транзакции в архив; возвращает число перенесённых."""
+    now = now or datetime.utcnow()
+    days = int(settings.TX_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days)
+    days = max(days, MIN_DAYS)
+    size = max(1, int(chunk or settings.TX_ARCHIVE_CHUNK))
+    cutoff = now - timedelta(days=days)
+
+    src = Transaction.__table__
+    dst = TransactionArchive.__table__
+    referenced = exists().where(BonusGrant.transaction_id == Transaction.id)
+    moved = 0
+    last_id = 0
+    while True:
+        ids = db.scalars(
+            select(Transaction.id)
+            .where(Transaction.id > last_id, Transaction.created_at < cutoff, ~referenced)
+            .order_by(Transaction.id)
+            .limit(size)
+        ).all()
+        if not ids:
+            break
+        # итоги, копия и удаление — одной транзакцией на пачку
+        _add_stats(db, _chunk_stats(db, ids), now)
+        db.flush()
+        db.execute(insert(dst).from_select(
+            [*_COLUMNS, "archived_at"],
+            select(*(src.c[c] for c in _COLUMNS), literal(now, dst.c.archived_at.type))
+            .where(src.c.id.in_(ids)),
+        ))
+        db.execute(delete(src).where(src.c.id.in_(ids)))
+        db.commit()
+        moved += len(ids)
+        last_id = ids[-1]
+    if moved:
+        logger.info(f"Transaction archive: moved {moved} rows (cutoff {cutoff:%Y-%m-%d})")
+    return moved
+
+
+# ── Чтение ───────────────────────────────────────────────────
+def archive_newest(db: Session, tenant_id: int) -> Optional[datetime]:
+    """Самая свежая архивная транзакция тенанта (None — архив пуст)."""
+    return db.scalar(
+        select(func.max(TransactionArchive.created_at)).where(TransactionArchive.tenant_id == tenant_id)
+    )
+
+
+def user_archive_newest(db: Session, user_id: int) -> Optional[datetime]:
+    """Самая свежая архивная транзакция клиента — из customer_stats, без чтения архива."""
+    return db.scalar(select(CustomerStats.last_tx_at).where(CustomerStats.user_id == user_id))
+
+
+# ── Фон / CLI ────────────────────────────────────────────────
+def _run() -> int:
+    # При DB_SHARDING — по каждому файлу тенанта
+    return sum(archive_transactions(db) for db in shard_sessions())
+
+
+async def tx_archive_loop() -> None:
+    """Периодический архиватор (запускается на startup, если TX_ARCHIVE_INTERVAL_S > 0)."""
+    interval = int(settings.TX_ARCHIVE_INTERVAL_S)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(_run)
+        except Exception as e:
+            logger.error(f"Transaction archive error: {e}")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Перенос старых транзакций в архив")
+    ap.add_argument("--days", type=int, default=None, help=f"горизонт в днях (по умолчанию TX_ARCHIVE_AFTER_DAYS, минимум {MIN_DAYS})")
+    ap.add_argument("--chunk", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    import app.models.auth  # noqa: F401  (tenants — для FK)
+    TransactionArchive.__table__.create(bind=engine, checkfirst=True)
+    CustomerStats.__table__.create(bind=engine, checkfirst=True)
+    moved = sum(archive_transactions(db, args.days, args.chunk) for db in shard_sessions())
+    print(f"moved: {moved}")
+
+
+if __name__ == "__main__":
+    main()
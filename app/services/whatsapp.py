@@ -13,14 +13,24 @@ GreenAPI WhatsApp клиент.
 """
 from __future__ import annotations
 
+import asyncio
 import httpx
 import logging
-from typing import Optional
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Optional
 
+from starlette.concurrency import run_in_threadpool
+
+from app.core.circuit_breaker import CircuitOpenError, get_breaker
 from app.core.config import settings
+from app.core.phone import normalize_phone
 
 logger = logging.getLogger(__name__)
 
+CIRCUIT_OPEN_ERROR = "GreenAPI временно недоступен (circuit open)"
+
 
 def _is_configured() -> bool:
     return bool(settings.GREENAPI_INSTANCE_ID and settings.GREENAPI_API_TOKEN)
@@ -30,21 +40,43 @@ def _base(instance_id: str, token: str) -> str:
     return f"{settings.GREENAPI_BASE_URL}/waInstance{instance_id}/{{}}/{token}"
 
 
-def normalize_phone(phone: str) -> str:
-    """Приводим к формату 77001234567 (без +, без скобок)."""
-    p = "".join(c for c in str(phone or "") if c.isdigit())
-    if p.startswith("8") and len(p) == 11:
-        p = "7" + p[1:]
-    if len(p) == 10:
-        p = "7" + p
-    return p
-
-
 def to_chat_id(phone: str) -> str:
     """GreenAPI ожидает формат: 77001234567@c.us"""
     return normalize_phone(phone) + "@c.us"
 
 
+# ── HTTP через circuit breaker ────────────────────────────────
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        float(settings.GREENAPI_TIMEOUT_S),
+        connect=float(settings.GREENAPI_CONNECT_TIMEOUT_S),
+    )
+
+
+def _request(method: str, url: str, client: Optional[httpx.Client] = None, **kwargs) -> httpx.Response:
+    """
+    Запрос к GreenAPI через breaker "greenapi". Пока цепь разомкнута —
+    CircuitOpenError без похода в сеть. Сбой — сеть/таймаут, 429 и 5xx.
+    """
+    breaker = get_breaker("greenapi")
+    breaker.check()
+    kwargs.setdefault("timeout", _timeout())
+    try:
+        r = (client or httpx).request(method, url, **kwargs)
+    except httpx.TransportError as e:
+        breaker.record_failure(e)
+        raise
+    except BaseException:
+        # прочие исключения (кривой URL, прерывание) — освободить пробу half-open
+        breaker.record_cancelled()
+        raise
+    if r.status_code >= 500 or r.status_code == 429:
+        breaker.record_failure(f"HTTP {r.status_code}")
+    else:
+        breaker.record_success()
+    return r
+
+
 # ── Status ────────────────────────────────────────────────────
 def get_status() -> dict:
     """Проверяет состояние инстанса GreenAPI."""
@@ -56,7 +88,7 @@ def get_status() -> dict:
     url   = f"{settings.GREENAPI_BASE_URL}/waInstance{iid}/getStateInstance/{token}"
 
     try:
-        r = httpx.get(url, timeout=10)
+        r = _request("GET", url, timeout=httpx.Timeout(10, connect=float(settings.GREENAPI_CONNECT_TIMEOUT_S)))
         data = r.json()
         state = data.get("stateInstance", "unknown")
         return {
@@ -65,11 +97,61 @@ def get_status() -> dict:
             "raw":       data,
             "instance":  iid,
         }
+    except CircuitOpenError:
+        return {"ok": False, "error": CIRCUIT_OPEN_ERROR, "circuit_open": True, "instance": iid}
     except Exception as e:
         logger.error(f"GreenAPI status error: {e}")
         return {"ok": False, "error": str(e)}
 
 
+# ── Status cache ──────────────────────────────────────────────
+# Админка опрашивает статус постоянно; getStateInstance идёт в сеть (до 10 с).
+# Ответ держим в памяти, фон обновляет его каждые WA_STATUS_REFRESH_S,
+# пока статус кто-то запрашивает (последние WA_STATUS_IDLE_S).
+_status_lock = threading.Lock()
+_status_data: Optional[dict] = None
+_status_at = 0.0          # time.monotonic() последнего обновления
+_status_accessed = 0.0    # time.monotonic() последнего запроса
+
+
+def refresh_status() -> dict:
+    """Запросить статус у GreenAPI и положить в кэш (параллельные вызовы — один запрос)."""
+    global _status_data, _status_at
+    started = time.monotonic()
+    with _status_lock:
+        if _status_data is not None and _status_at >= started:
+            return _status_data  # пока ждали, обновил другой поток
+        data = get_status()
+        data["checked_at"] = datetime.utcnow().isoformat()
+        _status_data, _status_at = data, time.monotonic()
+        return data
+
+
+def cached_status() -> Optional[dict]:
+    """Статус из кэша, если он свежее WA_STATUS_TTL_S; иначе None."""
+    global _status_accessed
+    now = time.monotonic()
+    _status_accessed = now
+    if _status_data is None or now - _status_at > float(settings.WA_STATUS_TTL_S):
+        return None
+    return {**_status_data, "cached": True, "age_s": round(now - _status_at, 1)}
+
+
+async def status_refresher_loop() -> None:
+    """Фоновое обновление статуса (запускается на startup)."""
+    interval = max(1.0, float(settings.WA_STATUS_REFRESH_S))
+    while True:
+        await asyncio.sleep(interval)
+        if not _is_configured():
+            continue
+        if time.monotonic() - _status_accessed > float(settings.WA_STATUS_IDLE_S):
+            continue  # страницу никто не смотрит — не дёргаем GreenAPI
+        try:
+            await run_in_threadpool(refresh_status)
+        except Exception as e:
+            logger.error(f"GreenAPI status refresh error: {e}")
+
+
 # ── Send single message ───────────────────────────────────────
 def send_message(phone: str, text: str) -> dict:
     """Отправляет текстовое сообщение одному клиенту."""
@@ -83,16 +165,57 @@ def send_message(phone: str, text: str) -> dict:
     chat_id = to_chat_id(phone)
 
     try:
-        r = httpx.post(url, json={"chatId": chat_id, "message": text}, timeout=15)
+        r = _request("POST", url, json={"chatId": chat_id, "message": text})
         data = r.json()
         if r.status_code == 200 and data.get("idMessage"):
             return {"ok": True, "message_id": data["idMessage"], "chat_id": chat_id}
         return {"ok": False, "error": data.get("message") or str(data), "status": r.status_code}
+    except CircuitOpenError:
+        return {"ok": False, "error": CIRCUIT_OPEN_ERROR, "circuit_open": True}
     except Exception as e:
         logger.error(f"GreenAPI send error to {phone}: {e}")
         return {"ok": False, "error": str(e)}
 
 
+# ── Check number ──────────────────────────────────────────────
+def check_whatsapp(
+    phone: str,
+    client: Optional[httpx.Client] = None,
+    timeout: Optional[float] = None,
+) -> Optional[bool]:
+    """
+    Есть ли у номера WhatsApp (checkWhatsapp).
+    None — если проверить не удалось (не настроен / ошибка сети).
+    timeout — потолок на запрос, сек (по умолчанию GREENAPI_TIMEOUT_S).
+    """
+    if not _is_configured():
+        return None
+
+    iid   = settings.GREENAPI_INSTANCE_ID
+    token = settings.GREENAPI_API_TOKEN
+    url   = f"{settings.GREENAPI_BASE_URL}/waInstance{iid}/checkWhatsapp/{token}"
+
+    p = normalize_phone(phone)
+    if not p:
+        return None
+
+    try:
+        body = {"phoneNumber": int(p)}
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=min(timeout, float(settings.GREENAPI_CONNECT_TIMEOUT_S)))
+        r = _request("POST", url, client=client, json=body, **kwargs)
+        data = r.json()
+        if r.status_code == 200 and "existsWhatsapp" in data:
+            return bool(data["existsWhatsapp"])
+        return None
+    except CircuitOpenError:
+        return None
+    except Exception as e:
+        logger.error(f"GreenAPI checkWhatsapp error for {phone}: {e}")
+        return None
+
+
 # ── Render template ───────────────────────────────────────────
 def render_template(template: str, variables: dict) -> str:
     """Подставляет переменные в шаблон сообщения."""
@@ -104,23 +227,27 @@ def render_template(template: str, variables: dict) -> str:
 
 
 # ── Send campaign ─────────────────────────────────────────────
-def send_campaign_messages(
-    recipients: list[dict],   # [{"phone": "...", "name": "...", "bonus": 0, ...}]
+def iter_campaign_messages(
+    recipients: Iterable[dict],   # [{"phone": "...", "name": "...", "bonus": 0, ...}]
     template: str,
     dry_run: bool = False,
-) -> dict:
+    on_sent: Optional[Callable[[dict], None]] = None,
+) -> Iterator[dict]:
     """
-    Массовая рассылка по списку получателей.
-    Возвращает статистику: sent, failed, skipped.
+    Построчная рассылка: одно событие на каждого получателя.
+    Ничего не накапливает — годится для стриминга (NDJSON) больших кампаний.
+    Поле status: sent / failed / skipped.
+    on_sent — вызывается после реальной отправки ({"phone", "message_id"}).
     """
-    sent    = []
-    failed  = []
-    skipped = []
-
     for rec in recipients:
         phone = rec.get("phone") or rec.get("user_phone") or ""
         if not phone:
-            skipped.append({"phone": "?", "reason": "no phone"})
+            yield {"status": "skipped", "phone": "?", "reason": "no phone"}
+            continue
+
+        # Заранее известно, что WhatsApp у номера нет (кэш checkWhatsapp)
+        if rec.get("has_whatsapp") is False:
+            yield {"status": "skipped", "phone": phone, "reason": "no whatsapp"}
             continue
 
         name  = rec.get("name") or rec.get("full_name") or "Клиент"
@@ -134,20 +261,43 @@ def send_campaign_messages(
         })
 
         if dry_run:
-            sent.append({"phone": phone, "text": text, "dry_run": True})
+            yield {"status": "sent", "phone": phone, "text": text, "dry_run": True}
             continue
 
         result = send_message(phone, text)
         if result["ok"]:
-            sent.append({"phone": phone, "message_id": result.get("message_id")})
+            if on_sent:
+                on_sent({"phone": phone, "message_id": result.get("message_id")})
+            yield {"status": "sent", "phone": phone, "message_id": result.get("message_id")}
+        elif result.get("circuit_open"):
+            # Провайдер лежит: остальные получатели тоже отвалятся сразу,
+            # без ожидания таймаута на каждом
+            yield {"status": "failed", "phone": phone, "error": result["error"], "reason": "provider unavailable"}
         else:
-            failed.append({"phone": phone, "error": result.get("error")})
+            yield {"status": "failed", "phone": phone, "error": result.get("error")}
+
+
+def send_campaign_messages(
+    recipients: list[dict],   # [{"phone": "...", "name": "...", "bonus": 0, ...}]
+    template: str,
+    dry_run: bool = False,
+    on_sent: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Массовая рассылка по списку получателей.
+    Возвращает статистику: sent, failed, skipped.
+    """
+    details: dict[str, list[dict]] = {"sent": [], "failed": [], "skipped": []}
+
+    for ev in iter_campaign_messages(recipients, template, dry_run=dry_run, on_sent=on_sent):
+        status = ev.pop("status")
+        details[status].append(ev)
 
     return {
         "total":    len(recipients),
-        "sent":     len(sent),
-        "failed":   len(failed),
-        "skipped":  len(skipped),
-        "details":  {"sent": sent, "failed": failed, "skipped": skipped},
+        "sent":     len(details["sent"]),
+        "failed":   len(details["failed"]),
+        "skipped":  len(details["skipped"]),
+        "details":  details,
         "dry_run":  dry_run,
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,134 @@
+# app/services/whatsapp_numbers.py
+"""
+Кэш «есть ли WhatsApp у номера».
+
+Перед рассылкой номера кампании проверяются пачкой: один SELECT по кэшу,
+checkWhatsapp — только для неизвестных и протухших (старше
+WA_NUMBER_CACHE_TTL_DAYS). Номера без WhatsApp пропускаются без отправки.
+
+Проверки идут параллельно (WA_NUMBER_CHECK_CONCURRENCY) и укладываются в
+WA_NUMBER_CHECK_BUDGET_S на пачку: на холодном кэше большая кампания не
+ждёт минутами. Не проверенные за бюджет номера получают None и
+отправляются как обычно; проверятся в следующий раз.
+"""
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+import httpx
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.circuit_breaker import Deadline
+from app.core.config import settings
+from app.models.whatsapp_number import WhatsappNumber
+from app.services.whatsapp import check_whatsapp, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+_CHUNK = 500
+
+
+def _ttl() -> timedelta:
+    return timedelta(days=max(1, int(settings.WA_NUMBER_CACHE_TTL_DAYS or 14)))
+
+
+def get_cached_presence(db: Session, phones: list[str], now: Optional[datetime] = None) -> dict[str, bool]:
+    """Свежие записи кэша: {phone: has_whatsapp}. Протухшие не возвращаются."""
+    now = now or datetime.utcnow()
+    since = now - _ttl()
+    t = WhatsappNumber.__table__
+
+    out: dict[str, bool] = {}
+    for i in range(0, len(phones), _CHUNK):
+        chunk = phones[i:i + _CHUNK]
+        rows = db.execute(
+            select(t.c.phone, t.c.has_whatsapp).where(
+                t.c.phone.in_(chunk),
+                t.c.checked_at >= since,
+            )
+        ).all()
+        out.update({p: bool(h) for p, h in rows})
+    return out
+
+
+def save_presence(db: Session, results: dict[str, bool], now: Optional[datetime] = None) -> None:
+    """Upsert результатов проверки (delete + insert — одинаково для SQLite/Postgres)."""
+    if not results:
+        return
+    now = now or datetime.utcnow()
+    t = WhatsappNumber.__table__
+
+    items = list(results.items())
+    for i in range(0, len(items), _CHUNK):
+        chunk = items[i:i + _CHUNK]
+        db.execute(delete(t).where(t.c.phone.in_([p for p, _ in chunk])))
+        db.execute(insert(t), [{"phone": p, "has_whatsapp": h, "checked_at": now} for p, h in chunk])
+    db.commit()
+
+
+def check_numbers(
+    phones: list[str],
+    budget_s: Optional[float] = None,
+    concurrency: Optional[int] = None,
+) -> dict[str, bool]:
+    """checkWhatsapp для phones параллельно, в пределах бюджета; {phone: есть ли WhatsApp}."""
+    deadline = Deadline(settings.WA_NUMBER_CHECK_BUDGET_S if budget_s is None else budget_s)
+    workers = max(1, int(concurrency or settings.WA_NUMBER_CHECK_CONCURRENCY))
+    cap = float(settings.GREENAPI_TIMEOUT_S)
+
+    def one(p: str) -> Optional[bool]:
+        left = deadline.remaining()
+        if left <= 0.05:
+            return None  # бюджет кончился — без проверки
+        return check_whatsapp(p, client=client, timeout=min(left, cap))
+
+    # Один клиент (keep-alive) на все потоки; запросы ограничены остатком
+    # бюджета, поэтому выход из with ждёт не дольше него
+    with httpx.Client() as client, ThreadPoolExecutor(max_workers=min(workers, len(phones) or 1)) as pool:
+        results = list(pool.map(one, phones))
+
+    checked = {p: res for p, res in zip(phones, results) if res is not None}
+    if len(checked) < len(phones):
+        logger.info(f"WhatsApp number check: {len(checked)}/{len(phones)} checked within budget")
+    return checked
+
+
+def prefetch_presence(
+    db: Session,
+    phones: Iterable[str],
+    check_missing: bool = True,
+) -> dict[str, Optional[bool]]:
+    """
+    {нормализованный phone: True/False/None} для списка получателей.
+    check_missing=False — только кэш, без запросов в GreenAPI (dry run).
+    """
+    uniq = list(dict.fromkeys(p for p in (normalize_phone(x) for x in phones) if p))
+    known: dict[str, Optional[bool]] = dict(get_cached_presence(db, uniq))
+
+    missing = [p for p in uniq if p not in known]
+    if missing and check_missing:
+        checked = check_numbers(missing)
+        try:
+            save_presence(db, checked)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"WhatsApp number cache save error: {e}")
+        known.update(checked)
+
+    for p in missing:
+        known.setdefault(p, None)
+    return known
+
+
+def annotate_recipients(db: Session, recipients: list[dict], check_missing: bool = True) -> list[dict]:
+    """Проставляет has_whatsapp каждому получателю (по кэшу + проверке неизвестных)."""
+    presence = prefetch_presence(
+        db, (r.get("phone") or "" for r in recipients), check_missing=check_missing,
+    )
+    for r in recipients:
+        r["has_whatsapp"] = presence.get(normalize_phone(r.get("phone") or ""))
+    return recipients
@@ -0,0 +1,316 @@
+# app/services/whatsapp_status.py
+"""
+Статусы доставки WhatsApp (GreenAPI → вебхук outgoingMessageStatus).
+
+Вебхук не ходит в БД: события копятся в памяти и сбрасываются пачкой
+(UPDATE ... WHERE provider_message_id = :mid, executemany) каждые
+WA_STATUS_FLUSH_EVERY событий или WA_STATUS_FLUSH_MS миллисекунд.
+
+Статус, для которого нет записи об отправке (insert ещё не дошёл или
+сообщение отправлено не нами), откладывается в отдельную карту: она не
+запускает сброс, перепроверяется один раз через UNMATCHED_RETRY_S и при
+повторном промахе отбрасывается. Обе карты ограничены WA_STATUS_BUFFER_MAX.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import bindparam, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.whatsapp_message import WhatsappMessage
+
+logger = logging.getLogger(__name__)
+
+# Статус может только «расти»: sent → delivered → read
+STATUS_RANK = {"sent": 1, "failed": 2, "delivered": 3, "read": 4}
+
+# Статусы GreenAPI, которые считаем недоставкой
+_FAILED_STATUSES = {"failed", "noAccount", "notInGroup", "yellowCard"}
+
+# Через сколько перепроверить статус без записи об отправке (гонка с insert SentLog)
+UNMATCHED_RETRY_S = 30
+
+
+def _map_status(raw: str) -> Optional[str]:
+    s = str(raw or "").strip()
+    if s in _FAILED_STATUSES:
+        return "failed"
+    if s in STATUS_RANK:
+        return s
+    return None
+
+
+def _parse_ts(v: Any) -> datetime:
+    try:
+        return datetime.utcfromtimestamp(int(v))
+    except Exception:
+        return datetime.utcnow()
+
+
+# ── Запись отправленных ──────────────────────────────────────
+def record_sent_messages(db: Session, campaign_id: Optional[int], items: list[dict]) -> int:
+    """Bulk insert отправленных сообщений: [{"phone": ..., "message_id": ...}]."""
+    rows = [
+        {
+            "campaign_id":         campaign_id,
+            "phone":               str(it.get("phone") or ""),
+            "provider_message_id": str(it["message_id"]),
+            "status":              "sent",
+            "created_at":          datetime.utcnow(),
+        }
+        for it in items
+        if it.get("message_id")
+    ]
+    if not rows:
+        return 0
+    db.execute(insert(WhatsappMessage.__table__), rows)
+    db.commit()
+    return len(rows)
+
+
+class SentLog:
+    """Копит отправленные сообщения и пишет их в БД порциями."""
+
+    def __init__(self, db: Session, campaign_id: Optional[int], chunk: int = 20):
+        self.db = db
+        self.campaign_id = campaign_id
+        self.chunk = chunk
+        self._items: list[dict] = []
+
+    def add(self, item: dict) -> None:
+        self._items.append(item)
+        if len(self._items) >= self.chunk:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._items:
+            return
+        items, self._items = self._items, []
+        try:
+            record_sent_messages(self.db, self.campaign_id, items)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"WhatsApp sent-log insert error: {e}")
+
+
+# ── Буфер статусов ───────────────────────────────────────────
+_Entry = tuple[str, datetime, datetime]  # (status, at, first_seen)
+
+
+class StatusBuffer:
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.max_size = int(max_size or settings.WA_STATUS_BUFFER_MAX)
+        # provider_message_id -> (status, at, first_seen)
+        self._pending: dict[str, _Entry] = {}
+        # промахнулись мимо whatsapp_messages один раз — ждут перепроверки
+        self._unmatched: dict[str, _Entry] = {}
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        """Только свежие события — по ним решается внеочередной сброс."""
+        return len(self._pending)
+
+    @property
+    def unmatched(self) -> int:
+        return len(self._unmatched)
+
+    @staticmethod
+    def _put(target: dict[str, _Entry], mid: str, status: str, at: datetime, first_seen: datetime) -> None:
+        cur = target.get(mid)
+        if cur and STATUS_RANK[cur[0]] >= STATUS_RANK[status]:
+            return
+        target[mid] = (status, at, cur[2] if cur else first_seen)
+
+    def add(self, mid: str, status: str, at: datetime) -> bool:
+        with self._lock:
+            if mid in self._unmatched:
+                self._put(self._unmatched, mid, status, at, datetime.utcnow())
+                return True
+            if mid not in self._pending and len(self._pending) >= self.max_size:
+                self.dropped += 1
+                return False
+            self._put(self._pending, mid, status, at, datetime.utcnow())
+            return True
+
+    def add_notification(self, body: dict) -> bool:
+        """Принимает тело вебхука GreenAPI. True — если событие взято в буфер."""
+        if not isinstance(body, dict) or body.get("typeWebhook") != "outgoingMessageStatus":
+            return False
+        mid = str(body.get("idMessage") or "").strip()
+        status = _map_status(body.get("status"))
+        if not mid or not status:
+            return False
+        return self.add(mid, status, _parse_ts(body.get("timestamp")))
+
+    def has_work(self, now: Optional[datetime] = None) -> bool:
+        """Есть что сбрасывать по таймеру: свежие события или созревшие перепроверки."""
+        with self._lock:
+            if self._pending:
+                return True
+            return any(self._due(e, now or datetime.utcnow()) for e in self._unmatched.values())
+
+    @staticmethod
+    def _due(entry: _Entry, now: datetime) -> bool:
+        return (now - entry[2]).total_seconds() >= UNMATCHED_RETRY_S
+
+    def _drain(self, now: datetime) -> tuple[dict[str, _Entry], dict[str, _Entry]]:
+        with self._lock:
+            fresh, self._pending = self._pending, {}
+            retry = {mid: e for mid, e in self._unmatched.items() if self._due(e, now)}
+            for mid in retry:
+                del self._unmatched[mid]
+        return fresh, retry
+
+    def flush(self, now: Optional[datetime] = None) -> int:
+        """Сбрасывает буфер в БД. Возвращает число применённых статусов."""
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # уже идёт сброс
+        try:
+            now = now or datetime.utcnow()
+            fresh, retry = self._drain(now)
+            if not fresh and not retry:
+                return 0
+
+            db = SessionLocal()
+            try:
+                applied, missed = _apply_statuses(db, {**retry, **fresh})
+                db.commit()
+            except Exception:
+                db.rollback()
+                # Не теряем события — вернём в буфер до следующей попытки
+                with self._lock:
+                    for mid, (status, at, first_seen) in fresh.items():
+                        self._put(self._pending, mid, status, at, first_seen)
+                    for mid, (status, at, first_seen) in retry.items():
+                        self._put(self._unmatched, mid, status, at, first_seen)
+                raise
+            finally:
+                db.close()
+
+            with self._lock:
+                for mid in missed:
+                    if mid in retry:
+                        self.dropped += 1  # второй промах — сообщение не наше
+                    elif len(self._unmatched) < self.max_size:
+                        status, at, first_seen = fresh[mid]
+                        self._put(self._unmatched, mid, status, at, first_seen)
+                    else:
+                        self.dropped += 1
+            return applied
+        finally:
+            self._flush_lock.release()
+
+
+def _update_stmt(status: str):
+    t = WhatsappMessage.__table__
+    lower = [s for s, r in STATUS_RANK.items() if r < STATUS_RANK[status]]
+    at = bindparam("at")
+
+    values: dict[str, Any] = {"status": status, "status_updated_at": at}
+    if status in ("delivered", "read"):
+        values["delivered_at"] = func.coalesce(t.c.delivered_at, at)
+    if status == "read":
+        values["read_at"] = at
+
+    # or_ вместо in_: expanding-параметры несовместимы с executemany
+    return (
+        update(t)
+        .where(t.c.provider_message_id == bindparam("mid"), or_(*(t.c.status == s for s in lower)))
+        .values(**values)
+    )
+
+
+def _apply_statuses(db: Session, batch: dict[str, _Entry]) -> tuple[int, list[str]]:
+    """Применяет статусы к записанным сообщениям; возвращает (применено, id без записи)."""
+    t = WhatsappMessage.__table__
+    ids = list(batch.keys())
+
+    # Какие сообщения уже записаны (insert об отправке мог ещё не дойти)
+    known: set[str] = set()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        known.update(
+            db.execute(select(t.c.provider_message_id).where(t.c.provider_message_id.in_(chunk))).scalars()
+        )
+
+    by_status: dict[str, list[dict]] = defaultdict(list)
+    missed: list[str] = []
+    for mid, (status, at, _first_seen) in batch.items():
+        if mid in known:
+            by_status[status].append({"mid": mid, "at": at})
+        else:
+            missed.append(mid)
+
+    applied = 0
+    for status, params in by_status.items():
+        db.execute(_update_stmt(status), params)
+        applied += len(params)
+    return applied, missed
+
+
+_buffer = StatusBuffer()
+_bg_tasks: set[asyncio.Task] = set()
+
+
+def get_status_buffer() -> StatusBuffer:
+    return _buffer
+
+
+async def flush_status_buffer() -> int:
+    try:
+        return await run_in_threadpool(_buffer.flush)
+    except Exception as e:
+        logger.error(f"WhatsApp status flush error: {e}")
+        return 0
+
+
+def schedule_flush() -> None:
+    """Внеочередной сброс (буфер переполнен) — не задерживает ответ вебхуку."""
+    task = asyncio.get_running_loop().create_task(flush_status_buffer())
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+
+
+async def status_flusher_loop() -> None:
+    """Фоновый сброс по таймеру (запускается на startup)."""
+    interval = max(0.05, int(settings.WA_STATUS_FLUSH_MS) / 1000)
+    while True:
+        await asyncio.sleep(interval)
+        if _buffer.has_work():
+            await flush_status_buffer()
+
+
+# ── Статистика доставки по кампании ──────────────────────────
+def campaign_delivery_stats(db: Session, campaign_id: int) -> dict:
+    rows = (
+        db.query(WhatsappMessage.status, func.count(WhatsappMessage.id))
+        .filter(WhatsappMessage.campaign_id == campaign_id)
+        .group_by(WhatsappMessage.status)
+        .all()
+    )
+    by_status = {str(s): int(n) for s, n in rows}
+
+    total = sum(by_status.values())
+    read = by_status.get("read", 0)
+    delivered = by_status.get("delivered", 0) + read
+
+    return {
+        "messages":      total,
+        "pending":       by_status.get("sent", 0),
+        "delivered":     delivered,
+        "read":          read,
+        "failed":        by_status.get("failed", 0),
+        "delivery_rate": round(delivered / total, 4) if total else 0.0,
+        "read_rate":     round(read / total, 4) if total else 0.0,
+    }
@@ -80,10 +80,15 @@ def login_post(
     db = SessionLocal()
     try:
         phone_n = normalize_phone(phone)
+        # Аккаунты, заведённые до app.core.phone, с 10 / 12+ цифрами
+        # хранятся без приведения — ищем и в старом виде
+        legacy = "".join(ch for ch in (phone or "") if ch.isdigit())
+        if len(legacy) == 11 and legacy.startswith("8"):
+            legacy = "7" + legacy[1:]
 
         user: AuthUser | None = (
             db.query(AuthUser)
-            .filter(AuthUser.phone == phone_n)
+            .filter(AuthUser.phone.in_([phone_n, legacy]))
             .first()
         )
 
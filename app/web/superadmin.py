@@ -9,15 +9,17 @@ from __future__ import annotations
 import os
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Optional
 
 from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy import func, select
 
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, shard_tenant_ids, shards_enabled, tenant_session
 from app.core.security import normalize_phone, hash_password
 from app.models.auth import Tenant, AuthUser
+from app.models.customer_stats import CustomerStats
 from app.models.user import User
 from app.models.transaction import Transaction
 
@@ -44,7 +46,26 @@ def _require_auth(request: Request):
     return None
 
 # ── Статистика по tenant ──────────────────────────────────────
-def _tenant_stats(db, tenant_id: int) -> dict:
+_ZERO_STATS = {"users_count": 0, "txn_count": 0, "revenue_30d": 0, "txn_30d": 0}
+
+
+def _tenant_stats(db, tenant_id: int, shard_ids: Optional[set[int]] = None) -> dict:
+    # Клиенты и транзакции — из шарда тенанта при DB_SHARDING. Файла ещё нет —
+    # данных нет: нули, без создания шарда и engine ради просмотра дашборда
+    if shards_enabled():
+        if shard_ids is None:
+            shard_ids = set(shard_tenant_ids())
+        if tenant_id not in shard_ids:
+            return _ZERO_STATS | _owner_info(db, tenant_id)
+    sdb = tenant_session(tenant_id) if shards_enabled() else db
+    try:
+        return _shard_stats(sdb, tenant_id) | _owner_info(db, tenant_id)
+    finally:
+        if sdb is not db:
+            sdb.close()
+
+
+def _shard_stats(db, tenant_id: int) -> dict:
     now = datetime.utcnow()
     d30 = now - timedelta(days=30)
 
@@ -52,9 +73,12 @@ def _tenant_stats(db, tenant_id: int) -> dict:
         select(func.count(User.id)).where(User.tenant_id == tenant_id)
     ) or 0
 
-    txn_count = db.scalar(
+    # за всю историю: живые строки + перенесённые архиватором (customer_stats)
+    txn_count = (db.scalar(
         select(func.count(Transaction.id)).where(Transaction.tenant_id == tenant_id)
-    ) or 0
+    ) or 0) + (db.scalar(
+        select(func.coalesce(func.sum(CustomerStats.tx_count), 0)).where(CustomerStats.tenant_id == tenant_id)
+    ) or 0)
 
     revenue_30d = db.scalar(
         select(func.coalesce(func.sum(Transaction.paid_amount), 0)).where(
@@ -71,18 +95,22 @@ def _tenant_stats(db, tenant_id: int) -> dict:
         )
     ) or 0
 
+    return {
+        "users_count": users_count,
+        "txn_count": txn_count,
+        "revenue_30d": revenue_30d,
+        "txn_30d": txn_30d,
+    }
+
+
+def _owner_info(db, tenant_id: int) -> dict:
     owner = db.scalar(
         select(AuthUser).where(
             AuthUser.tenant_id == tenant_id,
             AuthUser.role == "owner",
         )
     )
-
     return {
-        "users_count": users_count,
-        "txn_count": txn_count,
-        "revenue_30d": revenue_30d,
-        "txn_30d": txn_30d,
         "owner_phone": owner.phone if owner else "—",
         "owner_name": owner.name if owner else "—",
     }
@@ -145,9 +173,10 @@ def sa_dashboard(request: Request):
         tenants = db.query(Tenant).order_by(Tenant.id.desc()).all()
         now = datetime.utcnow()
 
+        shard_ids = set(shard_tenant_ids()) if shards_enabled() else None
         rows = []
         for t in tenants:
-            stats = _tenant_stats(db, t.id)
+            stats = _tenant_stats(db, t.id, shard_ids)
             auth_users = db.scalar(
                 select(func.count(AuthUser.id)).where(AuthUser.tenant_id == t.id)
             ) or 0
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Импорт клиентов (app.services.client_import) на большом CSV.
+
+  python bench_client_import.py                  # 1 000 000 строк
+  python bench_client_import.py --rows 200000 --chunk 10000
+  python bench_client_import.py --rows 300000 --heap   # + пик памяти (медленнее в ~3 раза)
+
+Пишет временный CSV (телефоны в разных форматах, ~1% мусора), печатает:
+- normalize_phone по строке против normalize_phones пачкой;
+- импорт: rows/s, вставлено / отклонено; с --heap — пик Python-кучи
+  (tracemalloc; не должен зависеть от числа строк — страницы SQLite
+  ограничены DB_SQLITE_CACHE_SIZE_KB / DB_SQLITE_MMAP_SIZE и сюда не входят);
+- повторный импорт того же файла (все строки — существующие клиенты);
+- старый путь для сравнения: SELECT + INSERT + commit на клиента (POST /api/users).
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, ".")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+from app.core.database import Base, SessionLocal, engine
+from app.core.phone import normalize_phone, normalize_phones
+from app.models.auth import Tenant
+from app.models.user import User
+from app.services.client_import import import_clients, read_rows
+
+TENANT = 1
+FORMATS = ("7{}", "8{}", "+7 ({}) {}-{}-{}", "8 {} {} {} {}", "{}")
+
+
+def _phone(rnd: random.Random, i: int) -> str:
+    if i % 100 == 99:
+        return "n/a"
+    d = f"70{i:08d}"  # 10 цифр без кода страны
+    fmt = FORMATS[i % len(FORMATS)]
+    if "(" in fmt or " " in fmt:
+        return fmt.format(d[:3], d[3:6], d[6:8], d[8:])
+    return fmt.format(d)
+
+
+def _write_csv(path: str, rows: int) -> None:
+    rnd = random.Random(1)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(["Телефон", "ФИО", "Дата рождения", "Уровень"])
+        for i in range(rows):
+            w.writerow([
+                _phone(rnd, i), f"Клиент {i}",
+                f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.{rnd.randint(1960, 2005)}" if i % 3 == 0 else "",
+                "",
+            ])
+
+
+def _import(path: str, chunk: int) -> dict:
+    with open(path, "rb") as f, SessionLocal() as db:
+        return import_clients(db, TENANT, read_rows(path, f), chunk)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--chunk", type=int, default=None)
+    ap.add_argument("--legacy-rows", type=int, default=2000)
+    ap.add_argument("--heap", action="store_true", help="пик памяти через tracemalloc")
+    args = ap.parse_args()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(Tenant(id=TENANT, name="Bench"))
+        db.commit()
+
+    path = os.path.join(tempfile.mkdtemp(), "clients.csv")
+    _write_csv(path, args.rows)
+    print(f"rows={args.rows} csv={os.path.getsize(path) / 1e6:.0f} MB")
+
+    sample = [_phone(random.Random(1), i) for i in range(200_000)]
+    t = time.perf_counter()
+    one = [normalize_phone(p) for p in sample]
+    per_row = time.perf_counter() - t
+    t = time.perf_counter()
+    batch = normalize_phones(sample)
+    batched = time.perf_counter() - t
+    assert one == batch
+    print(f"normalize 200k: per row {per_row * 1000:.0f} ms, batch {batched * 1000:.0f} ms")
+
+    for label in ("import", "re-import"):
+        if args.heap:
+            tracemalloc.start()
+        r = _import(path, args.chunk)
+        heap = ""
+        if args.heap:
+            heap = f"  peak heap {tracemalloc.get_traced_memory()[1] / 1e6:.1f} MB"
+            tracemalloc.stop()
+        print(
+            f"{label:9s} {r['rows_per_s']:7d} rows/s  {r['elapsed_s']:6.1f} s  "
+            f"+{r['inserted']} ~{r['updated']} rejected {r['rejected']}{heap}"
+        )
+
+    # Старый путь: клиент на запрос — SELECT дубля, INSERT, commit
+    n = args.legacy_rows
+    t = time.perf_counter()
+    with SessionLocal() as db:
+        for i in range(n):
+            phone = normalize_phone(f"60{i:08d}")
+            if db.query(User).filter(User.tenant_id == TENANT, User.phone == phone).first():
+                continue
+            db.add(User(tenant_id=TENANT, phone=phone, full_name=f"Legacy {i}", tier="Bronze", bonus_balance=0))
+            db.commit()
+    print(f"per-request create ({n} rows): {int(n / (time.perf_counter() - t))} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+Конкурентная запись: умолчания SQLAlchemy/SQLite против профиля БД
+(app.core.database.make_engine: WAL, synchronous=NORMAL, busy_timeout, пул).
+
+  python bench_db_writes.py                         # временные SQLite-файлы
+  python bench_db_writes.py --threads 32 --ops 200
+  python bench_db_writes.py --url postgresql://...  # серверная БД (таблицы создаются)
+  python bench_db_writes.py --tenants 8             # один файл против шарда на тенанта (DB_SHARDING)
+
+Каждый поток в цикле делает «покупку» (INSERT транзакции + UPDATE баланса
+клиента в одной транзакции), параллельно идут чтения истории. Печатает
+коммиты/с, p95 и сколько операций упало (database is locked, таймаут пула).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, ".")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_main.db')}")
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+from app.core import database
+from app.core.config import settings
+from app.core.database import Base, make_engine, pool_stats
+from app.models.auth import Tenant
+from app.models.transaction import Transaction
+from app.models.user import User
+
+CLIENTS = 50
+
+
+def _seed(Session, tenant_id: int) -> list[int]:
+    with Session() as db:
+        db.add_all([
+            User(tenant_id=tenant_id, phone=f"77{tenant_id:02d}{i:07d}", full_name="", bonus_balance=0)
+            for i in range(CLIENTS)
+        ])
+        db.commit()
+        return [u for (u,) in db.execute(select(User.id).where(User.tenant_id == tenant_id))]
+
+
+def _prepare(url: str, tuned: bool, tenants: int = 1):
+    """Один файл на всех тенантов: Session(n) — общая фабрика сессий."""
+    eng = make_engine(url, tuned=tuned)
+    Base.metadata.drop_all(bind=eng)
+    Base.metadata.create_all(bind=eng)
+    Session = sessionmaker(bind=eng, autoflush=False)
+    with Session() as db:
+        db.add_all([Tenant(id=t, name=f"Bench {t}") for t in range(1, tenants + 1)])
+        db.commit()
+    ids = {t: _seed(Session, t) for t in range(1, tenants + 1)}
+    return eng, (lambda t: Session()), ids
+
+
+def _prepare_sharded(tenants: int):
+    """DB_SHARDING: каждый тенант пишет в свой файл через tenant_session."""
+    settings.DB_SHARDING = True
+    settings.DB_SHARD_DIR = tempfile.mkdtemp()
+    ids = {t: _seed(lambda: database.tenant_session(t), t) for t in range(1, tenants + 1)}
+    return database.shard_engine(1), database.tenant_session, ids
+
+
+def run(prepared, threads: int, ops: int) -> dict:
+    eng, session_for, ids_by_tenant = prepared
+    tenants = sorted(ids_by_tenant)
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    lock = threading.Lock()
+
+    def writer(n: int) -> None:
+        tid = tenants[n % len(tenants)]
+        ids = ids_by_tenant[tid]
+        for i in range(ops):
+            uid = ids[(n * ops + i) % len(ids)]
+            t = time.perf_counter()
+            try:
+                with session_for(tid) as db:
+                    db.add(Transaction(tenant_id=tid, user_id=uid, amount=1000, paid_amount=1000, comment=""))
+                    db.execute(update(User).where(User.id == uid).values(bonus_balance=User.bonus_balance + 30))
+                    db.commit()
+                with lock:
+                    latencies.append(time.perf_counter() - t)
+            except Exception as e:
+                key = type(e).__name__ + ": " + str(e).splitlines()[0][:60]
+                with lock:
+                    errors[key] = errors.get(key, 0) + 1
+
+    def reader(stop: threading.Event) -> None:
+        tid = tenants[0]
+        while not stop.is_set():
+            try:
+                with session_for(tid) as db:
+                    db.execute(select(Transaction).where(Transaction.user_id == ids_by_tenant[tid][0]).limit(50)).all()
+            except Exception:
+                pass
+
+    stop = threading.Event()
+    readers = [threading.Thread(target=reader, args=(stop,)) for _ in range(max(1, threads // 4))]
+    writers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    t0 = time.perf_counter()
+    for t in readers + writers:
+        t.start()
+    for t in writers:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for t in readers:
+        t.join()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+    stats = {
+        "commits_per_s": round(len(latencies) / elapsed, 1),
+        "p95_ms": round(p95, 1),
+        "failed": sum(errors.values()),
+        "errors": errors,
+        "pool": pool_stats(eng),
+    }
+    if settings.DB_SHARDING:
+        database.dispose_shards()
+        settings.DB_SHARDING = False
+    else:
+        eng.dispose()
+    return stats
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--ops", type=int, default=100)
+    ap.add_argument("--url", default=None, help="URL серверной БД (по умолчанию — временные SQLite)")
+    ap.add_argument("--tenants", type=int, default=0, help="сравнить общий файл и шард на тенанта")
+    args = ap.parse_args()
+
+    if args.tenants:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_shared.db')}"
+        print(f"{'shared':8s} {run(_prepare(url, True, args.tenants), args.threads, args.ops)}")
+        print(f"{'sharded':8s} {run(_prepare_sharded(args.tenants), args.threads, args.ops)}")
+        return
+
+    for name, tuned in (("default", False), ("tuned", True)):
+        url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), f'bench_{name}.db')}"
+        stats = run(_prepare(url, tuned), args.threads, args.ops)
+        print(f"{name:8s} {stats}")
+
+
+if __name__ == "__main__":
+    main()
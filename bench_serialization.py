@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Сериализация списков: модель на строку против projected rows + orjson.
+
+  python bench_serialization.py                 # 500 строк на страницу
+  python bench_serialization.py --rows 200 --repeat 50
+
+before — как было: ORM-объекты → TransactionOut.model_validate → user_phone
+→ response_model → JSONResponse. after — настоящий GET /api/transactions/
+(schema_columns + rows_response). Оба через TestClient на одной временной
+SQLite; печатает мс на запрос и мкс на строку.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, ".")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import desc
+from sqlalchemy.orm import Session
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+import app.models.customer_stats  # noqa: F401
+import app.models.transaction_archive  # noqa: F401
+from app.api.transactions import router
+from app.core.database import Base, SessionLocal, engine, get_db
+from app.models.auth import Tenant
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.schemas.transaction import TransactionOut
+
+TENANT = 1
+
+
+def _seed(rows: int) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.add(Tenant(id=TENANT, name="Bench"))
+        users = [User(tenant_id=TENANT, phone=f"7701{i:07d}", full_name=f"C{i}") for i in range(100)]
+        db.add_all(users)
+        db.flush()
+        db.add_all([
+            Transaction(
+                tenant_id=TENANT, user_id=users[i % 100].id, amount=1000 + i, paid_amount=1000 + i,
+                earned_points=30, payment_method="CARD", comment="bench",
+                created_at=now - timedelta(minutes=i),
+            )
+            for i in range(rows)
+        ])
+        db.commit()
+
+
+def _app() -> FastAPI:
+    api = FastAPI()
+
+    @api.middleware("http")
+    async def fake_auth(request: Request, call_next):
+        request.state.user = {"tenant_id": TENANT}
+        return await call_next(request)
+
+    @api.get("/before", response_model=List[TransactionOut], response_class=JSONResponse)
+    def before(limit: int = 500, db: Session = Depends(get_db)):
+        rows = (
+            db.query(Transaction, User.phone)
+            .join(User, User.id == Transaction.user_id)
+            .filter(Transaction.tenant_id == TENANT)
+            .order_by(desc(Transaction.created_at), desc(Transaction.id))
+            .limit(limit)
+            .all()
+        )
+        out = []
+        for t, phone in rows:
+            item = TransactionOut.model_validate(t)
+            item.user_phone = phone or ""
+            out.append(item)
+        return out
+
+    api.include_router(router, prefix="/api")
+    return api
+
+
+def _measure(client: TestClient, url: str, repeat: int) -> list[float]:
+    client.get(url)  # прогрев
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        r = client.get(url)
+        times.append(time.perf_counter() - t)
+        assert r.status_code == 200, r.text
+    return times
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=500)
+    ap.add_argument("--repeat", type=int, default=30)
+    args = ap.parse_args()
+
+    _seed(args.rows)
+    client = TestClient(_app())
+    same = client.get(f"/before?limit={args.rows}").json() == client.get(f"/api/transactions/?limit={args.rows}").json()
+    print(f"rows={args.rows} identical_json={same}")
+
+    for name, url in (("before", f"/before?limit={args.rows}"), ("after", f"/api/transactions/?limit={args.rows}")):
+        times = _measure(client, url, args.repeat)
+        med = statistics.median(times)
+        print(f"{name:7s} median {med * 1000:7.2f} ms/request  {med / args.rows * 1e6:6.1f} us/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Поиск клиентов (app.services.client_search) на большой таблице users.
+
+  python bench_user_search.py                    # 1 000 000 клиентов, 10 тенантов
+  python bench_user_search.py --users 200000 --repeat 20
+
+Заполняет временную SQLite (users_fts наполняется триггерами), печатает
+медиану search_users и старого фильтра (Python str.find по всем клиентам)
+для типичных запросов: префикс телефона, подстрока номера, фамилия.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, ".")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from sqlalchemy import insert, text
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+from app.core.database import Base, SessionLocal, engine
+from app.migrate_indexes import migrate
+from app.models.auth import Tenant
+from app.models.user import User
+from app.services.client_search import search_users
+
+TENANT = 1
+SURNAMES = ("Иванов", "Петров", "Сидоров", "Ахметов", "Касымов", "Ким", "Смирнов", "Нурланов", "Жумабаев", "Ли")
+NAMES = ("Алия", "Пётр", "Данияр", "Анна", "Ерлан", "Ольга", "Айгерим", "Сергей", "Мадина", "Тимур")
+QUERIES = ("7701555", "8 701 555 12", "55512", "ахмет", "Ольга Ким", "нурланов айгерим")
+
+
+def _seed(users: int, tenants: int) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(1)
+    with SessionLocal() as db:
+        db.add_all([Tenant(id=t, name=f"T{t}") for t in range(1, tenants + 1)])
+        db.commit()
+    batch = 20000
+    with engine.begin() as conn:
+        for start in range(0, users, batch):
+            rows = []
+            for i in range(start, min(start + batch, users)):
+                suffix = "а" if i % 2 else ""
+                rows.append({
+                    "tenant_id": i % tenants + 1,
+                    "phone": f"770{rnd.randrange(10**8):08d}",
+                    "full_name": f"{rnd.choice(SURNAMES)}{suffix} {rnd.choice(NAMES)}",
+                    "tier": "Bronze",
+                    "bonus_balance": 0,
+                })
+            conn.execute(insert(User).prefix_with("OR IGNORE"), rows)
+    migrate()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def _median_ms(fn, repeat: int) -> float:
+    fn()
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return statistics.median(times) * 1000
+
+
+def _old_filter(db, q: str) -> list:
+    # как было в list_clients_by_segment: все клиенты в память + str.find
+    q_low = q.lower()
+    return [
+        u for u in db.query(User).filter(User.tenant_id == TENANT).all()
+        if (u.full_name or "").lower().find(q_low) != -1 or (u.phone or "").find(q_low) != -1
+    ][:20]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--users", type=int, default=1_000_000)
+    ap.add_argument("--tenants", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    t = time.perf_counter()
+    _seed(args.users, args.tenants)
+    print(f"users={args.users} tenants={args.tenants} seed {time.perf_counter() - t:.1f}s")
+
+    with SessionLocal() as db:
+        for q in QUERIES:
+            found = len(search_users(db, TENANT, q))
+            ms = _median_ms(lambda: search_users(db, TENANT, q), args.repeat)
+            print(f"  {q!r:22s} {found:3d} hits  {ms:7.2f} ms")
+        old = _median_ms(lambda: _old_filter(db, "ахмет"), 1)
+        print(f"  old str.find 'ахмет' (tenant {TENANT}): {old:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+Нагрузочное сравнение sync (get_db, пул потоков Starlette) и async
+(DB_ASYNC: run_db / AsyncSession) роутеров transactions / crm / analytics.
+
+  python loadtest_db.py                       # временная SQLite, 2000 запросов, 64 параллельно
+  python loadtest_db.py --requests 5000 --concurrency 128 --clients 2000
+  DATABASE_URL=postgresql://... python loadtest_db.py --no-seed --tenant 1
+
+Приложения поднимаются в процессе (httpx ASGITransport), авторизация
+подменяется middleware. Смешанная нагрузка: покупка, история клиента,
+карточка CRM, список транзакций. Печатает req/s и p50/p95/p99.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_load.db')}"
+)
+
+import httpx
+from fastapi import FastAPI, Request
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+import app.models.customer_stats  # noqa: F401
+import app.models.transaction_archive  # noqa: F401
+from app.core.database import Base, SessionLocal, dispose_async_engine, engine
+from app.models.auth import Tenant
+from app.models.transaction import Transaction
+from app.models.user import User
+
+
+def seed(tenant_id: int, clients: int) -> list[str]:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.add(Tenant(id=tenant_id, name="Load"))
+        phones = []
+        for i in range(clients):
+            phone = f"7700{i:07d}"
+            u = User(tenant_id=tenant_id, phone=phone, full_name=f"Client {i}", tier="Bronze")
+            db.add(u)
+            db.flush()
+            for _ in range(3):
+                db.add(Transaction(tenant_id=tenant_id, user_id=u.id, amount=5000, paid_amount=5000, comment=""))
+            phones.append(phone)
+        db.commit()
+        return phones
+    finally:
+        db.close()
+
+
+def build_app(use_async: bool, tenant_id: int) -> FastAPI:
+    if use_async:
+        from app.api.analytics_async import router as analytics_router
+        from app.api.crm_async import router as crm_router
+        from app.api.transactions_async import router as tx_router
+    else:
+        from app.api.analytics import router as analytics_router
+        from app.api.crm import router as crm_router
+        from app.api.transactions import router as tx_router
+
+    api = FastAPI()
+
+    @api.middleware("http")
+    async def fake_auth(request: Request, call_next):
+        request.state.user = {"tenant_id": tenant_id, "role": "owner"}
+        return await call_next(request)
+
+    for r in (tx_router, crm_router, analytics_router):
+        api.include_router(r, prefix="/api")
+    return api
+
+
+def _request(phones: list[str], rnd: random.Random) -> tuple[str, str, dict | None]:
+    phone = rnd.choice(phones)
+    x = rnd.random()
+    if x < 0.3:
+        return "POST", "/api/transactions/", {"user_phone": phone, "amount": 3000, "paid_amount": 3000}
+    if x < 0.6:
+        return "GET", f"/api/transactions/by-phone/{phone}", None
+    if x < 0.9:
+        return "GET", f"/api/crm/client/{phone}", None
+    return "GET", "/api/transactions/?limit=50", None
+
+
+async def run(api: FastAPI, phones: list[str], total: int, concurrency: int) -> dict:
+    rnd = random.Random(42)
+    plan = [_request(phones, rnd) for _ in range(total)]
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(plan)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api, raise_app_exceptions=False), base_url="http://load") as client:
+        async def worker():
+            nonlocal errors
+            for method, url, body in queue:
+                t = time.perf_counter()
+                r = await client.request(method, url, json=body)
+                latencies.append(time.perf_counter() - t)
+                if r.status_code >= 400:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+    return {
+        "rps": round(total / elapsed, 1),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--clients", type=int, default=500)
+    ap.add_argument("--tenant", type=int, default=1)
+    ap.add_argument("--no-seed", action="store_true", help="использовать существующие данные тенанта")
+    args = ap.parse_args()
+
+    if args.no_seed:
+        db = SessionLocal()
+        try:
+            phones = [p for (p,) in db.query(User.phone).filter(User.tenant_id == args.tenant).limit(args.clients)]
+        finally:
+            db.close()
+    else:
+        phones = seed(args.tenant, args.clients)
+
+    for name, use_async in (("sync", False), ("async", True)):
+        api = build_app(use_async, args.tenant)
+        stats = asyncio.run(run(api, phones, args.requests, args.concurrency))
+        if use_async:
+            asyncio.run(dispose_async_engine())
+        print(f"{name:5s}  {stats}")
+
+
+if __name__ == "__main__":
+    main()
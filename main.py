@@ -1,4 +1,5 @@
 # main.py
+import asyncio
 import os
 from datetime import datetime
 from urllib.parse import quote
@@ -7,16 +8,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import RedirectResponse, JSONResponse
 
+from app.core.config import settings
 from app.core.database import engine, Base, SessionLocal
 
 from app.api.users import router as users_router
 from app.api.transactions import router as transactions_router
 from app.api.crm import router as crm_router
+from app.api.clients import router as clients_router
 from app.api.settings_api import router as settings_router
 from app.api.ai import router as ai_router
 from app.api.analytics import router as analytics_router
@@ -24,6 +28,14 @@ from app.api.campaigns import router as campaigns_router
 from app.api.accounts_api import router as accounts_router
 from app.api.videos_api import router as videos_router
 from app.api.whatsapp import router as whatsapp_router
+from app.api.status_api import router as status_router
+
+# DB_ASYNC: горячие роутеры async (те же пути и ответы; app.core.database).
+# С DB_SHARDING остаются синхронные: сессия тенанта строится через get_db.
+if settings.DB_ASYNC and not settings.DB_SHARDING:
+    from app.api.transactions_async import router as transactions_router  # noqa: F811
+    from app.api.crm_async import router as crm_router  # noqa: F811
+    from app.api.analytics_async import router as analytics_router  # noqa: F811
 
 from app.web.admin import router as admin_router
 from app.web.admin_campaigns import router as admin_campaigns_router
@@ -37,14 +49,37 @@ from app.web.superadmin import router as superadmin_router
 import app.models  # noqa: F401
 import app.models.campaign  # noqa: F401
 import app.models.auth  # noqa: F401
+import app.models.whatsapp_message  # noqa: F401
+import app.models.whatsapp_number  # noqa: F401
+import app.models.ai_response_cache  # noqa: F401
+import app.models.client_ai_suggestion  # noqa: F401
+import app.models.bonus_grant_archive  # noqa: F401
+import app.models.transaction_archive  # noqa: F401
+import app.models.customer_stats  # noqa: F401
 
-app = FastAPI(title="LTV Loyalty Platform")
+# orjson по умолчанию: быстрее json.dumps, списки отдаются rows_response (app.core.serialization)
+app = FastAPI(title="LTV Loyalty Platform", default_response_class=ORJSONResponse)
 
 # -------------------------
 # DB init
 # -------------------------
 Base.metadata.create_all(bind=engine)
 
+# DB_SHARDING на базе с данными — сначала перенос (python -m app.services.shard_migrate)
+from app.services.shard_migrate import assert_shared_tables_empty
+
+assert_shared_tables_empty()
+
+# Составные индексы для БД, созданных до их появления в моделях
+try:
+    from app.migrate_indexes import migrate as migrate_indexes
+
+    for _ix, _status in migrate_indexes().items():
+        if _status != "exists":
+            print(f"[BOOTSTRAP] index {_ix}: {_status}")
+except Exception as e:
+    print(f"[BOOTSTRAP] index migration failed: {e}")
+
 # -------------------------
 # Static
 # -------------------------
@@ -104,6 +139,7 @@ class AuthGuardMiddleware(BaseHTTPMiddleware):
             or path.startswith("/superadmin")
             or path.startswith("/docs")
             or path.startswith("/openapi.json")
+            or path == "/api/whatsapp/webhook"  # GreenAPI, защищён GREENAPI_WEBHOOK_TOKEN
         ):
             return await call_next(request)
 
@@ -244,9 +280,44 @@ def bootstrap_owner():
         db.close()
 
 
+@app.on_event("startup")
+async def start_background_jobs():
+    from app.services.bonus_archive import bonus_archive_loop
+    from app.services.tx_archive import tx_archive_loop
+    from app.services.whatsapp import status_refresher_loop
+    from app.services.whatsapp_status import status_flusher_loop
+
+    app.state.bg_tasks = [
+        asyncio.create_task(status_flusher_loop()),
+        asyncio.create_task(status_refresher_loop()),
+    ]
+    if settings.BONUS_ARCHIVE_INTERVAL_S > 0:
+        app.state.bg_tasks.append(asyncio.create_task(bonus_archive_loop()))
+    if settings.TX_ARCHIVE_INTERVAL_S > 0:
+        app.state.bg_tasks.append(asyncio.create_task(tx_archive_loop()))
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    from app.ai.jobs import cancel_jobs
+    from app.ai.openai_client import close_openai_client
+    from app.core.database import dispose_async_engine, dispose_shards
+    from app.services.whatsapp_status import flush_status_buffer
+
+    for task in getattr(app.state, "bg_tasks", []):
+        task.cancel()
+    # Не теряем накопленные статусы доставки
+    await flush_status_buffer()
+    await cancel_jobs()
+    await close_openai_client()
+    await dispose_async_engine()
+    dispose_shards()
+
+
 app.include_router(users_router, prefix="/api")
 app.include_router(transactions_router, prefix="/api")
 app.include_router(crm_router, prefix="/api")
+app.include_router(clients_router, prefix="/api")
 app.include_router(settings_router, prefix="/api")
 app.include_router(ai_router, prefix="/api")
 app.include_router(analytics_router, prefix="/api")
@@ -260,6 +331,7 @@ app.include_router(admin_accounts_router)
 app.include_router(videos_router, prefix="/api")
 app.include_router(admin_videos_router)
 app.include_router(whatsapp_router, prefix="/api")
+app.include_router(status_router, prefix="/api")
 app.include_router(admin_whatsapp_router)
 app.include_router(superadmin_router)
 
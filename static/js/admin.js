@@ -121,6 +121,35 @@ async function apiGet(url) {
   return data;
 }
 
+// Страница списка с keyset-курсором: { items, next } — next из X-Next-Cursor
+async function apiGetPage(url, after) {
+  const u = after ? `${url}${url.includes("?") ? "&" : "?"}after=${encodeURIComponent(after)}` : url;
+  const r = await fetch(u, { headers: { Accept: "application/json" } });
+  const data = await r.json().catch(() => ({}));
+  if (!r.ok) throw new Error(data?.detail || `${r.status} ${r.statusText}`);
+  return {
+    items: Array.isArray(data) ? data : [],
+    next: r.headers.get("X-Next-Cursor") || null,
+    total: r.headers.get("X-Total-Count"),
+  };
+}
+
+// Кнопка «Показать ещё» под таблицей tbody (создаётся один раз)
+function moreButton(tbody, onClick) {
+  const table = tbody.closest(".table-responsive") || tbody.closest("table");
+  let btn = table?.parentElement?.querySelector("[data-more]");
+  if (!btn && table) {
+    btn = document.createElement("button");
+    btn.type = "button";
+    btn.className = "btn btn-sm btn-outline-secondary mt-2 d-none";
+    btn.dataset.more = "1";
+    btn.textContent = "Показать ещё";
+    table.insertAdjacentElement("afterend", btn);
+  }
+  if (btn) btn.onclick = onClick;
+  return btn;
+}
+
 async function apiPost(url, data) {
   const r = await fetch(url, {
     method: "POST",
@@ -132,6 +161,45 @@ async function apiPost(url, data) {
   return out;
 }
 
+// SSE поверх POST/GET: onEvent(name, data) на каждое событие
+async function apiStreamSSE(url, data, onEvent) {
+  const r = await fetch(url, data === undefined
+    ? { headers: { Accept: "text/event-stream" } }
+    : {
+        method: "POST",
+        headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+        body: JSON.stringify(data),
+      });
+  if (!r.ok || !r.body) {
+    const out = await r.json().catch(() => ({}));
+    throw new Error(out?.detail || `${r.status} ${r.statusText}`);
+  }
+
+  const reader = r.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buf.indexOf("\n\n")) !== -1) {
+      const block = buf.slice(0, sep);
+      buf = buf.slice(sep + 2);
+      let name = "message";
+      let payload = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event:")) name = line.slice(6).trim();
+        else if (line.startsWith("data:")) payload += line.slice(5).trim();
+      }
+      let parsed = null;
+      try { parsed = payload ? JSON.parse(payload) : null; } catch (_) { parsed = null; }
+      onEvent(name, parsed);
+    }
+  }
+}
+
 // =========================
 // Execute recommendation (SERVER-validated)
 // =========================
@@ -354,7 +422,23 @@ function initAiPanel() {
 
     try {
       const payload = { context, question, phone };
-      const data = await apiPost("/api/ai/ask", payload);
+
+      // Стрим: сразу эвристика, потом ответ модели
+      let data = null;
+      let streamed = 0;
+      await apiStreamSSE("/api/ai/ask/stream", payload, (name, ev) => {
+        if (name === "fallback" && ev) {
+          setMode("heuristic…");
+          ansEl.textContent = ev.answer ? String(ev.answer) : "—";
+          renderInsights(ev.insights);
+        } else if (name === "delta" && ev) {
+          streamed += String(ev.text || "").length;
+          setMode(`AI пишет… ${streamed}`);
+        } else if (name === "final") {
+          data = ev;
+        }
+      });
+      if (!data) throw new Error("AI stream оборвался");
 
       setMode(data?.mode || "—");
       ansEl.textContent = data?.answer ? String(data.answer) : "—";
@@ -556,16 +640,23 @@ function initAiOverviewWidget() {
     return { kind: "overview" };
   }
 
-  async function load() {
+  async function load(force = false) {
     setLoading();
     btn.disabled = true;
 
     try {
       const req = inferRequest();
-      const data =
-        req.kind === "ask"
-          ? await apiPost("/api/ai/ask", req.payload)
-          : await apiGet("/api/ai/overview");
+      let data = null;
+      if (req.kind === "ask" && !force) {
+        // Готовая подсказка ночного batch — без ожидания LLM
+        data = await apiGet(`/api/ai/suggestions/${encodeURIComponent(req.payload.phone)}`).catch(() => null);
+      }
+      if (!data) {
+        data =
+          req.kind === "ask"
+            ? await apiPost("/api/ai/ask", req.payload)
+            : await apiGet("/api/ai/overview");
+      }
 
       setBadge(data?.mode || "—");
       renderInsights(data?.insights);
@@ -613,7 +704,7 @@ function initAiOverviewWidget() {
     }
   });
 
-  btn.addEventListener("click", load);
+  btn.addEventListener("click", () => load(true));
   load();
 }
 
@@ -1958,13 +2049,18 @@ function initClientsList() {
 
   if (!usersTableBody) return;
 
-  async function loadUsers() {
+  let nextCursor = null;
+  const btnMore = moreButton(usersTableBody, () => loadUsers(true));
+
+  async function loadUsers(more = false) {
     try {
       hide(usersError);
-      const data = await apiGet("/api/users/");
-      const items = Array.isArray(data) ? data : [];
+      if (btnMore) btnMore.disabled = true;
+      const page = await apiGetPage("/api/users/", more ? nextCursor : null);
+      nextCursor = page.next;
+      btnMore?.classList.toggle("d-none", !nextCursor);
 
-      usersTableBody.innerHTML = items
+      const html = page.items
         .map((u) => {
           const t = u.tier || "Bronze";
           return `
@@ -1982,11 +2078,15 @@ function initClientsList() {
           `;
         })
         .join("");
+      if (more) usersTableBody.insertAdjacentHTML("beforeend", html);
+      else usersTableBody.innerHTML = html;
 
-      if (typeof uiToast === "function") uiToast("Клиенты обновлены", "info");
+      if (!more && typeof uiToast === "function") uiToast("Клиенты обновлены", "info");
     } catch (e) {
       show(usersError, `Ошибка: ${e.message}`, true);
-      usersTableBody.innerHTML = `<tr><td colspan="5" class="text-muted">Ошибка загрузки</td></tr>`;
+      if (!more) usersTableBody.innerHTML = `<tr><td colspan="5" class="text-muted">Ошибка загрузки</td></tr>`;
+    } finally {
+      if (btnMore) btnMore.disabled = false;
     }
   }
 
@@ -2006,7 +2106,7 @@ function initClientsList() {
     });
   }
 
-  [btnRefresh, btnRefreshTop].forEach((b) => b?.addEventListener("click", loadUsers));
+  [btnRefresh, btnRefreshTop].forEach((b) => b?.addEventListener("click", () => loadUsers()));
   loadUsers();
 }
 
@@ -2060,28 +2160,62 @@ function initClientCard() {
     if (mBonus) mBonus.textContent = "0";
   }
 
-  async function loadMetrics() {
+  function renderMetrics(card) {
+    const p = card.profile || {};
+    const m = card.metrics || {};
+    if (mFullName) mFullName.textContent = p.full_name || "—";
+
+    const tier = p.tier || "Bronze";
+    if (mTier) {
+      mTier.textContent = tierRu(tier);
+      mTier.className = `badge ${tierBadgeClass(tier)}`;
+    }
+
+    if (mTotalSpent) mTotalSpent.textContent = fmtMoney(m.total_spent);
+    if (mCount) mCount.textContent = fmt0(m.purchases_count);
+    if (mAvg) mAvg.textContent = fmtMoney(m.avg_check);
+    if (mBonus) mBonus.textContent = fmt0(card.balance?.total);
+  }
+
+  function renderTransactions(rows) {
+    if (!txTableBody) return;
+    const list = Array.isArray(rows) ? rows : [];
+
+    if (!list.length) {
+      txTableBody.innerHTML = `<tr><td colspan="6" class="text-muted">Транзакций пока нет</td></tr>`;
+      return;
+    }
+
+    txTableBody.innerHTML = list
+      .map(
+        (t) => `
+        <tr>
+          <td>${t.id ?? "—"}</td>
+          <td>${fmtDate(t.created_at)}</td>
+          <td class="text-end">${fmtMoney(t.amount)}</td>
+          <td class="text-end">${fmtMoney(t.paid_amount ?? t.amount)}</td>
+          <td class="text-end">${fmt0(getRedeem(t))}</td>
+          <td class="text-end">${fmt0(getEarned(t))}</td>
+        </tr>
+      `
+      )
+      .join("");
+  }
+
+  // Карточка одним запросом; повторный просмотр — 304 по ETag (кэш браузера)
+  async function reloadAll() {
     try {
       hide(clientError);
+      hide(txError);
       clientNotFound?.classList.add("d-none");
       birthdayBanner?.classList.add("d-none");
 
-      const data = await apiGet(`/api/crm/client/${phone}`);
-
-      if (mFullName) mFullName.textContent = data.full_name || "—";
-
-      const tier = data.tier || "Bronze";
-      if (mTier) {
-        mTier.textContent = tierRu(tier);
-        mTier.className = `badge ${tierBadgeClass(tier)}`;
-      }
-
-      if (mTotalSpent) mTotalSpent.textContent = fmtMoney(data.total_spent);
-      if (mCount) mCount.textContent = fmt0(data.purchases_count);
-      if (mAvg) mAvg.textContent = fmtMoney(data.avg_check);
-      if (mBonus) mBonus.textContent = fmt0(data.bonus_balance);
+      const card = await apiGet(`/api/clients/${phone}/card?tx_limit=100`);
+      renderMetrics(card);
+      renderTransactions(card.transactions);
     } catch (e) {
       resetMetrics();
+      if (txTableBody) txTableBody.innerHTML = `<tr><td colspan="6" class="text-muted">—</td></tr>`;
       const msg = String(e.message || "");
       if (msg.toLowerCase().includes("client not found") || msg.includes("404")) {
         clientNotFound?.classList.remove("d-none");
@@ -2092,44 +2226,6 @@ function initClientCard() {
     }
   }
 
-  async function loadTransactions() {
-    if (!txTableBody) return;
-    try {
-      hide(txError);
-      const rows = await apiGet(`/api/transactions/by-phone/${phone}`);
-      const list = Array.isArray(rows) ? rows : [];
-
-      if (!list.length) {
-        txTableBody.innerHTML = `<tr><td colspan="6" class="text-muted">Транзакций пока нет</td></tr>`;
-        return;
-      }
-
-      txTableBody.innerHTML = list
-        .map(
-          (t) => `
-          <tr>
-            <td>${t.id ?? "—"}</td>
-            <td>${fmtDate(t.created_at)}</td>
-            <td class="text-end">${fmtMoney(t.amount)}</td>
-            <td class="text-end">${fmtMoney(t.paid_amount ?? t.amount)}</td>
-            <td class="text-end">${fmt0(getRedeem(t))}</td>
-            <td class="text-end">${fmt0(getEarned(t))}</td>
-          </tr>
-        `
-        )
-        .join("");
-    } catch (e) {
-      show(txError, `Ошибка загрузки транзакций: ${e.message}`, true);
-      txError?.classList.remove("d-none");
-      txTableBody.innerHTML = `<tr><td colspan="6" class="text-muted">Ошибка</td></tr>`;
-    }
-  }
-
-  async function reloadAll() {
-    await loadMetrics();
-    await loadTransactions();
-  }
-
   btnReload?.addEventListener("click", reloadAll);
 
   btnCreateTx?.addEventListener("click", async () => {
@@ -2234,9 +2330,21 @@ function initTransactionsPage() {
       .join("");
   }
 
-  async function loadByPhone(phone) {
-    const data = await apiGet(`/api/transactions/by-phone/${phone}`);
-    renderRows(data);
+  // История клиента страницами по курсору: «Показать ещё» дочитывает старые
+  let loaded = [];
+  let nextCursor = null;
+  let loadedPhone = "";
+  const btnMore = moreButton(tbody, () => loadByPhone(loadedPhone, true).catch((e) => {
+    if (typeof uiToast === "function") uiToast(`Ошибка: ${e.message}`, "error");
+  }));
+
+  async function loadByPhone(phone, more = false) {
+    const page = await apiGetPage(`/api/transactions/by-phone/${phone}`, more ? nextCursor : null);
+    loaded = more ? loaded.concat(page.items) : page.items;
+    loadedPhone = phone;
+    nextCursor = page.next;
+    btnMore?.classList.toggle("d-none", !nextCursor);
+    renderRows(loaded);
   }
 
   async function onSearch() {
@@ -3251,11 +3359,12 @@ function initWhatsappPage() {
   function hideMsg(...ids)   { ids.forEach(id => { const el = v(id); if (el) el.classList.add("d-none"); }); }
 
   // ── Status ────────────────────────────────────────
-  async function loadStatus() {
+  // Статус отдаётся из кэша сервера; кнопка «обновить» — принудительный запрос к GreenAPI
+  async function loadStatus(force = false) {
     const badge = v("waStatusBadge");
     if (!badge) return;
     try {
-      const data = await apiGet("/api/whatsapp/status");
+      const data = await apiGet("/api/whatsapp/status" + (force ? "?refresh=1" : ""));
       if (data.ok) {
         badge.textContent = "✓ Подключён";
         badge.className = "badge text-bg-success";
@@ -3272,7 +3381,7 @@ function initWhatsappPage() {
     }
   }
 
-  v("waRefreshStatus")?.addEventListener("click", loadStatus);
+  v("waRefreshStatus")?.addEventListener("click", () => loadStatus(true));
 
   // ── Char count ────────────────────────────────────
   v("waMessage")?.addEventListener("input", () => {
@@ -3414,15 +3523,44 @@ function initWhatsappPage() {
     if (btn) { btn.disabled = true; btn.innerHTML = `<span class="spinner-border spinner-border-sm me-1"></span>`; }
 
     try {
-      const res = await fetch("/api/whatsapp/send-campaign", {
+      const r = await fetch("/api/whatsapp/send-campaign", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ campaign_id, template, dry_run }),
-      }).then(async r => {
-        const j = await r.json().catch(() => ({}));
-        if (!r.ok) throw new Error(j?.detail || "Ошибка");
-        return j;
+        body: JSON.stringify({ campaign_id, template, dry_run, stream: true }),
       });
+      if (!r.ok) {
+        const j = await r.json().catch(() => ({}));
+        throw new Error(j?.detail || "Ошибка");
+      }
+
+      // NDJSON: строка на получателя + периодические сводки (progress/done)
+      let res = { sent: 0, failed: 0, skipped: 0, processed: 0, total: 0, dry_run };
+      const reader = r.body.getReader();
+      const decoder = new TextDecoder();
+      let buf = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        let nl;
+        while ((nl = buf.indexOf("\n")) >= 0) {
+          const line = buf.slice(0, nl).trim();
+          buf = buf.slice(nl + 1);
+          if (!line) continue;
+          const ev = JSON.parse(line);
+          if (ev.type === "item") {
+            res[ev.status] = (res[ev.status] || 0) + 1;
+            res.processed += 1;
+          } else if (ev.type === "start") {
+            res.total = ev.total;
+          } else if (ev.type === "progress" || ev.type === "done") {
+            res = { ...res, ...ev };
+            renderResult(res);
+          } else if (ev.type === "error") {
+            throw new Error(ev.error || "Ошибка");
+          }
+        }
+      }
 
       renderResult(res);
       const msg = dry_run
@@ -3450,8 +3588,12 @@ function initWhatsappPage() {
     card.classList.remove("d-none");
 
     const dryTag = res.dry_run ? ` <span class="badge text-bg-info ms-1">dry run</span>` : "";
+    const progress = res.total
+      ? `<div class="text-muted small mb-2">Обработано ${res.processed || 0} из ${res.total}</div>`
+      : "";
 
     body.innerHTML = `
+      ${progress}
       <div class="row g-2 mb-3">
         <div class="col-4">
           <div class="wa-result-stat">
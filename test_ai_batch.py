@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""
+Batch next-best-action (app.ai.batch) на временной SQLite.
+
+- клиенты сегмента и их payload собираются фиксированным числом запросов
+  (не растёт с числом клиентов);
+- клиенты пакуются по per_prompt в один вызов генератора;
+- результат лежит в client_ai_suggestions и отдаётся /api/ai/suggestions.
+
+Запуск: python -m pytest -q test_ai_batch.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+import app.models.campaign  # noqa: F401
+import app.models.client_ai_suggestion  # noqa: F401
+from app.ai import batch
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, engine
+from app.models.auth import Tenant
+from app.models.bonus_grant import BonusGrant
+from app.models.client_ai_suggestion import ClientAiSuggestion
+from app.models.transaction import Transaction
+from app.models.user import User
+
+TENANT = 1
+RISK_CLIENTS = 45  # последняя покупка 30-60 дней назад → сегмент risk
+
+
+@pytest.fixture(autouse=True)
+def _ai_off(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROVIDER", "off")
+
+
+def _seed() -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.add_all([Tenant(id=TENANT, name="A"), Tenant(id=2, name="B")])
+        for i in range(RISK_CLIENTS + 10):
+            risk = i < RISK_CLIENTS
+            u = User(tenant_id=TENANT, phone=f"7701{i:07d}", full_name=f"Client {i}", tier="Bronze")
+            db.add(u)
+            db.flush()
+            days_ago = 45 if risk else 3
+            db.add(Transaction(
+                tenant_id=TENANT, user_id=u.id, amount=10_000, paid_amount=10_000,
+                created_at=now - timedelta(days=days_ago),
+            ))
+            db.add(BonusGrant(
+                user_id=u.id, amount=500, remaining=500, source="purchase", status="available",
+                available_from=now - timedelta(days=days_ago), expires_at=now + timedelta(days=30),
+            ))
+        # Клиент другого тенанта в том же сегменте — не должен попасть
+        other = User(tenant_id=2, phone="77020000000", full_name="Other", tier="Bronze")
+        db.add(other)
+        db.flush()
+        db.add(Transaction(
+            tenant_id=2, user_id=other.id, amount=1000, paid_amount=1000,
+            created_at=now - timedelta(days=45),
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _count_queries(fn):
+    statements: list[str] = []
+
+    def _before(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+    return result, len(statements)
+
+
+def test_payloads_use_bulk_queries():
+    _seed()
+    db = SessionLocal()
+    try:
+        ids, n_select = _count_queries(lambda: batch.segment_user_ids(db, TENANT, "risk"))
+        assert len(ids) == RISK_CLIENTS
+        assert n_select == 1
+
+        payloads, n_payload = _count_queries(lambda: batch.build_client_payloads(db, TENANT, ids))
+        assert len(payloads) == RISK_CLIENTS
+        assert n_payload == 1  # одна сводка (users + агрегаты) на пачку
+
+        p = payloads[0]
+        assert p["purchases_count"] == 1
+        assert p["total_spent"] == 10_000
+        assert p["bonus"]["available"] == 500
+        assert p["recency_days"] == 45
+    finally:
+        db.close()
+
+
+def test_run_batch_packs_clients_and_stores_suggestions():
+    _seed()
+    pack_sizes: list[int] = []
+
+    async def fake_llm(clients):
+        pack_sizes.append(len(clients))
+        # Модель «забыла» последнего клиента пачки — должен сработать stub
+        return {
+            c["phone"]: {
+                "answer": f"NBA {c['phone']}",
+                "insights": ["риск оттока"],
+                "recommendations": [{
+                    "action": "Win-back бонус",
+                    "target": f"action:grant_bonus|phone={c['phone']}|amount=3000|reason=winback",
+                    "why": "давно не покупал",
+                    "suggested_bonus": 3000,
+                    "expected_effect": "возврат",
+                    "risk": "низкий",
+                }],
+            }
+            for c in clients[:-1]
+        }
+
+    stats = asyncio.run(batch.run_batch(TENANT, "risk", provider="openai", per_prompt=20, generator=fake_llm))
+
+    assert pack_sizes == [20, 20, 5]
+    assert stats["saved"] == RISK_CLIENTS
+    assert stats["stub"] == len(pack_sizes)
+    assert stats["llm"] == RISK_CLIENTS - len(pack_sizes)
+
+    db = SessionLocal()
+    try:
+        rows = db.query(ClientAiSuggestion).all()
+        assert len(rows) == RISK_CLIENTS
+        assert {r.tenant_id for r in rows} == {TENANT}
+        assert all(r.segment_key == "risk" for r in rows)
+    finally:
+        db.close()
+
+    # Повторный прогон перезаписывает, а не дублирует
+    asyncio.run(batch.run_batch(TENANT, "risk", provider="stub"))
+    db = SessionLocal()
+    try:
+        assert db.query(ClientAiSuggestion).count() == RISK_CLIENTS
+    finally:
+        db.close()
+
+
+def test_client_card_reads_suggestion():
+    _seed()
+    asyncio.run(batch.run_batch(TENANT, "risk", provider="stub"))
+
+    from app.api.ai import router
+
+    api = FastAPI()
+
+    @api.middleware("http")
+    async def fake_auth(request: Request, call_next):
+        request.state.user = {"tenant_id": int(request.headers.get("X-Tenant", TENANT))}
+        return await call_next(request)
+
+    api.include_router(router, prefix="/api")
+    client = TestClient(api)
+
+    r = client.get("/api/ai/suggestions/87010000000")
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["mode"] == "batch"
+    assert body["recommendations"]
+
+    # Чужой тенант подсказку не видит
+    assert client.get("/api/ai/suggestions/77010000000", headers={"X-Tenant": "2"}).status_code == 404
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Тяжёлый AI-обзор не должен блокировать event loop.
+
+Пока /api/ai/overview считает агрегаты (здесь — имитация sleep в
+build_overview_payload), лёгкий async-эндпоинт того же воркера отвечает
+без задержки.
+
+Запуск: python -m pytest -q test_ai_concurrency.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+import httpx
+from fastapi import FastAPI
+
+import app.api.ai as ai_api
+from app.core.config import settings
+
+SLOW_S = 1.0
+
+
+def _slow_overview(db, tenant_id=None):
+    time.sleep(SLOW_S)  # синхронный «тяжёлый» SQL
+    return {"summary": {"clients": 0, "active_30d": 0, "churn_risk": 0, "total_revenue_30d": 0}}
+
+
+def _make_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(ai_api.router, prefix="/api")
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def _measure() -> tuple[float, float]:
+    transport = httpx.ASGITransport(app=_make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def overview() -> float:
+            t0 = time.perf_counter()
+            r = await client.get("/api/ai/overview")
+            assert r.status_code == 200, r.text
+            return time.perf_counter() - t0
+
+        async def ping_latency() -> float:
+            # Отсчёт от запланированного старта: при заблокированном loop
+            # задержка видна уже на пробуждении из sleep
+            t0 = time.perf_counter() + 0.1
+            await asyncio.sleep(0.1)  # overview уже в работе
+            r = await client.get("/api/ping")
+            assert r.status_code == 200
+            return time.perf_counter() - t0
+
+        return await asyncio.gather(overview(), ping_latency())
+
+
+def test_overview_does_not_block_event_loop(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROVIDER", "off")
+    monkeypatch.setattr(ai_api, "build_overview_payload", _slow_overview)
+
+    overview_s, ping_s = asyncio.run(_measure())
+
+    assert overview_s >= SLOW_S
+    assert ping_s < SLOW_S / 4, f"ping ждал {ping_s:.2f}s, пока считался обзор"
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main(["-q", __file__]))
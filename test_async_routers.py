@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Async-роутеры DB_ASYNC (app.api.*_async) на временной SQLite.
+
+- тяжёлая аналитика (здесь — sleep в build_analytics_overview) не блокирует
+  event loop: лёгкий async-эндпоинт того же воркера отвечает без задержки;
+- карточка CRM читается через get_async_db (aiosqlite) теми же цифрами,
+  что и синхронная client_summary;
+- покупка и списки /api/transactions идут через run_db.
+
+Запуск: python -m pytest -q test_async_routers.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+import httpx
+from fastapi import FastAPI, Request
+
+import app.api.analytics_async as analytics_async
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+from app.api.crm_async import router as crm_router
+from app.api.transactions_async import router as tx_router
+from app.core.database import Base, SessionLocal, dispose_async_engine, engine
+from app.models.auth import Tenant
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.services.analytics import build_analytics_overview
+from app.services.client_summary import client_summary
+
+TENANT = 1
+PHONE = "77010000001"
+SLOW_S = 1.0
+
+
+def _seed() -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.add(Tenant(id=TENANT, name="A"))
+        u = User(tenant_id=TENANT, phone=PHONE, full_name="Иван", tier="Bronze")
+        db.add(u)
+        db.flush()
+        for days, paid in ((3, 5000), (40, 2000)):
+            db.add(Transaction(
+                tenant_id=TENANT, user_id=u.id, amount=paid, paid_amount=paid,
+                created_at=now - timedelta(days=days),
+            ))
+        db.commit()
+
+
+def _make_app(*routers) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def fake_auth(request: Request, call_next):
+        request.state.user = {"tenant_id": TENANT}
+        return await call_next(request)
+
+    for r in routers:
+        app.include_router(r, prefix="/api")
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def test_analytics_does_not_block_event_loop(monkeypatch):
+    _seed()
+    threads = []
+
+    def slow_overview(db):
+        threads.append(threading.current_thread())
+        time.sleep(SLOW_S)  # синхронные агрегаты и RFM
+        return build_analytics_overview(db)
+
+    monkeypatch.setattr(analytics_async, "build_analytics_overview", slow_overview)
+
+    async def measure() -> tuple[float, float]:
+        transport = httpx.ASGITransport(app=_make_app(analytics_async.router))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async def overview() -> float:
+                t0 = time.perf_counter()
+                r = await client.get("/api/analytics/overview")
+                assert r.status_code == 200, r.text
+                return time.perf_counter() - t0
+
+            async def ping_latency() -> float:
+                # Отсчёт от запланированного старта: при заблокированном loop
+                # задержка видна уже на пробуждении из sleep
+                t0 = time.perf_counter() + 0.1
+                await asyncio.sleep(0.1)  # overview уже в работе
+                r = await client.get("/api/ping")
+                assert r.status_code == 200
+                return time.perf_counter() - t0
+
+            return await asyncio.gather(overview(), ping_latency())
+
+    overview_s, ping_s = asyncio.run(measure())
+
+    assert overview_s >= SLOW_S
+    assert threads and threads[0] is not threading.main_thread()
+    assert ping_s < SLOW_S / 4, f"ping ждал {ping_s:.2f}s, пока считалась аналитика"
+
+
+def test_crm_card_via_async_session():
+    _seed()
+    with SessionLocal() as db:
+        expected = client_summary(db, TENANT, PHONE)
+
+    async def fetch() -> tuple[dict, int]:
+        transport = httpx.ASGITransport(app=_make_app(crm_router))
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                r = await client.get(f"/api/crm/client/{PHONE}")
+                missing = await client.get("/api/crm/client/77019999999")
+            return r.json(), missing.status_code
+        finally:
+            await dispose_async_engine()
+
+    body, missing = asyncio.run(fetch())
+    assert body["phone"] == PHONE
+    assert body["total_spent"] == expected["total_spent"] == 7000
+    assert missing == 404
+
+
+def test_transactions_via_run_db():
+    _seed()
+
+    async def calls() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=_make_app(tx_router))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                await client.post("/api/transactions/", json={"user_phone": PHONE, "amount": 3000}),
+                await client.get(f"/api/transactions/by-phone/{PHONE}?limit=2"),
+                await client.get("/api/transactions/?count=true"),
+            ]
+
+    created, by_phone, listed = asyncio.run(calls())
+    assert created.status_code == 200, created.text
+    assert by_phone.status_code == 200 and len(by_phone.json()) == 2
+    assert by_phone.headers.get("X-Next-Cursor")
+    assert listed.status_code == 200 and len(listed.json()) == 3
+    assert listed.headers["X-Total-Count"] == "3"
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+"""
+Circuit breaker (app.core.circuit_breaker) и его вызовы в OpenAI / GreenAPI.
+
+- closed → open по доле ошибок, open отклоняет, half-open пускает одну пробу;
+- проба: успех замыкает цепь, сбой и отмена снова размыкают;
+- потерянная проба (нет исхода дольше probe_timeout_s) не клинит breaker;
+- отмена задачи / обрыв SSE в openai_* и любое исключение в GreenAPI
+  освобождают пробу;
+- 400 от Responses API (ошибка запроса) не закрепляет модель за chat,
+  явное «unsupported_parameter» — закрепляет.
+
+Запуск: python -m pytest -q test_circuit_breaker.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import types
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+import httpx
+import pytest
+
+import app.ai.openai_client as oc
+import app.core.circuit_breaker as cbm
+import app.services.whatsapp as wa
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, get_breaker
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    # подменяем только часы breaker'а: event loop живёт на настоящем time
+    monkeypatch.setattr(cbm, "time", types.SimpleNamespace(monotonic=c))
+    return c
+
+
+def _opened(clock, **kw) -> CircuitBreaker:
+    cb = CircuitBreaker("t", window=4, min_calls=2, failure_rate=0.5, open_s=30, **kw)
+    cb.record_failure("x")
+    cb.record_failure("x")
+    assert cb.state == OPEN
+    return cb
+
+
+def test_state_machine(clock):
+    cb = CircuitBreaker("t", window=4, min_calls=2, failure_rate=0.5, open_s=30)
+    cb.record_failure("x")
+    assert cb.state == CLOSED  # меньше min_calls
+    cb.record_failure("x")
+    assert cb.state == OPEN and not cb.allow()
+
+    clock.t += 30
+    assert cb.state == HALF_OPEN
+    assert cb.allow() and not cb.allow()  # одна проба
+    cb.record_failure("still down")
+    assert cb.state == OPEN
+
+    clock.t += 30
+    assert cb.allow()
+    cb.record_success()
+    assert cb.state == CLOSED and cb.allow() and cb.allow()
+
+
+def test_cancelled_probe_reopens(clock):
+    cb = _opened(clock)
+    clock.t += 30
+    assert cb.allow()
+    cb.record_cancelled()
+    assert cb.state == OPEN and cb.snapshot()["last_error"] == "probe cancelled"
+    clock.t += 30
+    assert cb.allow()
+
+    # в closed отмена (клиент ушёл) ошибкой провайдера не считается
+    ok = CircuitBreaker("c", window=4, min_calls=1, failure_rate=0.5)
+    ok.record_cancelled()
+    assert ok.state == CLOSED and ok.snapshot()["calls"] == 0
+
+
+def test_lost_probe_times_out(clock):
+    cb = _opened(clock, probe_timeout_s=60)
+    clock.t += 30
+    assert cb.allow()          # проба ушла и пропала
+    clock.t += 59
+    assert not cb.allow()
+    clock.t += 1
+    assert cb.allow()          # новая проба
+    cb.record_success()
+    assert cb.state == CLOSED
+
+
+def _half_open_openai(clock) -> CircuitBreaker:
+    cb = get_breaker("openai")
+    cb.reset()
+    for _ in range(cb.min_calls):
+        cb.record_failure("x")
+    clock.t += cb.open_s
+    assert cb.state == HALF_OPEN
+    return cb
+
+
+def test_openai_generate_cancelled_probe(clock, monkeypatch):
+    cb = _half_open_openai(clock)
+
+    async def hang(*a, **kw):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(oc, "_generate_json", hang)
+
+    async def run():
+        task = asyncio.create_task(oc.openai_generate_json("s", "u", api_key="k", model=None))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    try:
+        asyncio.run(run())
+        assert cb.state == OPEN  # проба отменена → снова open, а не «вечный» half-open
+        clock.t += cb.open_s
+        assert cb.allow()
+    finally:
+        cb.reset()
+
+
+def test_openai_stream_closed_probe(clock, monkeypatch):
+    cb = _half_open_openai(clock)
+
+    async def chunks(*a, **kw):
+        yield "{"
+        yield '"answer": ""}'
+
+    monkeypatch.setattr(oc, "_stream_json", chunks)
+
+    async def run():
+        gen = oc.openai_stream_json("s", "u", api_key="k", model=None)
+        assert await gen.__anext__() == "{"
+        await gen.aclose()  # клиент SSE отключился
+
+    try:
+        asyncio.run(run())
+        assert cb.state == OPEN
+        clock.t += cb.open_s
+
+        async def full():
+            return [d async for d in oc.openai_stream_json("s", "u", api_key="k", model=None)]
+
+        assert "".join(asyncio.run(full())) == '{"answer": ""}'
+        assert cb.state == CLOSED
+    finally:
+        cb.reset()
+
+
+def test_greenapi_unexpected_error_releases_probe(clock):
+    cb = get_breaker("greenapi")
+    cb.reset()
+    for _ in range(cb.min_calls):
+        cb.record_failure("x")
+    clock.t += cb.open_s
+
+    class Boom:
+        def request(self, *a, **kw):
+            raise httpx.InvalidURL("bad url")
+
+    try:
+        with pytest.raises(httpx.InvalidURL):
+            wa._request("GET", "http://x", client=Boom())
+        assert cb.state == OPEN
+    finally:
+        cb.reset()
+
+
+def _bad_request(code):
+    req = httpx.Request("POST", "https://api.openai.com/v1/responses")
+    body = {"error": {"message": "bad", "code": code}}
+    return oc.openai.BadRequestError("bad", response=httpx.Response(400, request=req, json=body), body=body["error"])
+
+
+def test_bad_request_pins_chat_only_when_unsupported(monkeypatch):
+    class Client:
+        def with_options(self, **kw):
+            return self
+
+    async def responses(*a, **kw):
+        raise err
+
+    async def chat(*a, **kw):
+        return {"answer": "ok"}
+
+    monkeypatch.setattr(oc, "get_openai_client", lambda key: Client())
+    monkeypatch.setattr(oc, "_responses_json", responses)
+    monkeypatch.setattr(oc, "_chat_json", chat)
+
+    def run():
+        return asyncio.run(oc._generate_json("s", "u", "k", "m-test", cbm.Deadline(5), None, None, "x", 100))
+
+    try:
+        err = _bad_request("context_length_exceeded")
+        assert run() == {"answer": "ok"}  # fallback на chat — только для этого запроса
+        assert "m-test" not in oc._api_flavour
+
+        err = _bad_request("unsupported_parameter")
+        run()
+        assert oc._api_flavour["m-test"] == "chat"
+    finally:
+        oc._api_flavour.pop("m-test", None)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Карточка клиента GET /api/clients/{phone}/card на временной SQLite.
+
+- профиль, lifetime-итоги, баланс (с expiring_soon), история и живые гранты
+  — фиксированным числом SELECT, без повторного поиска клиента;
+- ETag: повторный запрос с If-None-Match — 304, после покупки — новый тег.
+
+Запуск: python -m pytest -q test_client_card.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+from app.core.database import Base, SessionLocal, engine
+from app.models.auth import Tenant
+from app.models.bonus_grant import BonusGrant
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.services.client_card import client_card
+
+TENANT = 1
+PHONE = "77010000001"
+NOW = datetime.utcnow()
+
+
+def _seed() -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add_all([Tenant(id=TENANT, name="A"), Tenant(id=2, name="B")])
+        u = User(tenant_id=TENANT, phone=PHONE, full_name="Client", tier="Silver")
+        db.add_all([u, User(tenant_id=2, phone=PHONE, full_name="Other")])
+        db.flush()
+        for days in (30, 5, 1):
+            db.add(Transaction(
+                tenant_id=TENANT, user_id=u.id, amount=1000, paid_amount=1000,
+                comment="", created_at=NOW - timedelta(days=days),
+            ))
+        grant = dict(user_id=u.id, amount=100, source="purchase")
+        db.add_all([
+            BonusGrant(**grant, remaining=40, status="available",
+                       available_from=NOW - timedelta(days=30), expires_at=NOW + timedelta(days=3)),
+            # pending с наступившей датой — уже available
+            BonusGrant(**grant, remaining=100, status="pending",
+                       available_from=NOW - timedelta(hours=1), expires_at=NOW + timedelta(days=60)),
+            BonusGrant(**grant, remaining=100, status="pending",
+                       available_from=NOW + timedelta(days=5), expires_at=NOW + timedelta(days=90)),
+            BonusGrant(**grant, remaining=0, status="expired",
+                       available_from=NOW - timedelta(days=90), expires_at=NOW - timedelta(days=1)),
+        ])
+        db.commit()
+
+
+def _client() -> TestClient:
+    from app.api.clients import router
+
+    api = FastAPI()
+
+    @api.middleware("http")
+    async def fake_auth(request: Request, call_next):
+        request.state.user = {"tenant_id": TENANT}
+        return await call_next(request)
+
+    api.include_router(router, prefix="/api")
+    return TestClient(api)
+
+
+def test_card_contents_and_query_count():
+    _seed()
+    selects = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        with SessionLocal() as db:
+            card = client_card(db, TENANT, PHONE, now=NOW)
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+
+    # сводка + история (+ customer_stats) + гранты
+    assert len(selects) <= 4, selects
+    assert card["profile"]["full_name"] == "Client" and card["profile"]["tier"] == "Silver"
+    assert (card["metrics"]["total_spent"], card["metrics"]["purchases_count"]) == (3000, 3)
+    assert card["metrics"]["recency_days"] == 1
+    assert card["balance"] == {
+        "available": 140, "pending": 100, "total": 240,
+        "expiring_soon": 40, "expiring_soon_days": 14,
+        "next_expiry_at": NOW + timedelta(days=3),
+    }
+    assert [t["paid_amount"] for t in card["transactions"]] == [1000, 1000, 1000]
+    assert [g["status"] for g in card["grants"]] == ["available", "available", "pending"]
+
+
+def test_etag_not_modified():
+    _seed()
+    client = _client()
+    r = client.get(f"/api/clients/8{PHONE[1:]}/card")
+    assert r.status_code == 200, r.text
+    etag = r.headers["ETag"]
+    assert r.json()["profile"]["phone"] == PHONE
+
+    again = client.get(f"/api/clients/{PHONE}/card", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["ETag"] == etag
+
+    with SessionLocal() as db:
+        uid = db.query(User.id).filter(User.tenant_id == TENANT, User.phone == PHONE).scalar()
+        db.add(Transaction(tenant_id=TENANT, user_id=uid, amount=700, paid_amount=700, comment=""))
+        db.commit()
+    changed = client.get(f"/api/clients/{PHONE}/card", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.json()["metrics"]["purchases_count"] == 4
+
+    assert client.get("/api/clients/77019999999/card").status_code == 404
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Нормализация телефона (app.core.phone) и импорт клиентов
+(POST /api/users/import) на временной SQLite.
+
+- одно правило нормализации для всех модулей, пачка = поштучно;
+- CSV (cp1251, «;», русский заголовок) → upsert по (tenant_id, phone) пачками,
+  пустые ячейки не затирают данные, повтор телефона в файле сливается;
+- отклонённые строки — в отчёте; повторный импорт ничего не меняет.
+
+Запуск: python -m pytest -q test_client_import.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+from app.core.database import Base, SessionLocal, engine
+from app.core.phone import normalize_phone, normalize_phones
+from app.models.auth import Tenant
+from app.models.user import User
+
+TENANT = 1
+
+CSV = (
+    "Телефон;ФИО;Дата рождения;Уровень\n"
+    "8 701 000 00 01;;01.02.1990;\n"           # существующий: имя не затирается
+    "+7 (701) 000-00-02;Анна;1991-03-04;серебро\n"
+    "123;Bad;;\n"
+    "77010000003;X;31.02.1990;\n"
+    "7010000002;Анна Б.;;\n"                   # тот же клиент, 10 цифр
+    "\n"
+)
+
+
+def test_normalize_phone():
+    cases = {
+        "+7 (701) 123-45-67": "77011234567",
+        "87011234567": "77011234567",
+        "7011234567": "77011234567",
+        "0077011234567": "77011234567",
+        "8 701 123 45 67\n": "77011234567",
+        87011234567: "77011234567",
+        "": "",
+        None: "",
+    }
+    assert {k: normalize_phone(k) for k in cases} == cases
+    assert normalize_phones(list(cases)) == list(cases.values())
+
+    # старые копии — теперь та же функция
+    from app.api import ai, crm, users
+    from app.core import security
+    from app.services import transactions, whatsapp
+
+    for mod in (crm, users, security, transactions, whatsapp):
+        assert mod.normalize_phone is normalize_phone
+    assert ai._norm_phone is normalize_phone
+
+
+def _client() -> TestClient:
+    from app.api.users import router
+
+    api = FastAPI()
+
+    @api.middleware("http")
+    async def fake_auth(request: Request, call_next):
+        request.state.user = {"tenant_id": TENANT, "role": request.headers.get("X-Role", "owner")}
+        return await call_next(request)
+
+    api.include_router(router, prefix="/api")
+    return TestClient(api)
+
+
+def _upload(client: TestClient, body: bytes, name: str = "clients.csv", **headers):
+    return client.post("/api/users/import?chunk=100", files={"file": (name, body, "text/csv")}, headers=headers)
+
+
+def test_import_csv():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add_all([Tenant(id=TENANT, name="A"), Tenant(id=2, name="B")])
+        db.add(User(tenant_id=TENANT, phone="77010000001", full_name="Old", tier="Gold"))
+        db.add(User(tenant_id=2, phone="77010000002", full_name="Other tenant"))
+        db.commit()
+
+    client = _client()
+    r = _upload(client, CSV.encode("cp1251"))
+    assert r.status_code == 200, r.text
+    rep = r.json()
+    assert (rep["rows"], rep["inserted"], rep["updated"], rep["duplicates"], rep["rejected"]) == (5, 1, 1, 1, 2)
+    assert [(x["line"], x["reason"]) for x in rep["rejected_sample"]] == [
+        (4, "invalid phone"), (5, "invalid birth_date"),
+    ]
+    assert rep["columns"] == ["phone", "full_name", "birth_date", "tier"]
+
+    with SessionLocal() as db:
+        got = {
+            u.phone: (u.full_name, u.birth_date, u.tier)
+            for u in db.query(User).filter(User.tenant_id == TENANT)
+        }
+    assert got == {
+        "77010000001": ("Old", date(1990, 2, 1), "Gold"),
+        "77010000002": ("Анна Б.", date(1991, 3, 4), "Silver"),
+    }
+
+    # тот же файл в UTF-8 — ничего не меняется
+    again = _upload(client, CSV.encode("utf-8")).json()
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (0, 0, 2)
+
+    # без заголовка — колонки по порядку
+    plain = _upload(client, b"77010000009,Ivan,1990-01-01,Gold\n").json()
+    assert plain["inserted"] == 1
+
+    assert _upload(client, b"", name="empty.csv").status_code == 400
+    assert _upload(client, CSV.encode(), **{"X-Role": "staff"}).status_code == 403
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main(["-q", __file__]))
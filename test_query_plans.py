@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""
+Планы горячих запросов (EXPLAIN QUERY PLAN, SQLite).
+
+Запросы не переписываются вручную: вызываются настоящие функции сервисов,
+SQL перехватывается и для каждого statement проверяется план — ни один не
+должен читать transactions / users / bonus_grants полным сканом.
+
+Запуск: python -m pytest -q test_query_plans.py
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+import pytest
+from sqlalchemy import event, select, text
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+from app.ai import batch
+from app.core.database import Base, SessionLocal, engine
+from app.core.pagination import decode_cursor, keyset_page, next_cursor
+from app.models.auth import Tenant
+from app.models.bonus_grant import BonusGrant
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.services import transactions as tx_svc
+from app.services.client_card import client_card
+from app.services.client_search import match_ids, search_users
+from app.services.client_summary import client_summaries, client_summary
+from app.services.loyalty_engine import consume_available, get_balances
+
+TENANT = 1
+TENANTS = 10
+HOT_TABLES = ("transactions", "users", "bonus_grants")
+# «SCAN t USING INDEX» — тоже полный проход (по индексу), допустим только SEARCH
+FULL_SCAN = re.compile(r"^SCAN (%s)\b" % "|".join(HOT_TABLES))
+
+
+@pytest.fixture(scope="module")
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    s = SessionLocal()
+    s.add_all([Tenant(id=t, name=f"T{t}") for t in range(1, TENANTS + 1)])
+    for i in range(300):
+        u = User(tenant_id=i % TENANTS + 1, phone=f"7701{i:07d}", full_name=f"C{i}")
+        s.add(u)
+        s.flush()
+        for d in (3, 40):
+            s.add(Transaction(
+                tenant_id=u.tenant_id, user_id=u.id, amount=1000, paid_amount=1000,
+                comment="", created_at=now - timedelta(days=d),
+            ))
+        s.add(BonusGrant(
+            user_id=u.id, amount=50, remaining=50, status="available",
+            available_from=now - timedelta(days=3), expires_at=now + timedelta(days=30),
+        ))
+    s.commit()
+    # Статистика планировщика — как после app.migrate_indexes
+    s.execute(text("ANALYZE"))
+    yield s
+    s.close()
+
+
+def _plans(fn) -> list[tuple[str, list[str]]]:
+    """Выполнить fn, вернуть [(sql, [строки плана])] для каждого SELECT."""
+    captured: list[tuple[str, object]] = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+
+    out = []
+    with engine.connect() as conn:
+        for sql, params in captured:
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params).all()
+            out.append((sql, [str(r[-1]) for r in rows]))
+    return out
+
+
+def _assert_no_full_scan(fn, uses: tuple[str, ...] = ()) -> None:
+    """uses — составные индексы, которые должны попасть в план."""
+    plans = _plans(fn)
+    assert plans, "no queries captured"
+    for sql, plan in plans:
+        bad = [line for line in plan if FULL_SCAN.match(line)]
+        assert not bad, f"full scan {bad}\nSQL: {sql}\nplan: {plan}"
+    used = " ".join(line for _, plan in plans for line in plan)
+    for name in uses:
+        assert f"INDEX {name} " in used, f"{name} not used: {[p for _, p in plans]}"
+
+
+def test_user_by_phone(db):
+    _assert_no_full_scan(
+        lambda: db.query(User).filter(User.tenant_id == TENANT, User.phone == "77010000000").first(),
+        uses=("ux_users_tenant_phone",),
+    )
+
+
+def test_client_history(db):
+    _assert_no_full_scan(
+        lambda: tx_svc.list_by_phone(db, TENANT, "77010000000"),
+        uses=("ux_users_tenant_phone", "ix_transactions_user_created"),
+    )
+
+
+def test_transactions_date_range(db):
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    week_ago = (datetime.utcnow() - timedelta(days=7)).strftime("%Y-%m-%d")
+    _assert_no_full_scan(
+        lambda: tx_svc.list_transactions(db, TENANT, date_from=week_ago, date_to=today),
+        uses=("ix_transactions_tenant_created",),
+    )
+
+
+def test_bonus_balances_and_redeem(db):
+    uid = db.query(User.id).filter(User.tenant_id == TENANT).first()[0]
+
+    def run():
+        get_balances(db, user_id=uid)
+        consume_available(db, user_id=uid, to_spend=10)
+        db.rollback()
+
+    _assert_no_full_scan(run, uses=("ix_bonus_grants_user_status_expires",))
+
+
+def test_client_summary(db):
+    uids = [u for (u,) in db.query(User.id).filter(User.tenant_id == TENANT).limit(20)]
+    _assert_no_full_scan(
+        lambda: client_summary(db, TENANT, "77010000000"),
+        uses=("ix_transactions_user_created", "ix_bonus_grants_active"),
+    )
+    _assert_no_full_scan(lambda: client_summaries(db, TENANT, uids))
+    _assert_no_full_scan(
+        lambda: client_card(db, TENANT, "77010000000"),
+        uses=("ix_transactions_user_created", "ix_bonus_grants_active"),
+    )
+
+
+def test_segment_selection(db):
+    _assert_no_full_scan(lambda: batch.segment_user_ids(db, TENANT, "active"))
+
+
+def test_keyset_pages(db):
+    """Глубокая страница по курсору: поиск по индексу и без сортировки во временном B-tree."""
+    first = tx_svc.list_transactions(db, TENANT, limit=10)
+    cursor = next_cursor(first, 10)
+    assert cursor
+
+    def pages():
+        page = tx_svc.list_transactions(db, TENANT, limit=10, after=cursor)
+        assert page and page[0].created_at <= first[-1].created_at
+        tx_svc.list_by_phone(db, TENANT, "77010000000", limit=1, after=cursor)
+        q = db.query(User).filter(User.tenant_id == TENANT)
+        keyset_page(q, User.created_at, User.id, decode_cursor(cursor), 10).all()
+
+    _assert_no_full_scan(pages, uses=("ix_transactions_tenant_created", "ix_users_tenant_created"))
+    for sql, plan in _plans(pages):
+        assert not any("TEMP B-TREE" in line for line in plan), f"sort\nSQL: {sql}\nplan: {plan}"
+
+
+def test_client_search(db):
+    """Префикс телефона — по индексу, подстрока — через users_fts, users без скана."""
+    found = {}
+
+    def run():
+        found["phone"] = search_users(db, TENANT, "8 701 000")
+        found["name"] = search_users(db, TENANT, "c10")
+
+    _assert_no_full_scan(run, uses=("ux_users_tenant_phone",))
+    plans = _plans(run)
+    assert any("users_fts VIRTUAL TABLE" in line for _, plan in plans for line in plan)
+    assert found["phone"] and all(r.phone.startswith("7701000") for r in found["phone"])
+    assert {r.full_name for r in found["name"]} >= {"C10", "C100"}
+
+
+def test_client_search_cyrillic_short_words(db):
+    """Короткий запрос без учёта регистра кириллицы; короткое слово сужает MATCH."""
+    names = ("Иван Петров", "Иван Сидоров", "Ивина Ольга")
+    users = [User(tenant_id=TENANT, phone=f"7702{i:07d}", full_name=n) for i, n in enumerate(names)]
+    db.add_all(users)
+    db.commit()
+    try:
+        def names_of(q):
+            return {r.full_name for r in search_users(db, TENANT, q)}
+
+        def matched(q):
+            return set(db.execute(select(User.full_name).where(User.id.in_(match_ids(db, q)))).scalars())
+
+        for q in ("ив", "ИВ", "Ив"):
+            assert names_of(q) == set(names), q
+            assert matched(q) == set(names), q
+        assert names_of("иван пе") == {"Иван Петров"}
+        assert matched("Иван Пе") == {"Иван Петров"}
+
+        # короткое слово — условием к MATCH, users по-прежнему не сканируется
+        _assert_no_full_scan(lambda: search_users(db, TENANT, "Иван Пе"))
+    finally:
+        for u in users:
+            db.delete(u)
+        db.commit()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Шардирование по тенантам (DB_SHARDING) на временных SQLite-файлах.
+
+- get_db выбирает файл тенанта по request.state.user;
+- клиенты/транзакции тенантов не пересекаются и не попадают в общую БД;
+- общие таблицы (tenants, settings) доступны из сессии тенанта;
+- суперадмин и фоновые архиваторы обходят все шарды;
+- включение на базе с данными: старт запрещён до shard_migrate, перенос
+  сохраняет клиентов, транзакции и гранты тенанта.
+
+Запуск: python -m pytest -q test_sharding.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+import app.models.bonus_grant_archive  # noqa: F401
+import app.models.customer_stats  # noqa: F401
+import app.models.transaction_archive  # noqa: F401
+from app.core import database
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, engine
+from app.models.auth import Tenant
+from app.models.transaction import Transaction
+from app.models.user import User
+
+
+def _client() -> TestClient:
+    from app.api.transactions import router
+
+    api = FastAPI()
+
+    @api.middleware("http")
+    async def fake_auth(request: Request, call_next):
+        request.state.user = {"tenant_id": int(request.headers.get("X-Tenant", 1))}
+        return await call_next(request)
+
+    api.include_router(router, prefix="/api")
+    return TestClient(api)
+
+
+def _setup(monkeypatch) -> None:
+    database.dispose_shards()
+    monkeypatch.setattr(settings, "DB_SHARDING", True)
+    monkeypatch.setattr(settings, "DB_SHARD_DIR", tempfile.mkdtemp())
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add_all([Tenant(id=1, name="A"), Tenant(id=2, name="B")])
+        db.commit()
+
+
+def _buy(client: TestClient, tenant: int, phone: str, amount: int) -> None:
+    r = client.post(
+        "/api/transactions/",
+        json={"user_phone": phone, "amount": amount, "payment_method": "CARD"},
+        headers={"X-Tenant": str(tenant)},
+    )
+    assert r.status_code == 200, r.text
+
+
+def test_requests_write_to_tenant_shard(monkeypatch):
+    _setup(monkeypatch)
+    client = _client()
+    _buy(client, 1, "77010000001", 1000)
+    _buy(client, 1, "77010000001", 2000)
+    _buy(client, 2, "77010000001", 5000)
+
+    assert database.shard_tenant_ids() == [1, 2]
+    with SessionLocal() as db:
+        assert db.query(User).count() == 0  # общая БД клиентов не содержит
+        assert db.query(Transaction).count() == 0
+
+    for tid, expected in ((1, [2000, 1000]), (2, [5000])):
+        with database.tenant_session(tid) as db:
+            assert [t.amount for t in db.query(Transaction).order_by(Transaction.id.desc())] == expected
+            assert db.get(Tenant, tid).name  # общие таблицы — через ту же сессию
+
+        r = client.get("/api/transactions/by-phone/87010000001", headers={"X-Tenant": str(tid)})
+        assert [t["amount"] for t in r.json()] == expected
+
+    database.dispose_shards()
+
+
+def test_superadmin_and_jobs_cover_all_shards(monkeypatch):
+    _setup(monkeypatch)
+    client = _client()
+    _buy(client, 1, "77010000001", 1000)
+    _buy(client, 2, "77010000002", 3000)
+    _buy(client, 2, "77010000003", 4000)
+
+    from app.services.bonus_archive import _run as run_bonus_archive
+    from app.web.superadmin import _tenant_stats
+
+    with SessionLocal() as db:
+        assert _tenant_stats(db, 1)["users_count"] == 1
+        stats = _tenant_stats(db, 2)
+        assert (stats["users_count"], stats["txn_count"], stats["revenue_30d"]) == (2, 2, 7000)
+
+    assert len(list(database.shard_sessions())) == 2
+    assert run_bonus_archive() == 0  # обходит оба файла, живые гранты не трогает
+
+    # тенант без данных: нули, файл шарда дашборд не создаёт
+    with SessionLocal() as db:
+        db.add(Tenant(id=3, name="C"))
+        db.commit()
+        assert _tenant_stats(db, 3)["users_count"] == 0
+    assert database.shard_tenant_ids() == [1, 2]
+
+    database.dispose_shards()
+
+
+def test_migrate_existing_data(monkeypatch):
+    import pytest
+
+    from app.models.bonus_grant import BonusGrant
+    from app.services import shard_migrate
+
+    _setup(monkeypatch)
+    monkeypatch.setattr(settings, "DB_SHARDING", False)
+    client = _client()
+    _buy(client, 1, "77010000001", 1000)
+    _buy(client, 2, "77010000002", 3000)
+    with SessionLocal() as db:
+        grants = db.query(BonusGrant).count()
+    assert grants == 2
+
+    monkeypatch.setattr(settings, "DB_SHARDING", True)
+    with pytest.raises(RuntimeError, match="shard_migrate"):
+        shard_migrate.assert_shared_tables_empty()
+
+    shard_migrate.main([])
+    shard_migrate.assert_shared_tables_empty()
+    with SessionLocal() as db:
+        assert db.query(User).count() == db.query(Transaction).count() == db.query(BonusGrant).count() == 0
+    for tid, phone, amount in ((1, "77010000001", 1000), (2, "77010000002", 3000)):
+        r = client.get(f"/api/transactions/by-phone/{phone}", headers={"X-Tenant": str(tid)})
+        assert [t["amount"] for t in r.json()] == [amount]
+        with database.tenant_session(tid) as db:
+            assert db.query(BonusGrant).count() == 1
+
+    # повторный перенос ничего не дублирует
+    assert not any(shard_migrate.migrate_tenant(1).values())
+    database.dispose_shards()
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Архив истории транзакций (app.services.tx_archive) на временной SQLite.
+
+- старые транзакции без ссылок из грантов уходят в transactions_archive,
+  итоги — в customer_stats; lifetime-сводка клиента не меняется;
+- AI-обзор (churn_risk, recency, топ клиентов, pareto) и superadmin
+  после архивации считают то же самое;
+- list_by_phone отдаёт полную историю, list_transactions читает архив,
+  только когда горячая таблица закончилась и диапазон дат до него дотягивается.
+
+Запуск: python -m pytest -q test_tx_archive.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+from sqlalchemy import event
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+from app.core.database import Base, SessionLocal, engine
+from app.core.pagination import next_cursor
+from app.models.auth import Tenant
+from app.models.bonus_grant import BonusGrant
+from app.models.customer_stats import CustomerStats
+from app.models.transaction import Transaction
+from app.models.transaction_archive import TransactionArchive
+from app.models.user import User
+from app.ai.insights import build_overview_payload, calc_overview_numbers
+from app.services import transactions as svc
+from app.services.client_summary import client_summary
+from app.services.tx_archive import archive_transactions
+
+TENANT = 1
+PHONE = "77010000001"
+NOW = datetime.utcnow()
+
+
+def _seed() -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.add_all([Tenant(id=TENANT, name="A"), Tenant(id=2, name="B")])
+        u = User(tenant_id=TENANT, phone=PHONE, full_name="Client", tier="Bronze")
+        db.add(u)
+        db.flush()
+        # Старая транзакция с живым грантом — остаётся в горячей таблице
+        pinned = Transaction(
+            tenant_id=TENANT, user_id=u.id, amount=200, paid_amount=200,
+            comment="", created_at=NOW - timedelta(days=400),
+        )
+        db.add(pinned)
+        db.flush()
+        db.add(BonusGrant(
+            user_id=u.id, transaction_id=pinned.id, amount=10, remaining=10, status="available",
+            source="purchase", available_from=NOW - timedelta(days=400), expires_at=NOW + timedelta(days=30),
+        ))
+        # 5 старых покупок (одна полностью возвращена), 3 свежих
+        for i, days in enumerate((700, 650, 600, 550, 500)):
+            db.add(Transaction(
+                tenant_id=TENANT, user_id=u.id, amount=1000, paid_amount=1000,
+                refunded_amount=1000 if i == 0 else 0,
+                status="refunded" if i == 0 else "completed",
+                comment="", created_at=NOW - timedelta(days=days),
+            ))
+        for days in (20, 10, 1):
+            db.add(Transaction(
+                tenant_id=TENANT, user_id=u.id, amount=500, paid_amount=500,
+                comment="", created_at=NOW - timedelta(days=days),
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_archive_keeps_lifetime_totals():
+    _seed()
+    db = SessionLocal()
+    try:
+        before = client_summary(db, TENANT, PHONE, now=NOW)
+        moved = archive_transactions(db, older_than_days=365, chunk=2, now=NOW)
+        assert moved == 5
+        assert db.query(TransactionArchive).count() == 5
+        assert db.query(Transaction).count() == 4
+
+        stats = db.get(CustomerStats, before["user_id"])
+        assert (stats.tx_count, stats.purchases_count, stats.net_spent) == (5, 4, 4000)
+
+        after = client_summary(db, TENANT, PHONE, now=NOW)
+        for k in ("total_spent", "purchases_count", "avg_check", "last_purchase_at"):
+            assert after[k] == before[k], k
+
+        # Повторный прогон ничего не переносит и итоги не удваивает
+        assert archive_transactions(db, older_than_days=365, now=NOW) == 0
+        db.refresh(stats)
+        assert stats.tx_count == 5
+    finally:
+        db.close()
+
+
+def test_overview_figures_survive_archive(monkeypatch):
+    import app.ai.insights as insights
+    from app.web.superadmin import _shard_stats
+
+    monkeypatch.setattr(insights, "_utcnow", lambda: NOW)
+    _seed()
+    db = SessionLocal()
+    try:
+        # клиент, вся история которого уйдёт в архив — самый «уснувший»
+        sleeper = User(tenant_id=TENANT, phone="77010000002", full_name="Sleeper")
+        db.add(sleeper)
+        db.flush()
+        db.add(Transaction(
+            tenant_id=TENANT, user_id=sleeper.id, amount=9000, paid_amount=9000,
+            comment="", created_at=NOW - timedelta(days=800),
+        ))
+        db.commit()
+
+        def figures():
+            p = build_overview_payload(db, TENANT)
+            return (
+                p["summary"], p.get("avg_recency_days"), p.get("top_clients"),
+                p.get("pareto"), calc_overview_numbers(db, now=NOW),
+                _shard_stats(db, TENANT)["txn_count"],
+            )
+
+        before = figures()
+        assert before[0]["churn_risk"] == 1
+        assert [c["total_spent"] for c in before[2]] == [9000, 5700]
+        assert archive_transactions(db, older_than_days=365, now=NOW) == 6
+        assert figures() == before
+    finally:
+        db.close()
+
+
+def test_history_reads_archive_only_when_needed():
+    _seed()
+    db = SessionLocal()
+    try:
+        archive_transactions(db, older_than_days=365, now=NOW)
+
+        assert len(svc.list_by_phone(db, TENANT, PHONE)) == 9
+
+        statements: list[str] = []
+
+        def _before(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _before)
+        try:
+            # Страница целиком из горячей таблицы и свежее архива — только проверка max(created_at)
+            assert len(svc.list_transactions(db, TENANT, limit=3)) == 3
+            assert sum("FROM transactions_archive" in s for s in statements) == 1
+
+            # Диапазон моложе архива — только проверка max(created_at)
+            statements.clear()
+            recent = (NOW - timedelta(days=30)).strftime("%Y-%m-%d")
+            assert len(svc.list_transactions(db, TENANT, date_from=recent)) == 3
+            assert sum("FROM transactions_archive" in s for s in statements) == 1
+        finally:
+            event.remove(engine, "before_cursor_execute", _before)
+
+        # Пагинация продолжается в архиве, порядок — от новых к старым
+        rows = svc.list_transactions(db, TENANT, limit=50)
+        assert len(rows) == 9
+        assert [r.created_at for r in rows] == sorted((r.created_at for r in rows), reverse=True)
+        page = svc.list_transactions(db, TENANT, limit=3, offset=6)
+        assert [r.id for r in page] == [r.id for r in rows[6:9]]
+
+        # Курсор проходит оба уровня без пропусков и повторов
+        seen, after = [], None
+        while True:
+            page = svc.list_transactions(db, TENANT, limit=2, after=after)
+            seen += [r.id for r in page]
+            after = next_cursor(page, 2)
+            if not after:
+                break
+        assert seen == [r.id for r in rows]
+        by_phone = svc.list_by_phone(db, TENANT, PHONE, limit=4, after=next_cursor(rows[:4], 4))
+        assert [r.id for r in by_phone] == [r.id for r in rows[4:8]]
+
+        # Чужой тенант архив не видит
+        assert svc.list_transactions(db, 2, limit=50) == []
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main(["-q", __file__]))
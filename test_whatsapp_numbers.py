@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Проверка номеров перед рассылкой (app.services.whatsapp_numbers) на временной SQLite.
+
+- неизвестные номера проверяются параллельно и не дольше бюджета пачки;
+- не успевшие — None (отправляются без проверки), проверенные — в кэш;
+- известные по кэшу в GreenAPI не ходят.
+
+checkWhatsapp подменён медленной заглушкой (0.2 с на номер).
+
+Запуск: python -m pytest -q test_whatsapp_numbers.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+import app.models.campaign  # noqa: F401
+import app.models.whatsapp_number  # noqa: F401
+import app.services.whatsapp_numbers as wn
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, engine
+
+PHONES = [f"770100{i:05d}" for i in range(40)]
+
+
+def test_cold_cache_is_bounded(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    calls = []
+    lock = threading.Lock()
+
+    def slow_check(phone, client=None, timeout=None):
+        assert timeout is not None and timeout <= settings.WA_NUMBER_CHECK_BUDGET_S
+        with lock:
+            calls.append(phone)
+        time.sleep(0.2)
+        return not phone.endswith("7")
+
+    monkeypatch.setattr(wn, "check_whatsapp", slow_check)
+    monkeypatch.setattr(settings, "WA_NUMBER_CHECK_CONCURRENCY", 4)
+    monkeypatch.setattr(settings, "WA_NUMBER_CHECK_BUDGET_S", 0.5)
+
+    with SessionLocal() as db:
+        t0 = time.perf_counter()
+        got = wn.prefetch_presence(db, PHONES)
+        elapsed = time.perf_counter() - t0
+
+        # поштучно было бы 40 × 0.2 = 8 с
+        assert elapsed < 1.5, elapsed
+        assert set(got) == set(PHONES)
+        checked = {p: v for p, v in got.items() if v is not None}
+        assert 4 <= len(checked) < len(PHONES)
+        assert all(v == (not p.endswith("7")) for p, v in checked.items())
+
+        # второй проход: проверенные — из кэша, в GreenAPI только остальные
+        calls.clear()
+        again = wn.prefetch_presence(db, PHONES)
+        assert not set(calls) & set(checked)
+        assert {p: again[p] for p in checked} == checked
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main(["-q", __file__]))
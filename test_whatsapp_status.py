@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Вебхук статусов доставки GreenAPI и буфер StatusBuffer на временной SQLite.
+
+- без GREENAPI_WEBHOOK_TOKEN вебхук закрыт (503), чужой токен — 401;
+- статусы пачкой ложатся на записанные сообщения и только «растут»;
+- статус без записи об отправке не считается в len() (не запускает сброс),
+  перепроверяется через UNMATCHED_RETRY_S и при втором промахе отбрасывается;
+- буфер не растёт сверх max_size.
+
+Запуск: python -m pytest -q test_whatsapp_status.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, ".")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ltv_test.db')}"
+)
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import app.models  # noqa: F401
+import app.models.auth  # noqa: F401
+import app.models.campaign  # noqa: F401
+import app.services.whatsapp_status as ws
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, engine
+from app.models.whatsapp_message import WhatsappMessage
+from app.services.whatsapp_status import StatusBuffer, record_sent_messages
+
+NOW = datetime.utcnow()
+
+
+def _seed(*mids: str) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        record_sent_messages(db, None, [{"phone": "77010000001", "message_id": m} for m in mids])
+
+
+def _statuses() -> dict:
+    with SessionLocal() as db:
+        return dict(db.query(WhatsappMessage.provider_message_id, WhatsappMessage.status))
+
+
+def test_webhook_token(monkeypatch):
+    from app.api.whatsapp import router
+
+    api = FastAPI()
+    api.include_router(router, prefix="/api")
+    client = TestClient(api)
+    body = {"typeWebhook": "outgoingMessageStatus", "idMessage": "m1", "status": "delivered"}
+
+    monkeypatch.setattr(settings, "GREENAPI_WEBHOOK_TOKEN", None)
+    assert client.post("/api/whatsapp/webhook", json=body).status_code == 503
+
+    monkeypatch.setattr(settings, "GREENAPI_WEBHOOK_TOKEN", "secret")
+    assert client.post("/api/whatsapp/webhook", json=body).status_code == 401
+    r = client.post("/api/whatsapp/webhook", json=body, headers={"Authorization": "Bearer secret"})
+    assert r.status_code == 200 and r.json()["accepted"] == 1
+    ws.get_status_buffer()._pending.clear()
+
+
+def test_flush_applies_and_parks_unmatched():
+    _seed("m1", "m2")
+    buf = StatusBuffer(max_size=100)
+    buf.add("m1", "read", NOW)
+    buf.add("m1", "delivered", NOW)  # запоздавший «меньший» статус не откатывает
+    buf.add("m2", "delivered", NOW)
+    buf.add("foreign", "delivered", NOW)
+    assert len(buf) == 3
+
+    assert buf.flush(now=NOW) == 2
+    assert _statuses() == {"m1": "read", "m2": "delivered"}
+    # промах — в отдельной карте, сброс по числу событий не запускает
+    assert len(buf) == 0 and buf.unmatched == 1
+    assert not buf.has_work(NOW)
+
+    selects = []
+
+    def _before(conn, cursor, statement, *a):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        buf.add("m2", "read", NOW)
+        buf.flush(now=NOW)  # перепроверка ещё не созрела — foreign не ищем
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+    assert len(selects) == 1 and buf.unmatched == 1
+
+    later = datetime.utcnow() + timedelta(seconds=ws.UNMATCHED_RETRY_S + 1)
+    assert buf.has_work(later)
+    assert buf.flush(now=later) == 0
+    assert buf.unmatched == 0 and buf.dropped == 1
+
+
+def test_unmatched_then_sent_is_applied():
+    _seed()
+    buf = StatusBuffer(max_size=100)
+    buf.add("late", "delivered", NOW)
+    buf.flush(now=NOW)
+    assert buf.unmatched == 1
+
+    # insert об отправке дошёл после статуса
+    with SessionLocal() as db:
+        record_sent_messages(db, None, [{"phone": "77010000001", "message_id": "late"}])
+    later = datetime.utcnow() + timedelta(seconds=ws.UNMATCHED_RETRY_S + 1)
+    assert buf.flush(now=later) == 1
+    assert _statuses() == {"late": "delivered"} and buf.dropped == 0
+
+
+def test_buffer_is_capped():
+    buf = StatusBuffer(max_size=3)
+    accepted = [buf.add(f"x{i}", "delivered", NOW) for i in range(5)]
+    assert accepted == [True, True, True, False, False]
+    assert len(buf) == 3 and buf.dropped == 2
+    assert buf.add("x0", "read", NOW)  # обновление уже взятого id — можно
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main(["-q", __file__]))